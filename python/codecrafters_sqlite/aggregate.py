@@ -0,0 +1,279 @@
+"""Aggregates folded into accumulators while a scan decodes its cells
+
+GROUP BY keeps one set of accumulators per group in a dict. Past ``max_groups``
+groups they are spilled to a temporary file as a run sorted by group key, and the
+runs are merged at the end, so memory stays bounded however many groups there are.
+"""
+
+import heapq
+import pickle
+import re
+import tempfile
+from dataclasses import dataclass
+from itertools import groupby
+
+from codecrafters_sqlite.cells import content_size, decode, sort_key
+from codecrafters_sqlite.schema import Conversions
+
+AGGREGATES = ("count", "sum", "avg", "min", "max")
+MAX_GROUPS = 100_000
+
+_number_prefix = re.compile(rb"\s*[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?")
+
+
+@dataclass(frozen=True)
+class Aggregate:
+    """An aggregate function of a column, or of every row for ``COUNT(*)``"""
+
+    function: str
+    column_index: int | None  # None for COUNT(*)
+
+
+class Accumulator:
+    """One aggregate's state, folding values in one at a time
+
+    NULLs are ignored, as in SQL. Sums of reals are compensated, carrying the
+    rounding error of the total in ``error``, so that they come out the same
+    however the rows are split between partial results.
+    """
+
+    __slots__ = ("function", "count", "total", "error", "best")
+
+    def __init__(self, function):
+        if function not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate {function}")
+        self.function = function
+        self.count = 0
+        self.total = 0
+        self.error = 0.0
+        self.best = None
+
+    def add(self, value):
+        if value is None:
+            return
+        self.count += 1
+        match self.function:
+            case "sum" | "avg":
+                self.total, self.error = _compensated(
+                    self.total, self.error, summand(value)
+                )
+            case "min":
+                if self.best is None or sort_key(value) < sort_key(self.best):
+                    self.best = value
+            case "max":
+                if self.best is None or sort_key(value) > sort_key(self.best):
+                    self.best = value
+
+    def partial(self):
+        """The state so far, as combine_aggregates merges it"""
+        match self.function:
+            case "count":
+                return self.count
+            case "sum" | "avg":
+                return self.total, self.error, self.count
+            case _:
+                return self.best
+
+
+def _compensated(total, error, value):
+    """Add value to a total with the Kahan-Babuska-Neumaier summation SQLite
+    uses, returning the total and its accumulated rounding error
+
+    Integers add up exactly, until a real comes along.
+    """
+    if isinstance(total, int) and isinstance(value, int):
+        return total + value, error
+    new_total = total + value
+    if abs(total) >= abs(value):
+        error += (total - new_total) + value
+    else:
+        error += (value - new_total) + total
+    return new_total, error
+
+
+def summand(value):
+    """A value as SUM and AVG add it up, which is as a number whatever it is
+
+    Text that is a whole number is added as one. Otherwise text and blobs are
+    added as whatever number they start with, as a float, or 0.0 if none.
+
+    >>> [summand(value) for value in (2, " 3 ", "4.5", "12abc", b"7", "abc")]
+    [2, 3, 4.5, 12.0, 7.0, 0.0]
+    """
+    if isinstance(value, int | float):
+        return value
+    raw = value.encode() if isinstance(value, str) else bytes(value)
+    if (prefix := _number_prefix.match(raw)) is None:
+        return 0.0
+    if isinstance(value, str) and not raw[prefix.end() :].strip():
+        try:
+            number = int(raw)
+        except ValueError:
+            return float(raw)
+        if -(2**63) <= number < 2**63:
+            return number
+    return float(prefix.group())
+
+
+def combine_aggregates(function, partials):
+    """Merge partial results into the aggregate's value
+
+    >>> combine_aggregates("avg", [(3, 0.0, 2), (0, 0.0, 0), (6, 0.0, 1)])
+    3.0
+    >>> combine_aggregates("sum", [(1e100, 0.0, 1), (1.0, 0.0, 1), (-1e100, 0.0, 1)])
+    1.0
+    >>> combine_aggregates("max", [None, "b", 7]), combine_aggregates("sum", [])
+    ('b', None)
+    """
+    match function:
+        case "count":
+            return sum(partials)
+        case "sum" | "avg":
+            total, error, count = 0, 0.0, 0
+            for partial_total, partial_error, partial_count in partials:
+                total, error = _compensated(total, error, partial_total)
+                error += partial_error
+                count += partial_count
+            if count == 0:
+                return None
+            if isinstance(total, float):
+                total += error
+            return total / count if function == "avg" else total
+        case "min":
+            return min(
+                (p for p in partials if p is not None), key=sort_key, default=None
+            )
+        case "max":
+            return max(
+                (p for p in partials if p is not None), key=sort_key, default=None
+            )
+
+
+def aggregate(
+    cells,
+    aggregates,
+    group_indices=(),
+    rowid_column=None,
+    conversions=Conversions(),
+    max_groups=MAX_GROUPS,
+):
+    """Fold table leaf cells into aggregates, generating ``(group key, values)``
+
+    Only the columns the aggregates and the group key use are decoded, straight
+    into accumulators, with the ``conversions`` of the table's columns. Groups
+    come out in the order of their keys, as from SQLite; without ``group_indices``
+    there is one group, with the key ``()``, even when there are no cells.
+
+    >>> from codecrafters_sqlite.main import SAMPLE_DB, DbInfo
+    >>> table = DbInfo(SAMPLE_DB).find_table("apples")
+    >>> list(aggregate(table._generate_child_rows(), [Aggregate("max", 1)]))
+    [((), ['Honeycrisp'])]
+    """
+    partials = partial_groups(
+        cells, aggregates, group_indices, rowid_column, conversions, max_groups
+    )
+    return combine_groups(aggregates, [partials])
+
+
+def partial_groups(
+    cells,
+    aggregates,
+    group_indices=(),
+    rowid_column=None,
+    conversions=Conversions(),
+    max_groups=MAX_GROUPS,
+):
+    """Fold table leaf cells into partial results, generating ``(group key,
+    partials)`` in key order, for combine_groups to merge
+
+    A key can come out more than once, from groups spilled at different times.
+    ``conversions`` are for rows of every column of the table, in order.
+    """
+    columns = [a.column_index for a in aggregates]
+    wanted = set(group_indices) | {column for column in columns if column is not None}
+    width = max(wanted, default=-1) + 1
+    conversions = Conversions(
+        tuple(real for real in conversions.reals if real[1] in wanted),
+        tuple(default for default in conversions.defaults if default[1] in wanted),
+    )
+    values = [None] * width  # reused for every cell
+    groups = {}
+    runs = []
+    accumulators = None
+    if not group_indices:
+        accumulators = groups[()] = [Accumulator(a.function) for a in aggregates]
+
+    for cell in cells:
+        record, location, serial_type_codes = cell.record_body()
+        decoded = min(width, len(serial_type_codes))
+        for column in range(decoded):
+            serial_type_code = serial_type_codes[column]
+            if column not in wanted:
+                location += content_size(serial_type_code)
+            elif serial_type_code == 0 and column == rowid_column:
+                values[column] = cell.rowid
+            else:
+                values[column], size = decode(record, location, serial_type_code)
+                location += size
+        # Columns added after the row was written are NULL, unless they have a default
+        for column in range(decoded, width):
+            values[column] = None
+        if conversions:
+            conversions.apply(values, cell)
+
+        if group_indices:
+            key = tuple([values[column] for column in group_indices])
+            if (accumulators := groups.get(key)) is None:
+                if len(groups) >= max_groups:
+                    runs.append(_spill(groups))
+                    groups = {}
+                accumulators = groups[key] = [
+                    Accumulator(a.function) for a in aggregates
+                ]
+        for accumulator, column in zip(accumulators, columns):
+            accumulator.add(1 if column is None else values[column])
+
+    in_memory = sorted(
+        (
+            (key, [accumulator.partial() for accumulator in group])
+            for key, group in groups.items()
+        ),
+        key=_key_order,
+    )
+    yield from heapq.merge(in_memory, *map(_read_run, runs), key=_key_order)
+
+
+def combine_groups(aggregates, runs):
+    """Merge runs of partial results in key order into ``(group key, values)``"""
+    functions = [a.function for a in aggregates]
+    merged = heapq.merge(*runs, key=_key_order)
+    for key, partials in groupby(merged, key=lambda group: group[0]):
+        partials = [group_partials for _, group_partials in partials]
+        yield key, [
+            combine_aggregates(function, [p[number] for p in partials])
+            for number, function in enumerate(functions)
+        ]
+
+
+def _key_order(group):
+    key, _ = group
+    return tuple(map(sort_key, key))
+
+
+def _spill(groups):
+    """Write groups' partial results to a temporary file, sorted by key"""
+    run = tempfile.TemporaryFile()
+    for key, accumulators in sorted(groups.items(), key=_key_order):
+        partials = [accumulator.partial() for accumulator in accumulators]
+        pickle.dump((key, partials), run, pickle.HIGHEST_PROTOCOL)
+    run.seek(0)
+    return run
+
+
+def _read_run(run):
+    with run:
+        while True:
+            try:
+                yield pickle.load(run)
+            except EOFError:
+                return
@@ -1,12 +1,31 @@
+import io
 import logging
+import struct
 from pprint import pformat
 
 from codecrafters_sqlite import _buffer, _read_integer
-# from codecrafters_sqlite.varint import decode_varint
+from codecrafters_sqlite.stats import totals
+from codecrafters_sqlite.tracing import Tracer
+from codecrafters_sqlite.varint import VARINT_LENGTH
 
-from codecrafters_sqlite._lowlevel import decode_varint
+try:
+    from codecrafters_sqlite._lowlevel import (
+        decode_record,
+        decode_record_header,
+        decode_varint,
+    )
+except ImportError:  # the Rust extension hasn't been built
+    from codecrafters_sqlite.varint import decode_varint
+
+    decode_record = decode_record_header = None
+
+INTEGER_SIZES = {1: 1, 2: 2, 3: 3, 4: 4, 5: 6, 6: 8}
+REAL_SIZE = 8
+CHILD_POINTER_SIZE = 4
+OVERFLOW_POINTER_SIZE = 4
 
 logger = logging.getLogger(__name__)
+_trace = Tracer(__name__)
 
 
 class DecodeError(Exception):
@@ -16,13 +35,22 @@ class DecodeError(Exception):
 
 
 class VarintReader:
-    def __init__(self, buffer):
+    """Cursor over the varints in a buffer, starting at ``offset``"""
+
+    def __init__(self, buffer, offset=0):
         self.buffer = buffer
+        self.offset = offset
 
     def __next__(self):
-        value, length = decode_varint(self.buffer[:10])
-        # value, length = decode_varint(self.buffer)
-        self.buffer = self.buffer[length:]
+        if (byte := self.buffer[self.offset]) < 0x80:
+            # Most serial type codes fit in a single byte: skip the full decoder
+            self.offset += 1
+            return byte, 1
+        # The Rust decoder only accepts bytes: copy the varint, not the page view
+        value, length = decode_varint(
+            bytes(self.buffer[self.offset : self.offset + VARINT_LENGTH])
+        )
+        self.offset += length
         return value, length
 
     def read(self, buffer_size):
@@ -33,49 +61,331 @@ class VarintReader:
             yield value
 
 
+def _skip_varint(buffer, offset):
+    """The offset just past the varint at ``offset``, without decoding it"""
+    for end in range(offset, offset + VARINT_LENGTH - 1):
+        if buffer[end] < 0x80:
+            return end + 1
+    return offset + VARINT_LENGTH
+
+
+def read_record_header(page, pointer):
+    """Decode a cell's payload size, rowid and record header, one varint at a time
+
+    The pure-Python counterpart of ``_lowlevel.decode_record_header``: returns
+    ``(payload_size, rowid, record_offset, header_size, serial_type_codes)``.
+    """
+    record_varints = VarintReader(page, pointer)
+    payload_size, _ = next(record_varints)
+    rowid, _ = next(record_varints)
+    record_offset = record_varints.offset
+    header_size, header_size_length = next(record_varints)
+    serial_type_codes = list(record_varints.read(header_size - header_size_length))
+    return payload_size, rowid, record_offset, header_size, serial_type_codes
+
+
+def max_local_payload(usable_size, is_index=False):
+    """The most payload a cell keeps on its b-tree page before spilling (X)"""
+    if is_index:
+        return ((usable_size - 12) * 64 // 255) - 23
+    return usable_size - 35
+
+
+def local_payload_size(payload_size, usable_size, max_local):
+    """How many bytes of a payload are stored on the b-tree page itself
+
+    >>> local_payload_size(100, 4096, 4061)
+    100
+    >>> local_payload_size(10_000, 4096, 4061)
+    1816
+    >>> local_payload_size(4062, 4096, 4061)
+    489
+    """
+    if payload_size <= max_local:
+        return payload_size
+    min_local = ((usable_size - 12) * 32 // 255) - 23
+    surplus = min_local + (payload_size - min_local) % (usable_size - 4)
+    return surplus if surplus <= max_local else min_local
+
+
+def payload_chunks(
+    page, record_offset, payload_size, local_size, usable_size, read_page
+):
+    """Generate a payload as memoryviews: the part on the b-tree page, then the
+    content of each page in its overflow chain
+
+    ``read_page`` maps a page number to a view of that page.
+    """
+    yield page[record_offset : record_offset + local_size]
+    remaining = payload_size - local_size
+    next_page = _read_integer(page, record_offset + local_size, OVERFLOW_POINTER_SIZE)
+    while remaining > 0:
+        if read_page is None:
+            raise ValueError("Following overflow pages needs read_page")
+        if next_page == 0:
+            raise ValueError(f"Overflow chain ends {remaining} bytes early")
+        overflow_page = read_page(next_page)
+        next_page = _read_integer(overflow_page, 0, OVERFLOW_POINTER_SIZE)
+        chunk_size = min(remaining, usable_size - OVERFLOW_POINTER_SIZE)
+        yield overflow_page[OVERFLOW_POINTER_SIZE : OVERFLOW_POINTER_SIZE + chunk_size]
+        remaining -= chunk_size
+
+
+class PayloadReader(io.RawIOBase):
+    """A read-only binary file over a sequence of buffers
+
+    Only what is read is copied: ``chunks`` and ``skip`` move through the buffers
+    by slicing them.
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._current = memoryview(b"")
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        if not self._fill():
+            return 0
+        size = min(len(buffer), len(self._current))
+        buffer[:size] = self._current[:size]
+        self._current = self._current[size:]
+        return size
+
+    def chunks(self, size):
+        """Generate the next ``size`` bytes as views, one per underlying buffer"""
+        while size > 0 and self._fill():
+            chunk = self._current[:size]
+            self._current = self._current[len(chunk) :]
+            size -= len(chunk)
+            yield chunk
+
+    def skip(self, size):
+        for _ in self.chunks(size):
+            pass
+
+    def read_varint(self):
+        varint = self.read(1)
+        while varint[-1] >= 0x80 and len(varint) < VARINT_LENGTH:
+            varint += self.read(1)
+        return next(VarintReader(varint))
+
+    def _fill(self):
+        while not self._current:
+            if (chunk := next(self._chunks, None)) is None:
+                return False
+            self._current = memoryview(chunk)
+        return True
+
+
 class TableLeafCell:
-    def __init__(self, page, pointer, usable_size):
+    def __init__(self, page, pointer, usable_size, read_page=None):
         self.errors = 0
         self._pointer = pointer
-        self.page_pointer_ = page[self._pointer :]
+        self._page = page
         self.usable_size = usable_size
+        self._read_page = read_page
 
     def _read_body(self):
-        record_varints = VarintReader(self.page_pointer_)
-        payload_size, payload_size_length = next(record_varints)
-        assert (
-            payload_size <= self.usable_size - 35
-        )  # let U be the usable size of a database page, the total page size less the reserved space at the end of each page. Let X be U-35. If the payload size P is less than or equal to X then the entire payload is stored on the b-tree leaf page
-
-        self.rowid, rowid_length = next(record_varints)
-        self.id_message = f"rowid {self.rowid}: {payload_size} bytes at {self._pointer}"
-        logger.debug(self.id_message)
-        self._cell = _buffer(
-            self.page_pointer_,
-            0,
-            payload_size + payload_size_length + rowid_length,
+        """Decode the record header, returning the buffer holding the record body,
+        the offset of the body within it, and the serial type codes"""
+        if self._spills():
+            return self._read_spilled_body()
+        read_header = decode_record_header or read_record_header
+        (
+            payload_size,
+            self.rowid,
+            self._record_offset,
+            header_size,
+            serial_type_codes,
+        ) = read_header(self._page, self._pointer)
+
+        self._cell = self._page[self._pointer : self._record_offset + payload_size]
+        self._record = _buffer(self._page, self._record_offset, payload_size)
+        if _trace.enabled:
+            _trace("%s, serial type codes %s", self.id_message, serial_type_codes)
+
+        return self._page, self._record_offset + header_size, serial_type_codes
+
+    def record_body(self):
+        """Like ``_read_body``, without keeping what error reports need"""
+        if self._spills():
+            return self._read_spilled_body()
+        read_header = decode_record_header or read_record_header
+        _, self.rowid, record_offset, header_size, serial_type_codes = read_header(
+            self._page, self._pointer
         )
-        self._record = self._cell[payload_size_length + rowid_length :]
-        header_size, header_size_length = next(record_varints)
+        return self._page, record_offset + header_size, serial_type_codes
+
+    def raw_column(self, column_index):
+        """A column's serial type code and a view of its undecoded body
+
+        Nothing is decoded, not even the rowid, and the record header is only read
+        as far as the column: the columns before it are skipped using their sizes.
+        A column missing from the record, added since the row was written, is NULL.
+        """
+        page, offset = self._page, self._pointer
+        if self._spills():
+            record, location, serial_type_codes = self._read_spilled_body()
+            if column_index >= len(serial_type_codes):
+                return 0, record[location:location]
+            for serial_type_code in serial_type_codes[:column_index]:
+                location += content_size(serial_type_code)
+            serial_type_code = serial_type_codes[column_index]
+            size = content_size(serial_type_code)
+            return serial_type_code, record[location : location + size]
+        header_end = _skip_varint(page, _skip_varint(page, offset))
+        record_varints = VarintReader(page, header_end)
+        header_size, _ = next(record_varints)
+        header_end += header_size
+        location = header_end
+        for column in range(column_index + 1):
+            if record_varints.offset >= header_end:
+                return 0, page[location:location]
+            serial_type_code, _ = next(record_varints)
+            if column < column_index:
+                location += content_size(serial_type_code)
+        return (
+            serial_type_code,
+            page[location : location + content_size(serial_type_code)],
+        )
+
+    def _spills(self):
+        """Whether the payload continues on overflow pages"""
+        if self._page[self._pointer] < 0x80:
+            return False  # payloads under 128 bytes always fit on the page
+        payload_size, _ = next(VarintReader(self._page, self._pointer))
+        return payload_size > max_local_payload(self.usable_size)
 
+    def _read_spilled_body(self):
+        # Decoding every column needs the whole record in one buffer anyway
+        payload_size, record_offset = self._read_payload_size_and_rowid()
+        self._record = b"".join(self._payload_chunks(payload_size, record_offset))
+        totals.bytes_copied += payload_size
+        self._record_offset = 0
+        self._cell = self._page[self._pointer : record_offset + OVERFLOW_POINTER_SIZE]
+        if _trace.enabled:
+            _trace(self.id_message)
+        record_varints = VarintReader(self._record)
+        header_size, header_size_length = next(record_varints)
         serial_type_codes = list(record_varints.read(header_size - header_size_length))
-        logger.debug(f"Rowid {self.rowid} serial type codes: {serial_type_codes}")
+        return self._record, header_size, serial_type_codes
+
+    def _read_payload_size_and_rowid(self):
+        record_varints = VarintReader(self._page, self._pointer)
+        payload_size, _ = next(record_varints)
+        self.rowid, _ = next(record_varints)
+        return payload_size, record_varints.offset
+
+    def _payload_chunks(self, payload_size, record_offset):
+        local_size = local_payload_size(
+            payload_size, self.usable_size, max_local_payload(self.usable_size)
+        )
+        return payload_chunks(
+            self._page,
+            record_offset,
+            payload_size,
+            local_size,
+            self.usable_size,
+            self._read_page,
+        )
+
+    def column_chunks(self, column_index):
+        """Generate the raw content of a column as memoryviews, without joining them
+
+        A large TEXT or BLOB comes back one overflow page at a time, so a caller that
+        only needs a prefix or a hash never copies the whole value. Text is returned
+        as its UTF-8 bytes.
+        """
+        payload_size, record_offset = self._read_payload_size_and_rowid()
+        if self._spills():
+            chunks = self._payload_chunks(payload_size, record_offset)
+        else:
+            chunks = (self._page[record_offset : record_offset + payload_size],)
+        payload = PayloadReader(chunks)
+        header_size, header_size_length = payload.read_varint()
+        header = payload.read(header_size - header_size_length)
+        serial_type_codes = list(VarintReader(header).read(len(header)))
+        payload.skip(sum(map(content_size, serial_type_codes[:column_index])))
+        yield from payload.chunks(content_size(serial_type_codes[column_index]))
 
-        return record_varints.buffer, serial_type_codes
+    def open_column(self, column_index):
+        """A read-only binary file over the raw content of a column"""
+        return PayloadReader(self.column_chunks(column_index))
 
     @property
     def columns(self):
+        if decode_record is not None:
+            try:
+                self.rowid, columns = decode_record(
+                    self._page, self._pointer, self.usable_size
+                )
+            except ValueError:
+                pass  # decode in Python, which reports and counts the bad columns
+            else:
+                return list(columns)
+        return self.python_columns
+
+    def project(self, column_indices, rowid_column=0):
+        """Decode only the requested columns, in the requested order
+
+        The bodies of the other columns are skipped using their serial type sizes,
+        so they are never decoded. A NULL in ``rowid_column`` is replaced by the rowid.
+        """
+        if decode_record is not None:
+            try:
+                self.rowid, columns = decode_record(
+                    self._page,
+                    self._pointer,
+                    self.usable_size,
+                    column_indices,
+                    rowid_column,
+                )
+            except ValueError:
+                pass  # decode in Python, which reports and counts the bad columns
+            else:
+                return list(columns)
+        return self.python_project(column_indices, rowid_column)
+
+    def python_project(self, column_indices, rowid_column=0):
+        """The pure-Python reference implementation of ``project``"""
+        wanted = set(column_indices)
+        values = {}
+        record, current_location, serial_type_codes = self._read_body()
+        # Nothing after the last wanted column needs walking
+        last_column = max(wanted, default=-1)
+        for column, serial_type_code in enumerate(serial_type_codes[: last_column + 1]):
+            if column in wanted:
+                try:
+                    values[column], size = decode(
+                        record, current_location, serial_type_code
+                    )
+                except DecodeError as e:
+                    values[column], size = e.message, e.content_size
+                    self.errors += 1
+            else:
+                size = content_size(serial_type_code)
+            current_location += size
+        if rowid_column in values and values[rowid_column] is None:
+            values[rowid_column] = self.rowid
+        return [values.get(column) for column in column_indices]
+
+    @property
+    def python_columns(self):
+        """The pure-Python reference decoding of this cell's columns"""
         columns = list(self._read_columns())
         if columns[0] is None:
             columns[0] = self.rowid
         return columns
 
     def _read_columns(self):
-        current_location = 0
-        body, serial_type_codes = self._read_body()
+        record, current_location, serial_type_codes = self._read_body()
         for serial_type_code in serial_type_codes:
             try:
-                content, content_size = decode(body, current_location, serial_type_code)
+                content, content_size = decode(
+                    record, current_location, serial_type_code
+                )
             except DecodeError as e:
                 content = e.message
                 content_size = e.content_size
@@ -83,27 +393,115 @@ class TableLeafCell:
             current_location += content_size
             yield content
         if self.errors != 0:
-            self._log_errors(current_location)
+            self._log_errors(current_location - self._record_offset)
 
     @property
     def body(self):
-        body, _ = self._read_body()
-        return body
+        record, body_offset, _ = self._read_body()
+        return record[body_offset : self._record_offset + len(self._record)]
 
     @property
     def serial_type_codes(self):
-        _, result = self._read_body()
+        _, _, result = self._read_body()
         return result
 
+    @property
+    def column_count(self):
+        """How many columns the record has, fewer than the table's if columns were
+        added after it was written"""
+        _, _, serial_type_codes = self.record_body()
+        return len(serial_type_codes)
+
+    @property
+    def id_message(self):
+        """Which cell this is, for log messages about it"""
+        message = f"rowid {self.rowid}: {len(self._record)} bytes at {self._pointer}"
+        if len(self._record) > max_local_payload(self.usable_size):
+            message += ", overflowing"
+        return message
+
     def _log_errors(self, current_location):
         logger.error(f"{self.errors} cell errors for {self.id_message}")
-        logger.error(f"Cell: {pformat(self._cell, indent=4)}")
-        logger.error(f"Record: {pformat(self._record, indent=4)}")
+        logger.error(f"Cell: {pformat(bytes(self._cell), indent=4)}")
+        logger.error(f"Record: {pformat(bytes(self._record), indent=4)}")
         logger.error(
-            f"Remainder of columns: {pformat(self._record[current_location:], indent=4)}"
+            f"Remainder of columns: {pformat(bytes(self._record[current_location:]), indent=4)}"
         )
 
 
+class IndexCell:
+    """A cell of an index b-tree page: the indexed columns followed by the rowid"""
+
+    def __init__(self, page, pointer, usable_size, is_interior=False, read_page=None):
+        self._page = page
+        self._read_page = read_page
+        # Interior cells start with the page number of their left child
+        self._pointer = pointer + (CHILD_POINTER_SIZE if is_interior else 0)
+        self.usable_size = usable_size
+
+    @property
+    def columns(self):
+        record_varints = VarintReader(self._page, self._pointer)
+        payload_size, _ = next(record_varints)
+        record, record_offset = self._page, record_varints.offset
+        max_local = max_local_payload(self.usable_size, is_index=True)
+        if payload_size > max_local:
+            local_size = local_payload_size(payload_size, self.usable_size, max_local)
+            chunks = payload_chunks(
+                self._page,
+                record_offset,
+                payload_size,
+                local_size,
+                self.usable_size,
+                self._read_page,
+            )
+            record, record_offset = b"".join(chunks), 0
+        record_varints = VarintReader(record, record_offset)
+        header_size, header_size_length = next(record_varints)
+        serial_type_codes = record_varints.read(header_size - header_size_length)
+        current_location = record_offset + header_size
+        columns = []
+        for serial_type_code in serial_type_codes:
+            content, content_size = decode(record, current_location, serial_type_code)
+            current_location += content_size
+            columns.append(content)
+        return columns
+
+    @property
+    def key(self):
+        return self.columns[0]
+
+    @property
+    def rowid(self):
+        return self.columns[-1]
+
+
+def content_size(serial_type_code):
+    """The number of bytes of record body a serial type takes up"""
+    if serial_type_code >= 12:
+        return (serial_type_code - 12) // 2
+    if serial_type_code in INTEGER_SIZES:
+        return INTEGER_SIZES[serial_type_code]
+    if serial_type_code == 7:
+        return REAL_SIZE
+    if serial_type_code in (0, 8, 9):
+        return 0
+    raise Exception(f"Unknown serial type code {serial_type_code}")
+
+
+def sort_key(value):
+    """Order values like SQLite: NULL, then numbers, then text, then blobs"""
+    match value:
+        case None:
+            return 0, 0
+        case int() | float():
+            return 1, value
+        case str():
+            return 2, value
+        case _:
+            return 3, bytes(value)
+
+
 def decode(record, current_location, serial_type_code):
     match serial_type_code:
         case 0:
@@ -112,21 +510,32 @@ def decode(record, current_location, serial_type_code):
             return 0, 0
         case 9:
             return 1, 0
-        case 1 | 2 | 3 | 4 | 6:
-            content = _read_integer(
-                record, current_location, serial_type_code, signed=True
-            )
-            return content, serial_type_code
+        case 1 | 2 | 3 | 4 | 5 | 6:
+            content_size = INTEGER_SIZES[serial_type_code]
+            content = _read_integer(record, current_location, content_size, signed=True)
+            return content, content_size
+        case 7:
+            (content,) = struct.unpack_from(">d", record, current_location)
+            return content, REAL_SIZE
         case _:
+            if serial_type_code >= 12 and serial_type_code % 2 == 0:
+                blob_length = (serial_type_code - 12) // 2
+                blob = record[current_location : current_location + blob_length]
+                totals.bytes_copied += blob_length
+                return bytes(blob), blob_length
             if serial_type_code >= 13 and serial_type_code % 2 == 1:
                 string_length = (serial_type_code - 13) // 2
                 entry = record[current_location : current_location + string_length]
-                logger.debug(f"decoded [{entry}] with length {string_length}")
+                totals.bytes_copied += string_length
                 try:
-                    decoded = entry.decode()
+                    decoded = str(entry, "utf-8")
                 except UnicodeDecodeError as e:
-                    message = f"failed to decode [{entry}] at {current_location}: {e}"
+                    message = (
+                        f"failed to decode [{bytes(entry)}] at {current_location}: {e}"
+                    )
                     logger.error(message)
                     raise DecodeError(message, string_length) from e
+                if _trace.enabled:
+                    _trace("decoded [%s] with length %d", decoded, string_length)
                 return decoded, string_length
     raise Exception(f"Unknown serial type code {serial_type_code}")
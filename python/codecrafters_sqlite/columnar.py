@@ -0,0 +1,280 @@
+"""Scans that decode leaf pages straight into per-column arrays
+
+NumPy is optional: ``ColumnVector.to_numpy`` imports it, nothing else does.
+"""
+
+import struct
+from array import array
+from enum import StrEnum
+
+from codecrafters_sqlite import _read_integer, tracing
+from codecrafters_sqlite.cells import INTEGER_SIZES, content_size
+from codecrafters_sqlite.schema import Conversions
+
+DEFAULT_PAGES_PER_BATCH = 16
+
+_TYPECODES = {"integer": "q", "real": "d"}
+# Body sizes of serial types 0 to 11, for the types with fixed sizes
+_FIXED_SIZES = [content_size(code) for code in range(10)] + [0, 0]
+
+
+class Kind(StrEnum):
+    NULL = "null"
+    INTEGER = "integer"
+    REAL = "real"
+    TEXT = "text"
+    BLOB = "blob"
+    OBJECT = "object"
+
+
+class ColumnVector:
+    """One column of a batch, held in buffer-protocol arrays
+
+    Integers are an ``array('q')`` and reals an ``array('d')`` in ``values``; text
+    and blobs are the bytes of every value in ``data``, with row i at
+    ``data[offsets[i]:offsets[i + 1]]``. Bit i of ``nulls`` (least significant
+    first) is set when row i is NULL, and its slot holds 0 or nothing. Integers
+    and reals together become reals; a column mixing numbers, text and blobs falls
+    back to a list of Python ``objects``.
+    """
+
+    def __init__(self):
+        self.kind = Kind.NULL
+        self._nulls = bytearray()
+        self.values = None
+        self.offsets = None
+        self.data = None
+        self.objects = None
+        self._length = 0
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, row):
+        if self.is_null(row):
+            return None
+        match self.kind:
+            case Kind.INTEGER | Kind.REAL:
+                return self.values[row]
+            case Kind.TEXT:
+                return str(self._content(row), "utf-8")
+            case Kind.BLOB:
+                return bytes(self._content(row))
+            case Kind.OBJECT:
+                return self.objects[row]
+
+    def _content(self, row):
+        return memoryview(self.data)[self.offsets[row] : self.offsets[row + 1]]
+
+    @property
+    def nulls(self):
+        """The null bitmap, one bit per row"""
+        self._nulls.extend(bytes((self._length + 7) // 8 - len(self._nulls)))
+        return self._nulls
+
+    def is_null(self, row):
+        byte = row >> 3
+        return byte < len(self._nulls) and bool(self._nulls[byte] & (1 << (row & 7)))
+
+    def to_list(self):
+        return [self[row] for row in range(len(self))]
+
+    def to_numpy(self):
+        """This column as a NumPy array, masked where NULL
+
+        Numbers share the memory of ``values``; text and blobs become object arrays.
+        """
+        import numpy
+
+        if self.kind in (Kind.INTEGER, Kind.REAL):
+            values = numpy.frombuffer(self.values, dtype=self.values.typecode)
+        else:
+            values = numpy.array(self.to_list(), dtype=object)
+        nulls = numpy.frombuffer(self.nulls, dtype=numpy.uint8)
+        mask = numpy.unpackbits(nulls, bitorder="little")[: len(self)].astype(bool)
+        if mask.any():
+            return numpy.ma.masked_array(values, mask)
+        return values
+
+    def append_null(self):
+        match self.kind:
+            case Kind.INTEGER | Kind.REAL:
+                self.values.append(0)
+            case Kind.TEXT | Kind.BLOB:
+                self.offsets.append(len(self.data))
+            case Kind.OBJECT:
+                self.objects.append(None)
+        # Bits are only set for NULLs: the bitmap grows here and nowhere else
+        byte = self._length >> 3
+        if byte >= len(self._nulls):
+            self._nulls.extend(bytes(byte + 1 - len(self._nulls)))
+        self._nulls[byte] |= 1 << (self._length & 7)
+        self._length += 1
+
+    def append_number(self, kind, value):
+        if self.kind is kind or self._accepts(kind):
+            self.values.append(value)
+        else:
+            self.objects.append(value)
+        self._length += 1
+
+    def append_bytes(self, kind, content):
+        if self.kind is kind or self._accepts(kind):
+            self.data += content
+            self.offsets.append(len(self.data))
+        elif kind == Kind.TEXT:
+            self.objects.append(str(content, "utf-8"))
+        else:
+            self.objects.append(bytes(content))
+        self._length += 1
+
+    def _accepts(self, kind):
+        """Get ready for a value of ``kind``, or fall back to objects if the arrays
+        can't hold it"""
+        if self.kind == kind:
+            return True
+        if self.kind == Kind.NULL:
+            self._start(kind)
+            return True
+        if {self.kind, kind} == {Kind.INTEGER, Kind.REAL}:
+            if self.kind == Kind.INTEGER:
+                self.values = array("d", self.values)
+                self.kind = Kind.REAL
+            return True
+        if self.kind != Kind.OBJECT:
+            self.objects = self.to_list()
+            self.values = self.offsets = self.data = None
+            self.kind = Kind.OBJECT
+        return False
+
+    def _start(self, kind):
+        """Turn a column of nothing but NULLs into one of ``kind``"""
+        self.kind = kind
+        if kind in _TYPECODES:
+            self.values = array(_TYPECODES[kind], bytes(8 * self._length))
+        else:
+            self.offsets = array("q", bytes(8 * (self._length + 1)))
+            self.data = bytearray()
+
+
+class Batch:
+    """A run of a table's rows, as one ColumnVector per projected column"""
+
+    def __init__(
+        self, names, column_indices, rowid_column=None, conversions=Conversions()
+    ):
+        self.names = names
+        self.columns = [ColumnVector() for _ in names]
+        self._rowid_column = rowid_column
+        self._reals = {column_index for _, column_index in conversions.reals}
+        self._defaults = {
+            column_index: _default_value(default)
+            for _, column_index, default in conversions.defaults
+        }
+        self._last_column = max(column_indices, default=-1)
+        self._vectors = {}
+        for column_index, vector in zip(column_indices, self.columns):
+            self._vectors.setdefault(column_index, []).append(vector)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, name):
+        return self.columns[self.names.index(name)]
+
+    def rows(self):
+        columns = (column.to_list() for column in self.columns)
+        return [list(row) for row in zip(*columns)]
+
+    def append(self, cell):
+        """Decode a table leaf cell's projected columns onto the end of the vectors"""
+        record, location, serial_type_codes = cell.record_body()
+        vectors = self._vectors
+        for column, serial_type_code in enumerate(
+            serial_type_codes[: self._last_column + 1]
+        ):
+            if serial_type_code >= 12:
+                size = (serial_type_code - 12) >> 1
+            else:
+                size = _FIXED_SIZES[serial_type_code]
+            if column in vectors:
+                if serial_type_code == 0 and column == self._rowid_column:
+                    kind, value = Kind.INTEGER, cell.rowid
+                else:
+                    kind, value = _value(record, location, serial_type_code, size)
+                    if kind is Kind.INTEGER and column in self._reals:
+                        kind, value = Kind.REAL, float(value)
+                for vector in vectors[column]:
+                    _append(vector, kind, value)
+            location += size
+        # Columns added after the row was written are NULL, unless they have a default
+        for column in range(len(serial_type_codes), self._last_column + 1):
+            kind, value = self._defaults.get(column, (Kind.NULL, None))
+            for vector in self._vectors.get(column, ()):
+                _append(vector, kind, value)
+
+
+def scan_batches(
+    db_info, table_name, column_names=None, pages_per_batch=DEFAULT_PAGES_PER_BATCH
+):
+    """Generate a table's rows in rowid order, as a Batch per ``pages_per_batch``
+    leaf pages"""
+    if (table := db_info.find_table(table_name)) is None:
+        raise ValueError(f"no such table: {table_name}")
+    schema = db_info.table_schema(table_name)
+    names = schema.column_names if column_names is None else list(column_names)
+    column_indices = [schema.column_index(name) for name in names]
+    if None in column_indices:
+        raise ValueError(f"no such column: {names[column_indices.index(None)]}")
+
+    tracing.refresh()
+    db_info.page_source.scan()
+    conversions = schema.conversions(column_indices)
+    batch = Batch(names, column_indices, schema.rowid_column, conversions)
+    for leaves, leaf in enumerate(table._generate_leaves(), 1):
+        for cell_number in range(leaf.number_of_cells):
+            batch.append(leaf._cell(cell_number))
+        if leaves % pages_per_batch == 0:
+            yield batch
+            batch = Batch(names, column_indices, schema.rowid_column, conversions)
+    if len(batch):
+        yield batch
+
+
+def _append(vector, kind, value):
+    if kind is Kind.TEXT or kind is Kind.BLOB:
+        vector.append_bytes(kind, value)
+    elif kind is Kind.NULL:
+        vector.append_null()
+    else:
+        vector.append_number(kind, value)
+
+
+def _default_value(default):
+    """The kind of a column's default and its value as _value gives it"""
+    match default:
+        case str():
+            return Kind.TEXT, default.encode()
+        case bytes():
+            return Kind.BLOB, default
+        case float():
+            return Kind.REAL, default
+        case _:
+            return Kind.INTEGER, default
+
+
+def _value(record, location, serial_type_code, size):
+    """The kind of a value and either its raw bytes or, for numbers, the number"""
+    if serial_type_code >= 12:
+        kind = Kind.TEXT if serial_type_code & 1 else Kind.BLOB
+        return kind, record[location : location + size]
+    if serial_type_code in INTEGER_SIZES:
+        return Kind.INTEGER, _read_integer(record, location, size, signed=True)
+    if serial_type_code == 7:
+        (value,) = struct.unpack_from(">d", record, location)
+        return Kind.REAL, value
+    if serial_type_code in (8, 9):
+        return Kind.INTEGER, serial_type_code - 8
+    if serial_type_code == 0:
+        return Kind.NULL, None
+    raise Exception(f"Unknown serial type code {serial_type_code}")
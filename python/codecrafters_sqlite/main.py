@@ -1,25 +1,47 @@
-import itertools
 import logging
-import re
 import struct
 import sys
+import weakref
+from bisect import bisect_left
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import IntEnum, StrEnum
-from mmap import ACCESS_READ, mmap
-from pprint import pformat
-
-from codecrafters_sqlite import _buffer, _read_integer
-from codecrafters_sqlite.cells import TableLeafCell
+from time import perf_counter
+
+from codecrafters_sqlite import _buffer, _read_integer, native
+from codecrafters_sqlite.cells import (
+    CHILD_POINTER_SIZE,
+    IndexCell,
+    TableLeafCell,
+    VarintReader,
+    sort_key,
+)
+from codecrafters_sqlite.columnar import DEFAULT_PAGES_PER_BATCH, scan_batches
+from codecrafters_sqlite.page_cache import DEFAULT_CACHE_PAGES, PageCache
+from codecrafters_sqlite.page_source import BytesSource, PageSource, open_page_source
+from codecrafters_sqlite.query import PLAN_CACHE_SIZE, Cursor, prepare
+from codecrafters_sqlite.schema import parse_create_index, parse_create_table
+from codecrafters_sqlite.tracing import Tracer
+from codecrafters_sqlite.wal import WalSource, in_wal_mode
 
 SAMPLE_DB = "sample.db"
+SQLITE_SCHEMA_SQL = (
+    "CREATE TABLE sqlite_schema"
+    "(type text, name text, tbl_name text, rootpage integer, sql text)"
+)
 
 
 class DotCommands(StrEnum):
     DBINFO = ".dbinfo"
     TABLES = ".tables"
+    STATS = ".stats"  # followed by a query: run it, then report what it cost
+    TIMER = ".timer"  # followed by a query: run it, then report how long it took
 
 
-PAGE_SIZE_OFFSET = 16
+FILE_HEADER_SIZE = 100
+RESERVED_SPACE_OFFSET = 20
+CHANGE_COUNTER_OFFSET = 24
+SCHEMA_COOKIE_OFFSET = 40
 
 # import sqlparse - available if you need it!
 
@@ -27,6 +49,7 @@ CELL_POINTER_SIZE = 2
 MIN_PAGE_SIZE = 512
 
 logger = logging.getLogger(__name__)
+_trace = Tracer(__name__)
 
 
 class PageType(IntEnum):
@@ -55,26 +78,167 @@ class PageType(IntEnum):
 class DbInfo:
     page_size: int = 0
 
-    def __init__(self, database_file_path):
-        with open(database_file_path, "rb") as database_file:
-            self.database_mmap = mmap(database_file.fileno(), 0, access=ACCESS_READ)
-            self.page_size = _read_integer(self.database_mmap, PAGE_SIZE_OFFSET, 2)
-            self.page_size = 65536 if self.page_size == 1 else self.page_size
-            sqlite_schema_tree_root = self._table(1)
-            self._sqlite_schema = sqlite_schema_tree_root.child_rows
-            self.table_names = extract_table_names(self._sqlite_schema)
-            self.number_of_tables = len(self._sqlite_schema)
+    def __init__(
+        self,
+        database_file_path,
+        cache_pages=DEFAULT_CACHE_PAGES,
+        cache_bytes=None,
+        page_source="mmap",
+    ):
+        """Open a database file, reading its pages through a page source: "mmap",
+        "pread" or "bytes", as described in ``page_source``
+
+        In WAL mode, pages committed to the ``-wal`` file are read from there.
+        """
+        self.database_file_path = database_file_path
+        self.page_source_kind = page_source
+        self.page_source = open_page_source(database_file_path, page_source)
+        if in_wal_mode(self.page_source):
+            self.page_source = WalSource(self.page_source, f"{database_file_path}-wal")
+        self.page_size = self.page_source.page_size
+        reserved_space = self.page_source.read(RESERVED_SPACE_OFFSET, 1)[0]
+        self.usable_size = self.page_size - reserved_space
+        self.page_cache = PageCache(
+            self._load_page, cache_pages, cache_bytes, self.page_size
+        )
+        self._schema_cookie = self.schema_cookie
+        self._forget_schema()
+
+    @property
+    def number_of_tables(self):
+        """The number of schema entries, counted from page headers alone"""
+        return self._table(1).count_rows()
+
+    @property
+    def table_names(self):
+        return extract_table_names(self._read_schema())
+
+    @property
+    def change_counter(self):
+        """The file change counter, which every committed write increments"""
+        return _read_integer(self.page_source.read(CHANGE_COUNTER_OFFSET, 4), 0, 4)
+
+    @property
+    def schema_cookie(self):
+        """A number that every change to the schema changes"""
+        return _read_integer(self.page_source.read(SCHEMA_COOKIE_OFFSET, 4), 0, 4)
+
+    def refresh(self):
+        """Catch up with commits to the WAL, if there is one
+
+        Only the pages they changed are dropped from the page cache, and the
+        schema only if it has changed. Returns the pages' numbers, or None if the
+        WAL was restarted and any page may have changed.
+        """
+        if not (changed := self.page_source.refresh()):
+            return changed
+        self.page_cache.discard(changed)
+        if self.schema_cookie != self._schema_cookie:
+            self._schema_cookie = self.schema_cookie
+            self._forget_schema()
+        return changed
+
+    def close(self):
+        self.page_cache.clear()
+        self.page_source.close()
 
     def find_table(self, requested_name):
         if requested_name == "sqlite_schema":
             return self._table(1)
-        for type_, name, table_name, rootpage, sql in self._sqlite_schema:
-            if type_ == "table" and name.casefold() == requested_name.casefold():
-                return self._table(rootpage)
+        if (entry := self._find_table_entry(requested_name)) is not None:
+            type_, name, table_name, rootpage, rowid = entry
+            return self._table(rootpage)
+
+    def table_sql(self, requested_name):
+        if requested_name == "sqlite_schema":
+            return SQLITE_SCHEMA_SQL
+        if (entry := self._find_table_entry(requested_name)) is not None:
+            type_, name, table_name, rootpage, rowid = entry
+            return self._schema_sql(rowid)
+
+    def table_schema(self, requested_name):
+        """The parsed columns of a table, parsed once and then reused"""
+        key = requested_name.casefold()
+        if key not in self._table_schemas:
+            if (sql := self.table_sql(requested_name)) is None:
+                return None
+            self._table_schemas[key] = parse_create_table(sql)
+        return self._table_schemas[key]
+
+    def find_index(self, table_name, column_name):
+        """The root page and name of an index to search for column_name = value
+
+        Only an index whose first column is column_name, in ascending BINARY
+        order and with an entry for every row, is searched the way search_index
+        does: bisecting keys compared as Python values.
+        """
+        self._read_schema()
+        table_schema = self.table_schema(table_name)
+        for type_, name, indexed_table_name, rootpage, rowid in self._indexes.get(
+            table_name.casefold(), ()
+        ):
+            if (sql := self._schema_sql(rowid)) is None:
+                continue
+            index_schema = parse_create_index(sql)
+            if index_schema.partial or not index_schema.columns:
+                continue
+            first = index_schema.columns[0]
+            if first.name is None or first.name.casefold() != column_name.casefold():
+                continue
+            collation = first.collation
+            if collation is None and table_schema is not None:
+                if (column := table_schema.column_index(first.name)) is not None:
+                    collation = table_schema.columns[column].collation
+            if not first.descending and collation in (None, "BINARY"):
+                return self._table(rootpage), name
+        return None, None
+
+    def _find_table_entry(self, requested_name):
+        self._read_schema()
+        return self._tables.get(requested_name.casefold())
+
+    def _read_schema(self):
+        """Index the schema's tables by name and its indexes by table name
+
+        Entries are ``[type, name, tbl_name, rootpage, rowid]``: the SQL column is
+        left undecoded, for _schema_sql to read by rowid when it's wanted.
+        """
+        if self._schema_entries is None:
+            self._schema_entries = [
+                cell.project([0, 1, 2, 3]) + [cell.rowid]
+                for cell in self._table(1)._generate_child_rows()
+            ]
+            self._tables = {}
+            self._indexes = {}
+            for entry in self._schema_entries:
+                type_, name, table_name, *_ = entry
+                if type_ == "table":
+                    self._tables.setdefault(name.casefold(), entry)
+                elif type_ == "index":
+                    self._indexes.setdefault(table_name.casefold(), []).append(entry)
+        return self._schema_entries
+
+    def _schema_sql(self, rowid):
+        (sql,) = self._table(1).lookup(rowid).project([4])
+        return sql
 
     def _table(self, rootpage):
+        return self.page_cache.page(rootpage)
+
+    def _forget_schema(self):
+        self._table_schemas = {}
+        # The schema is read on first use, and its SQL only when it is needed
+        self._schema_entries = None
+        self._tables = None
+        self._indexes = None
+
+    def _load_page(self, page_number):
         return DbPage(
-            self.database_mmap, page_number=rootpage, page_size=self.page_size
+            self.page_source,
+            page_number=page_number,
+            page_size=self.page_size,
+            usable_size=self.usable_size,
+            page_cache=self.page_cache,
         )
 
 
@@ -93,22 +257,31 @@ class DbPage:
 
     RIGHT_MOST_POINTER_OFFSET = 8
 
-    def __init__(self, database_file, page_number=1, page_size=4096, usable_size=4096):
-        self._errors = 0
+    def __init__(
+        self,
+        database_file,
+        page_number=1,
+        page_size=4096,
+        usable_size=None,
+        page_cache=None,
+    ):
         self._page_size = page_size
-        self._usable_size = usable_size
+        self._usable_size = page_size if usable_size is None else usable_size
+        self._page_cache = page_cache
+        # A PageSource, or anything sliceable holding the whole file
+        if not isinstance(database_file, PageSource):
+            database_file = BytesSource(database_file, page_size)
         self.database_file = database_file
         self._page_number = page_number
 
-        self._page = database_file[
-            self._page_offset : self._page_content_cells_offset + self._page_size
-        ]
+        self._page = database_file.page(page_number)
+        if page_number == 1:
+            self._page = self._page[FILE_HEADER_SIZE:]
 
         page_type, first_freeblock, self.number_of_cells, cell_content_area_start = (
             struct.unpack_from(">BHHH", self._page)
         )
         self.page_type = PageType(page_type)
-        assert self.page_type.is_table()
         # assert first_freeblock == 0
         self.cell_content_area_start = (
             65536 if cell_content_area_start == 0 else cell_content_area_start
@@ -120,7 +293,96 @@ class DbPage:
             CELL_POINTER_SIZE * self.number_of_cells,
         )
 
-        logging.debug(f"Reading page {self._page_number}")
+        if _trace.enabled:
+            _trace("Reading page %d", self._page_number)
+
+    @property
+    def page_number(self):
+        return self._page_number
+
+    def count_rows(self):
+        """Count this subtree's rows from leaf page headers, without reading cells"""
+        if self.page_type.is_leaf():
+            return self.number_of_cells
+        if (scan := self._native_scan()) is not None:
+            rows = scan.count()
+            self._count_native_reads(scan)
+            return rows
+        rows = sum(child.count_rows() for child in self._generate_children())
+        if self.page_type.is_index():
+            # Index interior cells are entries too
+            rows += self.number_of_cells
+        return rows
+
+    def lookup(self, rowid):
+        """Find the cell for a rowid, binary-searching each page on the way down"""
+        cell_number = self._first_cell_at_or_after(rowid)
+        if self.page_type.is_interior():
+            return self._child_for(cell_number).lookup(rowid)
+        if cell_number < self.number_of_cells and self._key(cell_number) == rowid:
+            return self._cell(cell_number)
+        return None
+
+    def scan_range(self, lo=None, hi=None):
+        """Generate the cells with lo <= rowid <= hi, in rowid order"""
+        start = 0 if lo is None else self._first_cell_at_or_after(lo)
+        if self.page_type.is_interior():
+            for cell_number in range(start, self.number_of_cells + 1):
+                yield from self._child_for(cell_number).scan_range(lo, hi)
+                if (
+                    hi is not None
+                    and cell_number < self.number_of_cells
+                    and self._key(cell_number) >= hi
+                ):
+                    return
+        else:
+            for cell_number in range(start, self.number_of_cells):
+                if hi is not None and self._key(cell_number) > hi:
+                    return
+                yield self._cell(cell_number)
+
+    def search_index(self, key):
+        """Generate the index cells whose first column equals key, in index order"""
+        start = bisect_left(
+            range(self.number_of_cells), sort_key(key), key=self._index_sort_key
+        )
+        if self.page_type.is_interior():
+            for cell_number in range(start, self.number_of_cells + 1):
+                yield from self._child_for(cell_number).search_index(key)
+                if cell_number == self.number_of_cells:
+                    return
+                cell = self._cell(cell_number)
+                if sort_key(cell.key) != sort_key(key):
+                    return
+                yield cell
+        else:
+            for cell_number in range(start, self.number_of_cells):
+                cell = self._cell(cell_number)
+                if sort_key(cell.key) != sort_key(key):
+                    return
+                yield cell
+
+    def _index_sort_key(self, cell_number):
+        return sort_key(self._cell(cell_number).key)
+
+    def _first_cell_at_or_after(self, rowid):
+        return bisect_left(range(self.number_of_cells), rowid, key=self._key)
+
+    def _key(self, cell_number):
+        """The rowid of a leaf cell, or the largest rowid left of an interior cell"""
+        pointer = self._cell_content_pointer(cell_number)
+        if self.page_type.is_interior():
+            record_varints = VarintReader(self._page, pointer + CHILD_POINTER_SIZE)
+        else:
+            record_varints = VarintReader(self._page, pointer)
+            next(record_varints)  # payload size
+        key, _ = next(record_varints)
+        return key
+
+    def _child_for(self, cell_number):
+        if cell_number < self.number_of_cells:
+            return self._child_at(self._cell_content_pointer(cell_number))
+        return self._child_at(DbPage.RIGHT_MOST_POINTER_OFFSET)
 
     @property
     def child_rows(self):
@@ -131,66 +393,122 @@ class DbPage:
         return list(self._generate_children())
 
     def _generate_child_rows(self):
-        for child_page in self._generate_children():
+        if self.page_type.is_index() and self.page_type.is_interior():
+            # Each index interior cell sorts between its left child and the next one
+            for cell_number in range(self.number_of_cells):
+                yield from self._child_for(cell_number)._generate_child_rows()
+                yield self._cell(cell_number)
+            yield from self._child_for(self.number_of_cells)._generate_child_rows()
+            return
+        if self.page_type.is_interior() and (scan := self._native_scan()) is not None:
+            yield from self._generate_native_child_rows(scan)
+            return
+        for child_page in self._generate_children(read_ahead=True):
             yield from child_page._generate_child_rows()
         if self.page_type.is_leaf():
             for cell in range(self.number_of_cells):
                 yield self._cell(cell)
-            if self._errors:
-                self._log_leaf_page_errors(self.page_number)
 
-    def _generate_children(self):
-        if self.page_type.is_interior():
-            for cell in range(self.number_of_cells):
-                cell_content_pointer = self._cell_content_pointer(cell)
-                yield self._child_at(cell_content_pointer)
-
-            yield self._child_at(DbPage.RIGHT_MOST_POINTER_OFFSET)
-
-    def _log_leaf_page_error(self, page_number):
-        logger.error(f"{self._errors} errors in page {page_number}")
-        cell_pointer_array = _buffer(
-            self._page,
-            self.page_type.cell_pointer_array_offset(),
-            CELL_POINTER_SIZE * self.number_of_cells,
+    def _generate_native_child_rows(self, scan):
+        """Generate the cells of a table subtree whose leaves are found in Rust
+
+        The cells are read from the same leaf pages as a walk in Python would, so
+        they are the same.
+        """
+        for leaves in self._generate_native_leaves(scan):
+            for page_number in leaves:
+                leaf = self._page_at(page_number)
+                for cell in range(leaf.number_of_cells):
+                    yield leaf._cell(cell)
+
+    def _generate_native_leaves(self, scan):
+        """Generate the page numbers of the leaves a scan in Rust finds, a list
+        at a time, reading each list ahead as _generate_children would
+
+        The interior pages walked are counted as page cache reads as they are
+        found, and the leaves are left for the caller to count as it reads them.
+        """
+        window = self.database_file.window
+        counted = (0, 0)
+        while leaves := scan.leaves(window or native.LEAVES_PER_BATCH):
+            if window:
+                self.database_file.will_need(leaves)
+            counted = self._count_native_reads(scan, counted, count_leaves=False)
+            yield leaves
+
+    def _native_scan(self):
+        """A scan of this table subtree in Rust, or None if it can't have one"""
+        if not self.page_type.is_table():
+            return None
+        return native.table_scan(
+            self.database_file, self._page_number, self._usable_size
         )
-        pairs = zip(*([iter(cell_pointer_array)] * 2))
-        cell_pointers = list(
-            int.from_bytes(pointer, byteorder="big") for pointer in pairs
-        )
-        logger.error(f"Page {page_number} cell pointer array:{pformat(cell_pointers)}")
-        logger.debug(f"Page {page_number} rows:\n{pformat(self.child_rows, indent=4)}")
 
-    @property
-    def _page_content_cells_offset(self):
-        return self._page_size * (self._page_number - 1)
+    def _count_native_reads(self, scan, counted=(0, 0), count_leaves=True):
+        """Count the pages a scan in Rust has walked since it had walked
+        ``counted`` as page cache reads, as a walk through the cache would have
 
-    @property
-    def _page_offset(self):
-        return 100 if self._page_number == 1 else self._page_content_cells_offset
+        Returns the interior and leaf pages walked so far, to pass next time.
+        """
+        walked = scan.interior_pages, scan.leaf_pages if count_leaves else 0
+        if self._page_cache is not None:
+            self._page_cache.interior_reads += walked[0] - counted[0]
+            self._page_cache.leaf_reads += walked[1] - counted[1]
+        return walked
+
+    def _generate_leaves(self):
+        """Generate the leaf pages of a table subtree, in rowid order"""
+        if self.page_type.is_leaf():
+            yield self
+            return
+        for child_page in self._generate_children(read_ahead=True):
+            yield from child_page._generate_leaves()
+
+    def _generate_children(self, read_ahead=False):
+        """Generate the child pages of an interior page, in key order
+
+        With ``read_ahead``, the kernel is asked to start reading each window of
+        children before the first of them is visited.
+        """
+        if not self.page_type.is_interior():
+            return
+        page_numbers = self._child_page_numbers()
+        window = self.database_file.window if read_ahead else 0
+        for position, page_number in enumerate(page_numbers):
+            if window and position % window == 0:
+                self.database_file.will_need(page_numbers[position : position + window])
+            yield self._page_at(page_number)
+
+    def _child_page_numbers(self):
+        """The page numbers of an interior page's children, in key order"""
+        locations = [
+            self._cell_content_pointer(cell) for cell in range(self.number_of_cells)
+        ]
+        locations.append(DbPage.RIGHT_MOST_POINTER_OFFSET)
+        return [
+            self._read_integer(location, CHILD_POINTER_SIZE) for location in locations
+        ]
 
     @property
     def _cell_content_offset(self):
-        return self._page_offset - self._page_content_cells_offset
+        """Where the page starts, since cell pointers count from page 1's header"""
+        return FILE_HEADER_SIZE if self._page_number == 1 else 0
 
     def _cell(self, cell_number):
-        return TableLeafCell(
-            self._page, self._cell_content_pointer(cell_number), self._usable_size
-        )
-
-    def _get_row(self, cell_number):
-        cell = self._cell(cell_number)
-        logging.debug(f"Cell {cell_number}: {cell.columns[:2]}")
-        self._errors += cell.errors
-        if cell.errors:
-            self._log_cell_errors(cell_number, cell)
-        return cell.columns
-
-    def _log_cell_errors(self, cell_number, cell):
-        logger.error(
-            f"{cell.errors} errors in cell {cell_number} at +{self._cell_content_pointer(cell_number)} on page {self._page_number}"
-        )
-        logger.debug(f"Cell {cell_number} columns:\n{pformat(cell.columns, indent=4)}")
+        pointer = self._cell_content_pointer(cell_number)
+        if self.page_type.is_index():
+            return IndexCell(
+                self._page,
+                pointer,
+                self._usable_size,
+                self.page_type.is_interior(),
+                self._read_page,
+            )
+        return TableLeafCell(self._page, pointer, self._usable_size, self._read_page)
+
+    def _read_page(self, page_number):
+        """A view of a whole page, such as an overflow page, without parsing it"""
+        return self.database_file.page(page_number)
 
     def _cell_content_pointer(self, cell):
         cell_offset = _read_integer(
@@ -202,9 +520,20 @@ class DbPage:
         return _read_integer(self._page, location_in_page, size)
 
     def _child_at(self, child_page_number_location):
-        child_page_number = self._read_integer(child_page_number_location, 4)
-        child_page = DbPage(self.database_file, child_page_number, self._page_size)
-        return child_page
+        child_page_number = self._read_integer(
+            child_page_number_location, CHILD_POINTER_SIZE
+        )
+        return self._page_at(child_page_number)
+
+    def _page_at(self, page_number):
+        if self._page_cache is not None:
+            return self._page_cache.page(page_number)
+        return DbPage(
+            self.database_file,
+            page_number,
+            self._page_size,
+            self._usable_size,
+        )
 
 
 def main():
@@ -216,50 +545,186 @@ def main():
     if len(sys.argv) > 2:
         command = sys.argv[2]
 
-    db_info = DbInfo(database_file_path)
-    match command:
-        case DotCommands.DBINFO:
-            print(f"database page size: {db_info.page_size}")
-            print(f"number of tables: {db_info.number_of_tables}")
-        case DotCommands.TABLES:
-            print(" ".join(db_info.table_names))
-        case _:
-            for line in handle(command, database_file_path):
-                print(line)
-
-
-def handle(sql, database_file_path):
+    with Connection(database_file_path) as connection:
+        db_info = connection.db_info
+        match command:
+            case DotCommands.DBINFO:
+                print(f"database page size: {db_info.page_size}")
+                print(f"number of tables: {db_info.number_of_tables}")
+            case DotCommands.TABLES:
+                print(" ".join(db_info.table_names))
+            case DotCommands.STATS | DotCommands.TIMER:
+                if len(sys.argv) < 4:
+                    sys.exit(f"Usage: {sys.argv[0]} DATABASE {command} QUERY")
+                cursor = connection.execute(sys.argv[3])
+                for line in cursor:
+                    print(line)
+                stats = cursor.stats
+                if command == DotCommands.STATS:
+                    print("\n".join(stats.report()), file=sys.stderr)
+                else:
+                    real = stats.prepare_seconds + stats.execute_seconds
+                    print(f"Run Time: real {real:.3f}", file=sys.stderr)
+            case _:
+                for line in connection.execute(command):
+                    print(line)
+
+
+def handle(sql, database_file_path, processes=None, ordered=True):
     """Handle a SQL query
 
+    Opens a Connection for just this query: reuse a Connection to run many.
+    With ``processes``, full table scans are split across that many worker
+    processes; rows still come back in rowid order unless not ``ordered``.
+
     >>> list(handle("select count(*) from apples", SAMPLE_DB))
     [4]
     >>> list(handle("select * from apples", SAMPLE_DB))
     [[1, 'Granny Smith', 'Light Green'], [2, 'Fuji', 'Red'], [3, 'Honeycrisp', 'Blush Red'], [4, 'Golden Delicious', 'Yellow']]
     >>> list(handle("select name from apples", SAMPLE_DB))
     ['Granny Smith', 'Fuji', 'Honeycrisp', 'Golden Delicious']
+    >>> list(handle("select color, id from apples where name = 'Fuji'", SAMPLE_DB))
+    [['Red', 2]]
+    >>> list(handle("select * from apples where id = 3", SAMPLE_DB))
+    [[3, 'Honeycrisp', 'Blush Red']]
+    >>> list(handle("select count(*) from apples where id between 2 and 3", SAMPLE_DB))
+    [2]
+    >>> list(handle("explain query plan select * from apples where id = 3", SAMPLE_DB))
+    ['SEARCH apples USING INTEGER PRIMARY KEY (rowid=?)']
+    >>> list(handle("explain query plan select * from apples", SAMPLE_DB))
+    ['SCAN apples']
+    """
+    with Connection(
+        database_file_path, processes=processes, ordered=ordered
+    ) as connection:
+        yield from connection.execute(sql)
+
+
+class Connection:
+    """A long-lived session on a database file
+
+    The page source, parsed schema and page cache are kept between queries. Before
+    each query the file change counter is checked, and everything is reloaded if
+    another connection has written to the file since. In WAL mode new commits are
+    read from the WAL instead, and only the pages they changed are dropped.
+
+    What a reload replaces is closed as soon as no cursor from before it is still
+    being read, or otherwise once the last of those cursors is dropped.
     """
-    db_info = DbInfo(database_file_path)
-    select_count = re.compile(
-        r"SELECT COUNT\(\*\) FROM (?P<table_name>\w+)", re.IGNORECASE
-    )
-    select_star = re.compile(r"SELECT \* FROM (?P<table_name>\w+)", re.IGNORECASE)
-    select_column = re.compile(
-        r"SELECT (?P<column>\w+) FROM (?P<table_name>\w+)", re.IGNORECASE
-    )
-    if (match := select_count.search(sql)) is not None:
-        table_name = match.group("table_name")
-        child_rows = db_info.find_table(table_name)._generate_child_rows()
-        batched = itertools.batched(child_rows, 1000)
-        yield sum(map(len, batched))
-    elif (match := select_star.search(sql)) is not None:
-        table_name = match.group("table_name")
-        yield from db_info.find_table(table_name).child_rows
-    elif (match := select_column.search(sql)) is not None:
-        table_name = match.group("table_name")
-        column_name = match.group("column")
-        yield from (row[1] for row in db_info.find_table(table_name).child_rows)
-    else:
-        yield f"Invalid command: {sql}"
+
+    def __init__(
+        self,
+        database_file_path,
+        cache_pages=DEFAULT_CACHE_PAGES,
+        cache_bytes=None,
+        processes=None,
+        plan_cache_size=PLAN_CACHE_SIZE,
+        page_source="mmap",
+        ordered=True,
+    ):
+        self.database_file_path = database_file_path
+        self.processes = processes
+        self.ordered = ordered  # whether parallel scans keep rows in rowid order
+        self.page_source = page_source
+        self.plan_cache_size = plan_cache_size
+        self._cache_pages = cache_pages
+        self._cache_bytes = cache_bytes
+        self._plans = OrderedDict()
+        # Cursors and batch generators reading db_info, which a reload must wait for
+        self._readers = weakref.WeakSet()
+        self.db_info = self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def execute(self, sql, parameters=()):
+        """Run a query with its ``?`` bound to parameters, returning a Cursor
+
+        The Cursor's ``stats`` say what the query cost, once it has been fetched.
+        """
+        start = perf_counter()
+        plan = self.prepare(sql)
+        prepare_seconds = perf_counter() - start
+        cursor = plan.execute(self.db_info, parameters, self.processes, self.ordered)
+        cursor.stats.prepare_seconds = prepare_seconds
+        self._readers.add(cursor)
+        return cursor
+
+    def prepare(self, sql):
+        """The plan for a statement, parsed once and then taken from the plan cache"""
+        self._check_for_changes()
+        if (plan := self._plans.get(sql)) is not None:
+            self._plans.move_to_end(sql)
+            return plan
+        plan = prepare(self.db_info, sql)
+        if self.plan_cache_size > 0:
+            self._plans[sql] = plan
+            if len(self._plans) > self.plan_cache_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def scan_batches(
+        self, table_name, column_names=None, pages_per_batch=DEFAULT_PAGES_PER_BATCH
+    ):
+        """Generate a table's columns as arrays, a Batch per few leaf pages"""
+        self._check_for_changes()
+        batches = scan_batches(self.db_info, table_name, column_names, pages_per_batch)
+        self._readers.add(batches)
+        return batches
+
+    def close(self):
+        self.db_info.close()
+
+    def _check_for_changes(self):
+        changed = self.db_info.refresh()
+        if changed is None or self.db_info.change_counter != self._change_counter:
+            logger.info(f"{self.database_file_path} changed: reloading the schema")
+            self._retire(self.db_info)
+            self.db_info = self._open()
+        elif changed and self.db_info.schema_cookie != self._schema_cookie:
+            self._schema_cookie = self.db_info.schema_cookie
+            self._plans.clear()  # root pages may have moved
+
+    def _retire(self, db_info):
+        """Close a DbInfo being reloaded, now if nothing is still reading it, or
+        else once every reader still unfinished has been dropped"""
+        reading = [reader for reader in self._readers if not _finished(reader)]
+        self._readers = weakref.WeakSet()
+        if not reading:
+            db_info.close()
+            return
+        unfinished = len(reading)
+
+        def dropped():
+            nonlocal unfinished
+            unfinished -= 1
+            if unfinished == 0:
+                db_info.close()
+
+        for reader in reading:
+            weakref.finalize(reader, dropped)
+
+    def _open(self):
+        db_info = DbInfo(
+            self.database_file_path,
+            self._cache_pages,
+            self._cache_bytes,
+            self.page_source,
+        )
+        self._change_counter = db_info.change_counter
+        self._schema_cookie = db_info.schema_cookie
+        self._plans.clear()  # root pages may have moved
+        return db_info
+
+
+def _finished(reader):
+    """Whether a Cursor or a generator has nothing left to read"""
+    if isinstance(reader, Cursor):
+        return reader.done
+    return reader.gi_frame is None
 
 
 if __name__ == "__main__":
@@ -0,0 +1,36 @@
+"""Table scans walked in Rust, with the GIL released
+
+``_lowlevel.TableScan`` walks a table b-tree over a page source's ``buffer``, the
+whole file, finding its leaves and decoding their records without the GIL, and
+only takes it back to build each batch of rows. Counting rows, with or without a
+WHERE test of one column, never takes it back at all, so other threads run while
+a count does.
+
+The pages it walks don't go through the page cache. Records it can't read, such
+as those spilling onto overflow pages, are handed back by page and cell number
+for Python to decode.
+
+A scan can only be native if the Rust extension is built and the page source has
+the whole file in one buffer: not ``pread``, and not a database in WAL mode,
+whose latest pages are in the WAL.
+"""
+
+try:
+    from codecrafters_sqlite._lowlevel import TableScan
+except ImportError:  # the Rust extension hasn't been built
+    TableScan = None
+
+PAGES_PER_BATCH = 16  # leaf pages decoded per release of the GIL, at most
+LEAVES_PER_BATCH = 64  # leaf pages found per release, when not reading ahead
+
+
+def available(page_source):
+    """Whether the tables read through a page source can be scanned natively"""
+    return TableScan is not None and page_source.buffer is not None
+
+
+def table_scan(page_source, root_page, usable_size):
+    """A TableScan of the table b-tree at root_page, or None if it can't be native"""
+    if not available(page_source):
+        return None
+    return TableScan(page_source.buffer, page_source.page_size, usable_size, root_page)
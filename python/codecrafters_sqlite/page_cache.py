@@ -0,0 +1,74 @@
+from collections import OrderedDict
+
+DEFAULT_CACHE_PAGES = 2000
+
+
+class PageCache:
+    """Least-recently-used cache of parsed pages, keyed by page number
+
+    ``load_page`` builds a page on a miss. The cache holds at most ``max_pages`` pages,
+    or ``max_bytes`` worth of ``page_size`` pages if that is smaller. Leaf pages are
+    evicted before any interior page, because every lookup goes through the interior
+    pages.
+    """
+
+    def __init__(
+        self, load_page, max_pages=DEFAULT_CACHE_PAGES, max_bytes=None, page_size=4096
+    ):
+        self._load_page = load_page
+        self.max_pages = max_pages
+        if max_bytes is not None:
+            self.max_pages = min(self.max_pages, max_bytes // page_size)
+        self._interior_pages = OrderedDict()
+        self._leaf_pages = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.interior_reads = 0
+        self.leaf_reads = 0
+
+    def __len__(self):
+        return len(self._interior_pages) + len(self._leaf_pages)
+
+    def __contains__(self, page_number):
+        return page_number in self._interior_pages or page_number in self._leaf_pages
+
+    def page(self, page_number):
+        if (cached := self._interior_pages.get(page_number)) is not None:
+            self._interior_pages.move_to_end(page_number)
+            self.hits += 1
+            self.interior_reads += 1
+            return cached
+        if (cached := self._leaf_pages.get(page_number)) is not None:
+            self._leaf_pages.move_to_end(page_number)
+            self.hits += 1
+            self.leaf_reads += 1
+            return cached
+        self.misses += 1
+        page = self._load_page(page_number)
+        pages = self._leaf_pages
+        if page.page_type.is_interior():
+            pages = self._interior_pages
+            self.interior_reads += 1
+        else:
+            self.leaf_reads += 1
+        if self.max_pages > 0:
+            pages[page_number] = page
+            self._evict()
+        return page
+
+    def clear(self):
+        self._interior_pages.clear()
+        self._leaf_pages.clear()
+
+    def discard(self, page_numbers):
+        """Forget pages that have changed"""
+        for page_number in page_numbers:
+            self._interior_pages.pop(page_number, None)
+            self._leaf_pages.pop(page_number, None)
+
+    def _evict(self):
+        while len(self) > self.max_pages:
+            pages = self._leaf_pages or self._interior_pages
+            pages.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,231 @@
+"""Where pages come from: an mmap of the file, pread into a buffer pool, or bytes
+
+A PageSource hands out read-only views of whole pages by page number, and reads
+the header's fields afresh on request. DbPage only ever slices what it is given,
+so any of them can sit under a DbInfo:
+
+- ``mmap`` maps the whole file, so pages cost nothing to read but faults go to
+  the kernel, and a file truncated under the map raises SIGBUS.
+- ``pread`` reads pages with ``os.pread`` into a pool of at most ``pool_pages``
+  pages, and runs of adjacent pages that a scan is about to visit with one
+  ``os.preadv``. Errors, such as from a truncated file, are Python exceptions.
+- ``bytes`` reads the whole file into memory once, so it never sees later
+  writes.
+
+A page's buffer is never reused: evicting it from the pool drops the pool's
+reference, and pages or cells still viewing it keep it alive.
+
+Sources holding the whole file in one buffer, ``mmap`` and ``bytes``, expose it
+as ``buffer`` for the Rust table scanner in ``native`` to walk.
+"""
+
+import os
+import weakref
+from collections import OrderedDict
+from mmap import ACCESS_READ, mmap
+from pathlib import Path
+
+from codecrafters_sqlite import _read_integer
+from codecrafters_sqlite.readahead import READAHEAD_BYTES, Advisor
+
+PAGE_SIZE_OFFSET = 16
+DEFAULT_POOL_PAGES = 256
+MAX_VECTORED_PAGES = 1024  # at most IOV_MAX buffers per preadv
+
+
+class PageSource:
+    """Pages of a database file, by page number from 1
+
+    ``window`` is how many pages ``will_need`` should be given at a time during
+    a scan, or 0 if reading ahead does nothing. ``buffer`` is the whole file, if
+    the source has it in one buffer.
+    """
+
+    window = 0
+    buffer = None
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def page(self, page_number):
+        """A read-only view of a whole page"""
+        raise NotImplementedError
+
+    def read(self, offset, size):
+        """Bytes from anywhere in the file, read afresh, such as header fields"""
+        raise NotImplementedError
+
+    def scan(self):
+        """A scan is starting"""
+
+    def lookup(self):
+        """A point lookup is starting"""
+
+    def will_need(self, page_numbers):
+        """Pages that are about to be visited"""
+
+    def refresh(self):
+        """Catch up with writes, returning the numbers of the pages they changed,
+        or None if any page may have changed"""
+        return set()
+
+    def close(self):
+        pass
+
+
+class BytesSource(PageSource):
+    """Pages of a database held in memory, such as from ``sqlite3.serialize``"""
+
+    def __init__(self, data, page_size=None):
+        super().__init__(page_size or read_page_size(data))
+        self._view = memoryview(data).toreadonly()
+        self.buffer = data
+
+    @classmethod
+    def from_file(cls, database_file_path):
+        return cls(Path(database_file_path).read_bytes())
+
+    def page(self, page_number):
+        start = self.page_size * (page_number - 1)
+        return self._view[start : start + self.page_size]
+
+    def read(self, offset, size):
+        return bytes(self._view[offset : offset + size])
+
+    def close(self):
+        self._view.release()
+
+
+class MmapSource(PageSource):
+    """Pages of a file mapped whole, with the kernel advised how they are read"""
+
+    def __init__(self, database_file_path):
+        with open(database_file_path, "rb") as database_file:
+            self._mmap = mmap(database_file.fileno(), 0, access=ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self.buffer = self._mmap
+        super().__init__(read_page_size(self._mmap))
+        self.advisor = Advisor(self._mmap, self.page_size)
+
+    @property
+    def window(self):
+        return self.advisor.window if self.advisor.enabled else 0
+
+    def page(self, page_number):
+        start = self.page_size * (page_number - 1)
+        return self._view[start : start + self.page_size]
+
+    def read(self, offset, size):
+        return self._mmap[offset : offset + size]
+
+    def scan(self):
+        self.advisor.scan()
+
+    def lookup(self):
+        self.advisor.lookup()
+
+    def will_need(self, page_numbers):
+        self.advisor.will_need(page_numbers)
+
+    def close(self):
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # views still held by callers keep the map open until they go
+
+
+class PreadSource(PageSource):
+    """Pages read on demand into a least-recently-used pool of page buffers"""
+
+    def __init__(self, database_file_path, pool_pages=DEFAULT_POOL_PAGES):
+        self._fd = os.open(database_file_path, os.O_RDONLY)
+        # Closes the file if the source is dropped without being closed
+        self._close_fd = weakref.finalize(self, os.close, self._fd)
+        try:
+            super().__init__(read_page_size(os.pread(self._fd, 100, 0)))
+        except BaseException:
+            self._close_fd()
+            raise
+        self.pool_pages = max(1, pool_pages)
+        # Half the pool at most, so that reading ahead never evicts its own pages
+        self.window = max(
+            1, min(READAHEAD_BYTES // self.page_size, self.pool_pages // 2)
+        )
+        if not hasattr(os, "preadv"):
+            self.window = 0
+        self._pool = OrderedDict()
+        self.reads = 0  # system calls, vectored or not
+
+    def page(self, page_number):
+        if (view := self._pool.get(page_number)) is not None:
+            self._pool.move_to_end(page_number)
+            return view
+        start = self.page_size * (page_number - 1)
+        data = os.pread(self._fd, self.page_size, start)
+        self.reads += 1
+        if len(data) < self.page_size:
+            raise ValueError(
+                f"Page {page_number} ends {self.page_size - len(data)} bytes early:"
+                " the file is truncated"
+            )
+        return self._keep(page_number, memoryview(data))
+
+    def read(self, offset, size):
+        self.reads += 1
+        return os.pread(self._fd, size, offset)
+
+    def will_need(self, page_numbers):
+        """Read the pages not yet in the pool, a run of adjacent pages per call"""
+        missing = sorted(n for n in set(page_numbers) if n not in self._pool)
+        run = []
+        for page_number in missing:
+            if run and (page_number != run[-1] + 1 or len(run) == MAX_VECTORED_PAGES):
+                self._read_run(run)
+                run = []
+            run.append(page_number)
+        if run:
+            self._read_run(run)
+
+    def close(self):
+        self._pool.clear()
+        self._close_fd()
+        self._fd = -1
+
+    def _read_run(self, run):
+        buffers = [bytearray(self.page_size) for _ in run]
+        length = os.preadv(self._fd, buffers, self.page_size * (run[0] - 1))
+        self.reads += 1
+        for page_number, buffer in zip(run, buffers):
+            if length < self.page_size:
+                return  # past the end of the file: page() will say so if asked
+            length -= self.page_size
+            self._keep(page_number, memoryview(buffer).toreadonly())
+
+    def _keep(self, page_number, view):
+        self._pool[page_number] = view
+        if len(self._pool) > self.pool_pages:
+            self._pool.popitem(last=False)
+        return view
+
+
+def read_page_size(header):
+    """The page size from a database header, where 1 means 65536"""
+    page_size = _read_integer(header, PAGE_SIZE_OFFSET, 2)
+    return 65536 if page_size == 1 else page_size
+
+
+PAGE_SOURCES = {
+    "mmap": MmapSource,
+    "pread": PreadSource,
+    "bytes": BytesSource.from_file,
+}
+
+
+def open_page_source(database_file_path, kind="mmap"):
+    """Open a database file as a PageSource of a kind in PAGE_SOURCES"""
+    if kind not in PAGE_SOURCES:
+        raise ValueError(
+            f"Unknown page source {kind}: choose from {', '.join(PAGE_SOURCES)}"
+        )
+    return PAGE_SOURCES[kind](database_file_path)
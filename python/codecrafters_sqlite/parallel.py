@@ -0,0 +1,217 @@
+"""Full table scans split across worker processes, one b-tree subtree range each
+
+Every worker opens its own read-only mmap of the database file, so only the
+page numbers of the subtrees go out and only rows or partial aggregates come
+back.
+
+Rows stream back a few leaf pages at a time: only about two tasks per process
+are in flight at once, so however big the table, only their rows are held.
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import partial
+
+from codecrafters_sqlite import tracing
+from codecrafters_sqlite.aggregate import combine_groups, partial_groups
+
+TASKS_PER_PROCESS = 4
+TASKS_IN_FLIGHT_PER_PROCESS = 2
+LEAVES_PER_TASK = 16
+
+_db_info = None  # the worker's own DbInfo, opened by _open_database
+
+
+def split_subtrees(table, parts):
+    """The page numbers of at least ``parts`` subtrees of a table, in rowid order
+
+    Interior pages are expanded a level at a time until there are enough
+    subtrees or only leaves are left.
+    """
+    pages = [table]
+    while len(pages) < parts:
+        expanded = []
+        for page in pages:
+            expanded.extend(page.children if page.page_type.is_interior() else (page,))
+        if len(expanded) == len(pages):
+            break
+        pages = expanded
+    return [page.page_number for page in pages]
+
+
+def subtree_ranges(table, processes):
+    """Group a table's subtrees into contiguous ranges, a few per process"""
+    parts = processes * TASKS_PER_PROCESS
+    page_numbers = split_subtrees(table, parts)
+    size = -(-len(page_numbers) // parts)
+    return [
+        tuple(page_numbers[start : start + size])
+        for start in range(0, len(page_numbers), size)
+    ]
+
+
+def leaf_batches(table, leaves_per_batch=LEAVES_PER_TASK):
+    """Generate the page numbers of a table's leaves, a few at a time in rowid
+    order, reading only interior pages and the first child of each"""
+    if table.page_type.is_leaf():
+        yield [table.page_number]
+        return
+    page_numbers = table._child_page_numbers()
+    if table._page_at(page_numbers[0]).page_type.is_leaf():
+        for start in range(0, len(page_numbers), leaves_per_batch):
+            yield page_numbers[start : start + leaves_per_batch]
+        return
+    for page_number in page_numbers:
+        yield from leaf_batches(table._page_at(page_number), leaves_per_batch)
+
+
+def parallel_scan(
+    db_info,
+    table_name,
+    column_indices=None,
+    rowid_column=None,
+    ordered=True,
+    processes=None,
+):
+    """Generate a table's rows, decoded by worker processes
+
+    Rows are projected to ``column_indices``, with the rowid for a NULL in
+    ``rowid_column``, or are the table's every column if not given. With
+    ``ordered`` they come back in rowid order; otherwise each batch of leaves is
+    yielded as soon as it is done.
+    """
+    schema = db_info.table_schema(table_name)
+    if column_indices is None:
+        column_indices = list(range(len(schema.columns)))
+        rowid_column = schema.rowid_column
+    processes = processes or os.cpu_count() or 1
+    batches = leaf_batches(db_info.find_table(table_name))
+    scan_batch = partial(
+        _scan_range,
+        column_indices=column_indices,
+        rowid_column=rowid_column,
+        conversions=schema.conversions(column_indices),
+    )
+    with _executor(db_info, processes) as executor:
+        for rows in _bounded_map(
+            executor,
+            scan_batch,
+            batches,
+            processes * TASKS_IN_FLIGHT_PER_PROCESS,
+            ordered,
+        ):
+            yield from rows
+
+
+def parallel_count(db_info, table_name, processes=None):
+    """Count a table's rows, each worker counting its subtrees' leaf cells"""
+    ranges, processes = _ranges(db_info, table_name, processes)
+    with _executor(db_info, processes) as executor:
+        return sum(executor.map(_count_range, ranges))
+
+
+def parallel_aggregate(
+    db_info,
+    table_name,
+    aggregates,
+    group_indices=(),
+    rowid_column=None,
+    processes=None,
+):
+    """Aggregate a table like aggregate(), generating ``(group key, values)``
+
+    Each worker folds its subtrees into partial results per group, so no rows
+    come back, and they are combined here in key order.
+    """
+    ranges, processes = _ranges(db_info, table_name, processes)
+    schema = db_info.table_schema(table_name)
+    aggregate_range = partial(
+        _aggregate_range,
+        aggregates=aggregates,
+        group_indices=group_indices,
+        rowid_column=rowid_column,
+        conversions=schema.conversions(range(len(schema.columns))),
+    )
+    with _executor(db_info, processes) as executor:
+        runs = list(executor.map(aggregate_range, ranges))
+    return combine_groups(aggregates, runs)
+
+
+def _bounded_map(executor, function, tasks, in_flight, ordered):
+    """Generate function's result for each task, with at most in_flight of them
+    submitted but not yet taken, in order or as they are done"""
+    tasks = iter(tasks)
+    pending = deque()
+    try:
+        while True:
+            while len(pending) < in_flight and (task := next(tasks, None)) is not None:
+                pending.append(executor.submit(function, task))
+            if not pending:
+                return
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def _ranges(db_info, table_name, processes):
+    processes = processes or os.cpu_count() or 1
+    return subtree_ranges(db_info.find_table(table_name), processes), processes
+
+
+def _executor(db_info, processes):
+    # Spawned rather than forked: workers share nothing with this process anyway
+    return ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_open_database,
+        initargs=(db_info.database_file_path, db_info.page_source_kind),
+    )
+
+
+def _open_database(database_file_path, page_source):
+    global _db_info
+    # Imported here: main imports this module for handle()
+    from codecrafters_sqlite.main import DbInfo
+
+    _db_info = DbInfo(database_file_path, page_source=page_source)
+
+
+def _cells(page_numbers):
+    tracing.refresh()
+    _db_info.page_source.scan()
+    for page_number in page_numbers:
+        yield from _db_info.page_cache.page(page_number)._generate_child_rows()
+
+
+def _scan_range(page_numbers, column_indices, rowid_column, conversions):
+    rows = []
+    for cell in _cells(page_numbers):
+        rows.append(row := cell.project(column_indices, rowid_column))
+        if conversions:
+            conversions.apply(row, cell)
+    return rows
+
+
+def _count_range(page_numbers):
+    return sum(
+        _db_info.page_cache.page(page_number).count_rows()
+        for page_number in page_numbers
+    )
+
+
+def _aggregate_range(
+    page_numbers, aggregates, group_indices, rowid_column, conversions
+):
+    cells = _cells(page_numbers)
+    return list(
+        partial_groups(cells, aggregates, group_indices, rowid_column, conversions)
+    )
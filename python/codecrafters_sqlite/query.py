@@ -0,0 +1,693 @@
+"""Statements parsed once into plans that can be executed many times"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from enum import StrEnum
+from itertools import islice
+from time import perf_counter
+
+from codecrafters_sqlite import native, tracing
+from codecrafters_sqlite.aggregate import AGGREGATES, Aggregate, aggregate
+from codecrafters_sqlite.cells import decode
+from codecrafters_sqlite.parallel import (
+    parallel_aggregate,
+    parallel_count,
+    parallel_scan,
+)
+from codecrafters_sqlite.schema import Conversions, with_affinity
+from codecrafters_sqlite.stats import QueryStats, totals
+
+PLAN_CACHE_SIZE = 256
+
+_explain_query_plan = re.compile(
+    r"\s*EXPLAIN QUERY PLAN\s+(?P<statement>.*)", re.IGNORECASE | re.DOTALL
+)
+_select_count = re.compile(
+    r"SELECT COUNT\(\*\) FROM (?P<table_name>\w+)", re.IGNORECASE
+)
+_select_star = re.compile(r"SELECT \* FROM (?P<table_name>\w+)", re.IGNORECASE)
+_item = r"\w+(?:\s*\(\s*(?:\*|\w+)\s*\))?"
+_select_columns = re.compile(
+    rf"SELECT (?P<columns>{_item}(?:\s*,\s*{_item})*) FROM (?P<table_name>\w+)",
+    re.IGNORECASE,
+)
+_aggregate_item = re.compile(r"(?P<function>\w+)\s*\(\s*(?P<argument>\*|\w+)\s*\)")
+_group_by = re.compile(r"GROUP BY (?P<columns>\w+(?:\s*,\s*\w+)*)\s*$", re.IGNORECASE)
+_operand = r"'(?:[^']|'')*'|[-+]?\d+(?:\.\d*)?|NULL\b|\?"
+_where = re.compile(
+    r"WHERE (?P<column>\w+)\s*(?:"
+    rf"(?P<operator><=|>=|=|<|>)\s*(?P<value>{_operand})"
+    rf"|BETWEEN\s+(?P<lo>{_operand})\s+AND\s+(?P<hi>{_operand})"
+    r"|IS\s+(?P<not>NOT\s+)?NULL"
+    rf"|LIKE\s+(?P<pattern>{_operand})"
+    r")\s*(?:GROUP BY\b.*)?$",
+    re.IGNORECASE,
+)
+
+# Storage classes, in the order SQLite sorts them
+NULL, NUMBER, TEXT, BLOB = range(4)
+
+
+class Statement(StrEnum):
+    EXPLAIN = "explain"
+    COUNT = "count"
+    SELECT = "select"
+    AGGREGATE = "aggregate"
+
+
+class Access(StrEnum):
+    """How a plan finds its rows"""
+
+    ROWID = "rowid"
+    ROWID_RANGE = "rowid range"
+    INDEX = "index"
+    FILTER = "filter"
+    SCAN = "scan"
+
+
+@dataclass(frozen=True)
+class Parameter:
+    """A ``?`` placeholder, numbered from 0 in the order it appears"""
+
+    number: int
+
+
+@dataclass(frozen=True)
+class Predicate:
+    """A WHERE clause testing one column against literals or parameters
+
+    ``column_index`` is None for the rowid of a table with no column aliasing it.
+    Literal operands already have the column's ``affinity`` applied, as SQLite
+    does when comparing a column with a value, and parameters get it when bound.
+    Rows written before the column was added hold its ``default``.
+    """
+
+    column_name: str
+    column_index: int | None
+    operator: str
+    operands: tuple
+    affinity: str = "BLOB"
+    default: object = None
+
+    def bind(self, parameters):
+        return tuple(
+            (
+                with_affinity(parameters[operand.number], self.affinity)
+                if isinstance(operand, Parameter)
+                else operand
+            )
+            for operand in self.operands
+        )
+
+    def compile(self, operands, rowid_column=None):
+        """A test of table leaf cells for one set of bound operands
+
+        The column's serial type settles most rows before anything is decoded: only
+        numbers are decoded, and text and blobs are compared as raw bytes, so text
+        equality is a comparison of encoded bytes.
+        """
+        column_index = self.column_index
+        default = _operand_key(self.default) or (NULL, None)
+
+        def column(cell):
+            if self.default is not None and column_index >= cell.column_count:
+                return default
+            return _raw_column(cell, column_index, rowid_column)
+
+        match self.operator:
+            case "is null":
+                return lambda cell: column(cell)[0] == NULL
+            case "is not null":
+                return lambda cell: column(cell)[0] != NULL
+            case "like":
+                return _like(column, *operands)
+        keys = [_operand_key(operand) for operand in operands]
+        if None in keys:
+            return lambda cell: False  # nothing compares true with NULL
+        if self.operator == "=":
+            ((storage_class, value),) = keys
+
+            def equal(cell):
+                column_class, raw = column(cell)
+                return column_class == storage_class and raw == value
+
+            return equal
+
+        def ordered(cell):
+            column_class, raw = column(cell)
+            if column_class == NULL:
+                return False
+            key = column_class, raw if column_class == NUMBER else bytes(raw)
+            match self.operator:
+                case "between":
+                    return keys[0] <= key <= keys[1]
+                case "<":
+                    return key < keys[0]
+                case "<=":
+                    return key <= keys[0]
+                case ">":
+                    return key > keys[0]
+                case ">=":
+                    return key >= keys[0]
+
+        return ordered
+
+    def rowid_bounds(self, operands):
+        """The lowest and highest rowid a comparison of numbers with the rowid
+        selects, None where it is unbounded"""
+        match self.operator, operands:
+            case "between", (lo, hi):
+                return math.ceil(lo), math.floor(hi)
+            case ">", (value,):
+                return math.floor(value) + 1, None
+            case ">=", (value,):
+                return math.ceil(value), None
+            case "<", (value,):
+                return None, math.ceil(value) - 1
+            case "<=", (value,):
+                return None, math.floor(value)
+
+
+class Cursor:
+    """The results of a query, read from the b-tree only as they are fetched
+
+    Nothing is decoded until the first fetch, and only one leaf page at a time is
+    walked, so memory use doesn't grow with the size of the table.
+    """
+
+    arraysize = 1
+
+    def __init__(self, results, stats=None):
+        self._results = iter(results)
+        self.stats = QueryStats() if stats is None else stats
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._results)
+
+    def fetchone(self):
+        """The next result, or None when there are no more"""
+        return next(self._results, None)
+
+    def fetchmany(self, size=None):
+        """Up to ``size`` more results, ``arraysize`` by default"""
+        return list(islice(self._results, self.arraysize if size is None else size))
+
+    def fetchall(self):
+        return list(self._results)
+
+    @property
+    def done(self):
+        """Whether every result has been fetched, or the cursor closed"""
+        return getattr(self._results, "gi_frame", None) is None
+
+    def close(self):
+        if hasattr(self._results, "close"):
+            self._results.close()
+
+
+@dataclass
+class Plan:
+    """A parsed statement with its access path chosen, ready to run many times"""
+
+    statement: Statement
+    table_name: str = ""
+    root_page: int = 0
+    column_indices: list[int] | None = None  # None for SELECT *
+    aggregates: list[Aggregate] = field(default_factory=list)
+    group_indices: list[int] = field(default_factory=list)
+    # For an aggregate, whether each result column is from the group key, and its
+    # position in the key or in the aggregates
+    selected: list[tuple[bool, int]] = field(default_factory=list)
+    rowid_column: int | None = None
+    predicate: Predicate | None = None
+    access: Access = Access.SCAN
+    index_root_page: int = 0
+    index_name: str = ""
+    column_count: int = 0  # the table's, for counting the columns left undecoded
+    conversions: Conversions = field(default_factory=Conversions)
+    parameter_count: int = 0
+    error: str | None = None
+
+    @property
+    def projection(self):
+        """The columns a row is made of, which for SELECT * is every column"""
+        if self.column_indices is None:
+            return list(range(self.column_count))
+        return self.column_indices
+
+    @property
+    def description(self):
+        """The access path, described like SQLite's EXPLAIN QUERY PLAN"""
+        match self.access:
+            case Access.ROWID:
+                return f"SEARCH {self.table_name} USING INTEGER PRIMARY KEY (rowid=?)"
+            case Access.ROWID_RANGE:
+                bounds = {
+                    "between": "rowid>? AND rowid<?",
+                    ">": "rowid>?",
+                    ">=": "rowid>?",
+                    "<": "rowid<?",
+                    "<=": "rowid<?",
+                }[self.predicate.operator]
+                return f"SEARCH {self.table_name} USING INTEGER PRIMARY KEY ({bounds})"
+            case Access.INDEX:
+                return (
+                    f"SEARCH {self.table_name} USING INDEX {self.index_name}"
+                    f" ({self.predicate.column_name}=?)"
+                )
+        return f"SCAN {self.table_name}"
+
+    def execute(self, db_info, parameters=(), processes=None, ordered=True):
+        """Run the plan with ``?`` bound to ``parameters``, returning a Cursor
+
+        With ``processes``, a full table scan is split across worker processes,
+        and unless ``ordered`` its rows come back in whatever order they are
+        decoded. The Cursor's ``stats`` count what the query costs as it is fetched.
+        """
+        if len(parameters) != self.parameter_count:
+            raise ValueError(
+                f"{self.parameter_count} parameters needed, {len(parameters)} given"
+            )
+        stats = QueryStats(access=self.description if self.error is None else "")
+        results = self._results(db_info, tuple(parameters), processes, ordered, stats)
+        return Cursor(self._measured(results, db_info, stats), stats)
+
+    def cells(self, db_info, parameters=(), stats=None):
+        """Generate the table cells the access path finds, in rowid or index order
+
+        Every cell read, matching or not, is counted into ``stats``.
+        """
+        tracing.refresh()
+        stats = QueryStats() if stats is None else stats
+        table = db_info.page_cache.page(self.root_page)
+        operands = () if self.predicate is None else self.predicate.bind(parameters)
+        match self.access:
+            case Access.ROWID:
+                db_info.page_source.lookup()
+                (rowid,) = operands
+                if isinstance(rowid, float) and rowid.is_integer():
+                    rowid = int(rowid)
+                if isinstance(rowid, int):
+                    if (cell := table.lookup(rowid)) is not None:
+                        stats.cells += 1
+                        yield cell
+            case Access.ROWID_RANGE if all(map(_is_number, operands)):
+                for cell in table.scan_range(*self.predicate.rowid_bounds(operands)):
+                    stats.cells += 1
+                    yield cell
+            case Access.INDEX if None not in operands:
+                # Nothing equals NULL, though the index has entries for NULLs
+                db_info.page_source.lookup()
+                index = db_info.page_cache.page(self.index_root_page)
+                for index_cell in index.search_index(*operands):
+                    stats.cells += 1
+                    if (cell := table.lookup(index_cell.rowid)) is not None:
+                        stats.cells += 1
+                        yield cell
+            case Access.FILTER | Access.ROWID_RANGE:
+                test = self.predicate.compile(operands, self.rowid_column)
+                db_info.page_source.scan()
+                for cell in table._generate_child_rows():
+                    stats.cells += 1
+                    if test(cell):
+                        yield cell
+            case Access.SCAN:
+                db_info.page_source.scan()
+                for cell in table._generate_child_rows():
+                    stats.cells += 1
+                    yield cell
+
+    def _measured(self, results, db_info, stats):
+        """Pass results through, timing them and counting the pages they read"""
+        cache = db_info.page_cache
+        interior, leaf = cache.interior_reads, cache.leaf_reads
+        hits, misses = cache.hits, cache.misses
+        bytes_copied = totals.bytes_copied
+        start = perf_counter()
+        try:
+            for result in results:
+                if not stats.rows:
+                    stats.first_row_seconds = perf_counter() - start
+                stats.rows += 1
+                yield result
+        finally:
+            stats.execute_seconds = perf_counter() - start
+            stats.interior_pages += cache.interior_reads - interior
+            stats.leaf_pages += cache.leaf_reads - leaf
+            stats.cache_hits += cache.hits - hits
+            stats.cache_misses += cache.misses - misses
+            stats.bytes_copied += totals.bytes_copied - bytes_copied
+            stats.columns_skipped = max(
+                0, stats.cells * self.column_count - stats.columns_decoded
+            )
+
+    def _results(self, db_info, parameters, processes, ordered, stats):
+        if self.error is not None:
+            yield self.error
+            return
+        parallel = processes and self.access == Access.SCAN
+        match self.statement:
+            case Statement.EXPLAIN:
+                yield self.description
+            case Statement.COUNT if parallel:
+                yield parallel_count(db_info, self.table_name, processes)
+            case Statement.COUNT if self.access == Access.SCAN:
+                yield db_info.page_cache.page(self.root_page).count_rows()
+            case Statement.COUNT:
+                yield self._count(db_info, parameters, stats)
+            case Statement.AGGREGATE:
+                if parallel:
+                    groups = parallel_aggregate(
+                        db_info,
+                        self.table_name,
+                        self.aggregates,
+                        self.group_indices,
+                        self.rowid_column,
+                        processes,
+                    )
+                else:
+                    groups = aggregate(
+                        self.cells(db_info, parameters, stats),
+                        self.aggregates,
+                        self.group_indices,
+                        self.rowid_column,
+                        self.conversions,
+                    )
+                for key, values in groups:
+                    row = [
+                        key[number] if is_group else values[number]
+                        for is_group, number in self.selected
+                    ]
+                    yield row[0] if len(row) == 1 else row
+                columns = {a.column_index for a in self.aggregates}
+                columns = (columns | set(self.group_indices)) - {None}
+                stats.columns_decoded += stats.cells * len(columns)
+            case Statement.SELECT:
+                single = len(self.column_indices or ()) == 1
+                rows = self._rows(db_info, parameters, processes, ordered, stats)
+                for row in rows:
+                    stats.columns_decoded += len(row)
+                    yield row[0] if single else row
+
+    def _rows(self, db_info, parameters, processes, ordered, stats):
+        if processes and self.access == Access.SCAN:
+            for row in parallel_scan(
+                db_info,
+                self.table_name,
+                self.projection,
+                self.rowid_column,
+                ordered,
+                processes,
+            ):
+                stats.cells += 1  # read by a worker
+                yield row
+            return
+        # Rust decodes missing columns as NULL, not as their defaults
+        native_scan = self.access == Access.SCAN and not self.conversions.defaults
+        if native_scan and native.available(db_info.page_source):
+            table = db_info.page_cache.page(self.root_page)
+            yield from self._native_rows(db_info, table, table._native_scan(), stats)
+            return
+        projection, conversions = self.projection, self.conversions
+        for cell in self.cells(db_info, parameters, stats):
+            row = cell.project(projection, self.rowid_column)
+            if conversions:
+                conversions.apply(row, cell)
+            stats.errors += cell.errors
+            yield row
+
+    def _native_rows(self, db_info, table, scan, stats):
+        """Generate the rows of a full scan decoded in Rust, a batch at a time
+
+        Batches start at one leaf page, so that the first row comes soon, and
+        double up to ``PAGES_PER_BATCH``. Records the scan couldn't decode are
+        decoded from their cells in Python.
+        """
+        tracing.refresh()
+        db_info.page_source.scan()
+        projection, rowid_column = self.projection, self.rowid_column
+        batch_pages = 1
+        for leaves in table._generate_native_leaves(scan):
+            while leaves:
+                batch, leaves = leaves[:batch_pages], leaves[batch_pages:]
+                batch_pages = min(batch_pages * 2, native.PAGES_PER_BATCH)
+                rows, undecoded = scan.rows(batch, projection, rowid_column)
+                db_info.page_cache.leaf_reads += len(batch)
+                for index, page_number, cell_number in undecoded:
+                    cell = table._page_at(page_number)._cell(cell_number)
+                    rows[index] = cell.project(projection, rowid_column)
+                    stats.errors += cell.errors
+                if self.conversions:
+                    for row in rows:
+                        self.conversions.apply(row, None)  # there are no defaults
+                stats.cells += len(rows)
+                yield from rows
+
+    def _count(self, db_info, parameters, stats):
+        """Count the rows the access path finds, testing a full scan in Rust if it
+        can, and in Python the cells Rust couldn't read"""
+        native_count = self.access == Access.FILTER and self.predicate.default is None
+        if not native_count or not native.available(db_info.page_source):
+            return sum(1 for _ in self.cells(db_info, parameters, stats))
+        table = db_info.page_cache.page(self.root_page)
+        scan = table._native_scan()
+        operands = self.predicate.bind(parameters)
+        tracing.refresh()
+        db_info.page_source.scan()
+        try:
+            count, undecided = scan.count_where(
+                self.predicate.column_index,
+                self.rowid_column,
+                self.predicate.operator,
+                operands,
+            )
+        except (ValueError, TypeError, OverflowError):
+            # LIKE, or operands such as integers too big for Rust to compare
+            return sum(1 for _ in self.cells(db_info, parameters, stats))
+        test = self.predicate.compile(operands, self.rowid_column)
+        for page_number, cell_number in undecided:
+            count += test(table._page_at(page_number)._cell(cell_number))
+        stats.cells += scan.cells
+        table._count_native_reads(scan)
+        return count
+
+
+def prepare(db_info, sql):
+    """Parse a statement and choose how to find its rows
+
+    >>> from codecrafters_sqlite.main import SAMPLE_DB, DbInfo
+    >>> plan = prepare(DbInfo(SAMPLE_DB), "select name from apples where id = ?")
+    >>> plan.access, plan.root_page, plan.column_indices, plan.parameter_count
+    (<Access.ROWID: 'rowid'>, 2, [1], 1)
+    >>> list(plan.execute(DbInfo(SAMPLE_DB), (3,)))
+    ['Honeycrisp']
+    """
+    if (match := _explain_query_plan.match(sql)) is not None:
+        plan = prepare(db_info, match.group("statement"))
+        if plan.error is None:
+            plan.statement = Statement.EXPLAIN
+        return plan
+    group_by = _group_by.search(sql)
+    if group_by is None and (match := _select_count.search(sql)) is not None:
+        statement, column_names = Statement.COUNT, None
+    elif (match := _select_star.search(sql)) is not None:
+        statement, column_names = Statement.SELECT, None
+    elif (match := _select_columns.search(sql)) is not None:
+        statement = Statement.SELECT
+        column_names = re.split(r"\s*,\s*", match.group("columns"))
+    else:
+        return Plan(Statement.SELECT, error=f"Invalid command: {sql}")
+
+    table_name = match.group("table_name")
+    if (table := db_info.find_table(table_name)) is None:
+        return Plan(statement, table_name, error=f"no such table: {table_name}")
+    schema = db_info.table_schema(table_name)
+    plan = Plan(
+        statement,
+        table_name,
+        table.page_number,
+        rowid_column=schema.rowid_column,
+        column_count=len(schema.column_names),
+    )
+    if group_by is not None or any(map(_aggregate_item.fullmatch, column_names or ())):
+        plan.statement = Statement.AGGREGATE
+        if error := _prepare_aggregates(plan, schema, column_names, group_by):
+            plan.error = error
+            return plan
+    elif column_names is not None:
+        plan.column_indices = [schema.column_index(name) for name in column_names]
+        if None in plan.column_indices:
+            missing = column_names[plan.column_indices.index(None)]
+            plan.error = f"no such column: {missing}"
+            return plan
+    plan.conversions = schema.conversions(plan.projection)
+
+    if (match := _where.search(sql)) is None:
+        return plan
+    if match.group("operator") is not None:
+        operator, operands = match.group("operator"), (match.group("value"),)
+    elif match.group("lo") is not None:
+        operator, operands = "between", (match.group("lo"), match.group("hi"))
+    elif match.group("pattern") is not None:
+        operator, operands = "like", (match.group("pattern"),)
+    else:
+        operator, operands = "is not null" if match.group("not") else "is null", ()
+    column_name = match.group("column")
+    column_index = schema.column_index(column_name)
+    is_rowid = schema.is_rowid(column_name)
+    if column_index is None and not is_rowid:
+        plan.error = f"no such column: {column_name}"
+        return plan
+    plan.parameter_count = sum(operand == "?" for operand in operands)
+    if operator == "like":
+        affinity = "BLOB"  # LIKE compares text whatever the column's affinity
+    elif column_index is None or column_index == schema.rowid_column:
+        affinity = "INTEGER"
+    else:
+        affinity = schema.columns[column_index].affinity
+    plan.predicate = Predicate(
+        column_name,
+        column_index,
+        operator,
+        tuple(_operands(operands, affinity)),
+        affinity,
+        None if column_index is None else schema.columns[column_index].default,
+    )
+    if is_rowid and operator == "=":
+        plan.access = Access.ROWID
+        return plan
+    if is_rowid and operator in ("between", "<", "<=", ">", ">="):
+        plan.access = Access.ROWID_RANGE
+        return plan
+    if operator == "=":
+        index, index_name = db_info.find_index(table_name, column_name)
+        if index is not None:
+            plan.access = Access.INDEX
+            plan.index_root_page, plan.index_name = index.page_number, index_name
+            return plan
+    plan.access = Access.FILTER
+    return plan
+
+
+def _prepare_aggregates(plan, schema, column_names, group_by):
+    """Fill in an aggregate plan's aggregates and group key, or return an error"""
+    group_names = [] if group_by is None else re.split(r"\s*,\s*", group_by["columns"])
+    plan.group_indices = [schema.column_index(name) for name in group_names]
+    if None in plan.group_indices:
+        return f"no such column: {group_names[plan.group_indices.index(None)]}"
+    group_names = [name.lower() for name in group_names]
+    for name in column_names or ("*",):
+        if (item := _aggregate_item.fullmatch(name)) is None:
+            if name.lower() not in group_names:
+                return f"{name} must appear in the GROUP BY clause"
+            plan.selected.append((True, group_names.index(name.lower())))
+            continue
+        function, argument = item["function"].lower(), item["argument"]
+        if function not in AGGREGATES:
+            return f"no such function: {item['function']}"
+        if argument == "*":
+            if function != "count":
+                return f"wrong number of arguments to function {function}()"
+            column_index = None
+        elif (column_index := schema.column_index(argument)) is None:
+            return f"no such column: {argument}"
+        plan.selected.append((False, len(plan.aggregates)))
+        plan.aggregates.append(Aggregate(function, column_index))
+
+
+def _raw_column(cell, column_index, rowid_column):
+    """The storage class of a column, with its value if it is a number or its raw
+    bytes if it is text or a blob"""
+    if column_index is None:
+        cell._read_payload_size_and_rowid()
+        return NUMBER, cell.rowid
+    serial_type_code, raw = cell.raw_column(column_index)
+    if serial_type_code >= 12:
+        return (TEXT if serial_type_code & 1 else BLOB), raw
+    if serial_type_code == 0:
+        if column_index == rowid_column:
+            cell._read_payload_size_and_rowid()
+            return NUMBER, cell.rowid
+        return NULL, None
+    value, _ = decode(raw, 0, serial_type_code)
+    return NUMBER, value
+
+
+def _operand_key(operand):
+    """An operand's storage class and its value as _raw_column gives it"""
+    match operand:
+        case None:
+            return None
+        case int() | float():
+            return NUMBER, operand
+        case str():
+            return TEXT, operand.encode()
+        case _:
+            return BLOB, bytes(operand)
+
+
+def _like(column, pattern):
+    """A test for LIKE, case-insensitive for ASCII letters as in SQLite, which
+    never matches blobs either
+
+    A pattern that is only a prefix followed by ``%`` compares raw bytes.
+    """
+    if pattern is None:
+        return lambda cell: False
+    pattern = str(pattern)
+    if "_" not in pattern and pattern.endswith("%") and "%" not in pattern[:-1]:
+        prefix = pattern[:-1].encode().lower()
+
+        def starts_with(cell):
+            column_class, raw = column(cell)
+            if column_class == NULL or column_class == BLOB:
+                return False
+            if column_class == NUMBER:
+                raw = str(raw).encode()
+            return bytes(raw[: len(prefix)]).lower() == prefix
+
+        return starts_with
+    regex = re.compile(
+        "".join(
+            ".*" if char == "%" else "." if char == "_" else re.escape(char)
+            for char in pattern
+        ),
+        re.IGNORECASE | re.ASCII | re.DOTALL,
+    )
+
+    def like(cell):
+        column_class, raw = column(cell)
+        if column_class == NULL or column_class == BLOB:
+            return False
+        text = str(raw) if column_class == NUMBER else str(raw, "utf-8")
+        return regex.fullmatch(text) is not None
+
+    return like
+
+
+def _is_number(value):
+    return isinstance(value, int | float) and not isinstance(value, bool)
+
+
+def _operands(texts, affinity):
+    parameters = 0
+    for text in texts:
+        if text == "?":
+            yield Parameter(parameters)
+            parameters += 1
+        else:
+            yield with_affinity(_literal(text), affinity)
+
+
+def _literal(text):
+    if text.upper() == "NULL":
+        return None
+    if text.startswith("'"):
+        return text[1:-1].replace("''", "'")
+    if "." in text:
+        return float(text)
+    return int(text)
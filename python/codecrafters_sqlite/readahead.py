@@ -0,0 +1,82 @@
+"""madvise hints for the database mmap, so the kernel reads ahead only for scans
+
+By default the kernel reads around every page fault, which suits neither access
+pattern: a full scan faults its leaves in one at a time, and a point lookup reads
+pages around the one it needs that will never be used. A scan marks the map
+MADV_SEQUENTIAL and, from each interior page it reads, asks for the next window of
+child pages with MADV_WILLNEED. After a run of lookups with no scan between them
+the map is marked MADV_RANDOM, which turns readahead off.
+
+Only the advice for the whole map is ever changed: advising ranges of it would
+split the mapping into one kernel VMA per range. MADV_WILLNEED leaves the mapping
+alone, so it is given for ranges. Where mmap has no madvise, as on Windows, an
+Advisor does nothing.
+"""
+
+import mmap
+
+ENABLED = hasattr(mmap.mmap, "madvise")
+READAHEAD_BYTES = 4 * 1024 * 1024  # asked for at a time as a scan goes
+LOOKUPS_BEFORE_RANDOM = 8
+
+
+class Advisor:
+    """The access pattern of one database mmap, passed on to the kernel"""
+
+    def __init__(self, database_mmap, page_size):
+        self.enabled = ENABLED
+        self.window = max(1, READAHEAD_BYTES // page_size)  # pages
+        self._mmap = database_mmap
+        self._page_size = page_size
+        self._advice = None
+        self._lookups = 0
+
+    def scan(self):
+        """A scan is starting: read ahead in the order it goes"""
+        self._lookups = 0
+        self._advise(getattr(mmap, "MADV_SEQUENTIAL", None))
+
+    def lookup(self):
+        """A point lookup is starting: once there have been enough in a row, stop
+        reading ahead"""
+        self._lookups += 1
+        if self._lookups >= LOOKUPS_BEFORE_RANDOM:
+            self._advise(getattr(mmap, "MADV_RANDOM", None))
+
+    def will_need(self, page_numbers):
+        """Start reading pages that are about to be visited, a run at a time"""
+        if not self.enabled or not page_numbers:
+            return
+        advice = getattr(mmap, "MADV_WILLNEED", None)
+        if advice is None:
+            return
+        page_numbers = sorted(page_numbers)
+        first = last = page_numbers[0]
+        for page_number in page_numbers[1:]:
+            if page_number != last + 1:
+                self._will_need(advice, first, last)
+                first = page_number
+            last = page_number
+        self._will_need(advice, first, last)
+
+    def _will_need(self, advice, first, last):
+        # madvise wants the start aligned to the system's page size, which can be
+        # bigger than a database page
+        start = (first - 1) * self._page_size
+        aligned = start - start % mmap.PAGESIZE
+        end = min(last * self._page_size, len(self._mmap))
+        if end <= aligned:
+            return  # a page number past the end of the file
+        try:
+            self._mmap.madvise(advice, aligned, end - aligned)
+        except (OSError, ValueError):
+            pass  # only a hint
+
+    def _advise(self, advice):
+        if not self.enabled or advice is None or advice == self._advice:
+            return
+        try:
+            self._mmap.madvise(advice)
+        except OSError:
+            return
+        self._advice = advice
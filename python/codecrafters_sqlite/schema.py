@@ -0,0 +1,413 @@
+import math
+import re
+from dataclasses import dataclass, field, replace
+
+ROWID_NAMES = ("rowid", "oid", "_rowid_")
+
+TABLE_CONSTRAINTS = ("CONSTRAINT", "PRIMARY", "UNIQUE", "CHECK", "FOREIGN")
+COLUMN_CONSTRAINTS = (
+    "CONSTRAINT",
+    "PRIMARY",
+    "NOT",
+    "NULL",
+    "UNIQUE",
+    "CHECK",
+    "DEFAULT",
+    "COLLATE",
+    "REFERENCES",
+    "GENERATED",
+    "AS",
+)
+
+NUMERIC_AFFINITIES = ("INTEGER", "REAL", "NUMERIC")
+_numeric_text = re.compile(r"\s*[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?\s*")
+_number_literal = re.compile(r"[-+]?(?:\d+(?:\.\d*)?|\.\d+)(?:[eE][-+]?\d+)?")
+_hex_literal = re.compile(r"[-+]?0[xX][0-9a-fA-F]+")
+
+_token = re.compile(
+    r"""\s*("(?:[^"]|"")*"|`(?:[^`]|``)*`|\[[^\]]*\]|'(?:[^']|'')*'|[(),]|[^\s(),]+)"""
+)
+
+
+@dataclass(frozen=True)
+class Column:
+    name: str
+    type: str = ""
+    primary_key: bool = False
+    collation: str = "BINARY"
+    default: object = None  # a literal DEFAULT, as the column stores it
+
+    @property
+    def is_rowid_alias(self):
+        return self.primary_key and self.type.upper() == "INTEGER"
+
+    @property
+    def affinity(self):
+        """The type affinity SQLite gives a column declared with this type
+
+        >>> [Column("a", type).affinity for type in ("BIGINT", "VARCHAR", "", "DOUBLE")]
+        ['INTEGER', 'TEXT', 'BLOB', 'REAL']
+        """
+        type_ = self.type.upper()
+        if "INT" in type_:
+            return "INTEGER"
+        if any(name in type_ for name in ("CHAR", "CLOB", "TEXT")):
+            return "TEXT"
+        if "BLOB" in type_ or not type_:
+            return "BLOB"
+        if any(name in type_ for name in ("REAL", "FLOA", "DOUB")):
+            return "REAL"
+        return "NUMERIC"
+
+
+@dataclass(frozen=True)
+class Conversions:
+    """What turns the values decoded from records into those a table's columns
+    hold, for the projected columns that need it
+
+    Integers in REAL columns are stored as integers to save space, and read back
+    as reals. Columns added since a row was written are missing from its record,
+    and hold their DEFAULT.
+    """
+
+    reals: tuple[tuple[int, int], ...] = ()  # (position, column index)
+    defaults: tuple[tuple[int, int, object], ...] = ()  # (..., default)
+
+    def __bool__(self):
+        return bool(self.reals or self.defaults)
+
+    def apply(self, row, cell):
+        """Convert, in place, a row projected from a table leaf cell"""
+        for position, _ in self.reals:
+            if type(row[position]) is int:
+                row[position] = float(row[position])
+        if self.defaults:
+            column_count = cell.column_count
+            for position, column_index, default in self.defaults:
+                if column_index >= column_count:
+                    row[position] = default
+
+
+@dataclass
+class TableSchema:
+    """The columns of a table, parsed from its CREATE TABLE statement"""
+
+    columns: list[Column] = field(default_factory=list)
+
+    @property
+    def column_names(self):
+        return [column.name for column in self.columns]
+
+    @property
+    def rowid_column(self):
+        """The index of the INTEGER PRIMARY KEY column aliasing the rowid, if any"""
+        for index, column in enumerate(self.columns):
+            if column.is_rowid_alias:
+                return index
+        return None
+
+    def column_index(self, column_name):
+        for index, column in enumerate(self.columns):
+            if column.name.casefold() == column_name.casefold():
+                return index
+        return None
+
+    def conversions(self, column_indices):
+        """The Conversions for rows projected to ``column_indices``
+
+        >>> schema = parse_create_table("CREATE TABLE t (a real, b, c int default 7)")
+        >>> schema.conversions([2, 0])
+        Conversions(reals=((1, 0),), defaults=((0, 2, 7),))
+        """
+        reals, defaults = [], []
+        for position, column_index in enumerate(column_indices):
+            column = self.columns[column_index]
+            if column.affinity == "REAL":
+                reals.append((position, column_index))
+            if column.default is not None:
+                defaults.append((position, column_index, column.default))
+        return Conversions(tuple(reals), tuple(defaults))
+
+    def is_rowid(self, column_name):
+        """Whether a column name refers to the rowid of the table"""
+        index = self.column_index(column_name)
+        if index is None:
+            return column_name.casefold() in ROWID_NAMES
+        return index == self.rowid_column
+
+
+def parse_create_table(create_table_sql):
+    """Parse the column definitions of a CREATE TABLE statement
+
+    >>> parse_create_table("CREATE TABLE sqlite_sequence(name,seq)").column_names
+    ['name', 'seq']
+    >>> parse_create_table(
+    ...     'CREATE TABLE c (id integer primary key, "size range" text, n VARCHAR(10))'
+    ... ).columns[:2]
+    [Column(name='id', type='integer', primary_key=True, collation='BINARY', default=None), Column(name='size range', type='text', primary_key=False, collation='BINARY', default=None)]
+    >>> parse_create_table("CREATE TABLE t (n VARCHAR(10) COLLATE nocase)").columns
+    [Column(name='n', type='VARCHAR', primary_key=False, collation='NOCASE', default=None)]
+    >>> sql = "CREATE TABLE t (z int DEFAULT '7', r REAL DEFAULT 1)"
+    >>> [column.default for column in parse_create_table(sql).columns]
+    [7, 1.0]
+    """
+    definitions = _column_definitions(_token.findall(create_table_sql))
+    columns = []
+    primary_key = []
+    for definition in definitions:
+        keyword = definition[0].upper()
+        if keyword in TABLE_CONSTRAINTS:
+            if keyword == "CONSTRAINT":
+                definition = definition[2:]
+            if [word.upper() for word in definition[:2]] == ["PRIMARY", "KEY"]:
+                primary_key = [
+                    _unquote(word)
+                    for word in definition[2:]
+                    if word not in ("(", ")", ",")
+                    and word.upper() not in ("ASC", "DESC", "COLLATE")
+                ]
+            continue
+        type_words = []
+        for word in definition[1:]:
+            if word == "(" or word.upper() in COLUMN_CONSTRAINTS:
+                break
+            type_words.append(word)
+        upper_words = [word.upper() for word in definition]
+        is_primary_key = any(
+            first == "PRIMARY" and second == "KEY"
+            for first, second in zip(upper_words, upper_words[1:])
+        )
+        column = Column(
+            _unquote(definition[0]),
+            " ".join(type_words),
+            is_primary_key,
+            _collation(definition[1:]) or "BINARY",
+        )
+        default = _default(definition[1:], column.affinity)
+        columns.append(replace(column, default=default))
+    if len(primary_key) == 1:
+        columns = [
+            (
+                replace(column, primary_key=True)
+                if column.name.casefold() == primary_key[0].casefold()
+                else column
+            )
+            for column in columns
+        ]
+    return TableSchema(columns)
+
+
+def _column_definitions(tokens):
+    """Split the tokens between the outermost parentheses at top-level commas"""
+    if "(" not in tokens:
+        return []
+    definitions = [[]]
+    depth = 0
+    for token in tokens[tokens.index("(") + 1 :]:
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif token == "," and depth == 0:
+            definitions.append([])
+            continue
+        definitions[-1].append(token)
+    return [definition for definition in definitions if definition]
+
+
+def _collation(words):
+    """The collating sequence named by a COLLATE clause among words, if any"""
+    upper_words = [word.upper() for word in words]
+    if "COLLATE" in upper_words[:-1]:
+        return _unquote(words[upper_words.index("COLLATE") + 1]).upper()
+    return None
+
+
+def _default(words, affinity):
+    """The value a DEFAULT clause among words gives, if it is a literal
+
+    Defaults that are expressions, such as ``CURRENT_TIME``, are None: only
+    literals can default columns added by ALTER TABLE, which are the ones missing
+    from records.
+    """
+    upper_words = [word.upper() for word in words]
+    if "DEFAULT" not in upper_words[:-1]:
+        return None
+    words = words[upper_words.index("DEFAULT") + 1 :]
+    if words[0] == "(":
+        words = words[1 : words.index(")")] if ")" in words else []
+    else:
+        words = words[:2] if words[0] in ("+", "-") else words[:1]
+    text = "".join(words)
+    match text.upper():
+        case "NULL":
+            return None
+        case "TRUE" | "FALSE":
+            return int(text.upper() == "TRUE")
+    if text[:1] == "'" and text[-1:] == "'" and len(text) > 1:
+        return stored_value(_unquote(text), affinity)
+    if text[:2].upper() == "X'" and text[-1:] == "'":
+        return bytes.fromhex(text[2:-1])
+    if _hex_literal.fullmatch(text):
+        return stored_value(int(text, 16), affinity)
+    if _number_literal.fullmatch(text):
+        if affinity == "TEXT":
+            return text.lstrip("+")  # as written, not as the number prints
+        return stored_value(with_affinity(text, "NUMERIC"), affinity)
+    return None
+
+
+def _unquote(identifier):
+    if identifier[:1] in ('"', "`", "'") and identifier[-1:] == identifier[:1]:
+        quote = identifier[0]
+        return identifier[1:-1].replace(quote * 2, quote)
+    if identifier[:1] == "[" and identifier[-1:] == "]":
+        return identifier[1:-1]
+    return identifier
+
+
+def rowid_alias(create_table_sql):
+    """The column declared INTEGER PRIMARY KEY, which is an alias for the rowid
+
+    >>> rowid_alias("CREATE TABLE apples (id integer primary key autoincrement)")
+    'id'
+    >>> rowid_alias("CREATE TABLE dummy0 (value int)") is None
+    True
+    """
+    schema = parse_create_table(create_table_sql)
+    if (rowid_column := schema.rowid_column) is None:
+        return None
+    return schema.columns[rowid_column].name
+
+
+_identifier = re.compile(r"""\w+|"(?:[^"]|"")+"|`(?:[^`]|``)+`|\[[^\]]+\]""")
+
+
+@dataclass(frozen=True)
+class IndexedColumn:
+    """A column an index is on, or an expression if name is None"""
+
+    name: str | None
+    descending: bool = False
+    collation: str | None = None  # that of the table's column, if None
+
+
+@dataclass
+class IndexSchema:
+    """The columns of an index, parsed from its CREATE INDEX statement"""
+
+    columns: list[IndexedColumn] = field(default_factory=list)
+    partial: bool = False  # only has entries for rows matching a WHERE clause
+
+    @property
+    def column_names(self):
+        return [column.name for column in self.columns]
+
+
+def parse_create_index(create_index_sql):
+    """Parse the indexed columns of a CREATE INDEX statement
+
+    >>> parse_create_index("CREATE INDEX i ON t ([size range] DESC, lower(b))")
+    IndexSchema(columns=[IndexedColumn(name='size range', descending=True, collation=None), IndexedColumn(name=None, descending=False, collation=None)], partial=False)
+    >>> parse_create_index("CREATE INDEX i ON t (`b` COLLATE nocase) WHERE b > 0")
+    IndexSchema(columns=[IndexedColumn(name='b', descending=False, collation='NOCASE')], partial=True)
+    """
+    tokens = _token.findall(create_index_sql)
+    upper_tokens = [token.upper() for token in tokens]
+    if "ON" not in upper_tokens:
+        return IndexSchema()
+    tokens = tokens[upper_tokens.index("ON") :]
+    columns = [
+        _indexed_column(definition) for definition in _column_definitions(tokens)
+    ]
+    # The WHERE of a partial index follows the closing parenthesis
+    depth = 0
+    for position, token in enumerate(tokens):
+        depth += {"(": 1, ")": -1}.get(token, 0)
+        if token == ")" and depth == 0:
+            break
+    partial = "WHERE" in (token.upper() for token in tokens[position + 1 :])
+    return IndexSchema(columns, partial)
+
+
+def _indexed_column(definition):
+    name, *words = definition
+    upper_words = [word.upper() for word in words]
+    collation = _collation(words)
+    if collation is not None:
+        collate = upper_words.index("COLLATE")
+        del upper_words[collate : collate + 2]
+    if not _identifier.fullmatch(name) or upper_words not in ([], ["ASC"], ["DESC"]):
+        name = None  # an expression, not a column
+    else:
+        name = _unquote(name)
+    return IndexedColumn(name, upper_words == ["DESC"], collation)
+
+
+def index_columns(create_index_sql):
+    """The names of the columns an index is on, in order, None for expressions
+
+    >>> index_columns("CREATE INDEX idx_companies_country\\n\\ton companies (country)")
+    ['country']
+    >>> index_columns('CREATE INDEX idx ON t ("size range", `b`, [c], a + 1)')
+    ['size range', 'b', 'c', None]
+    """
+    return parse_create_index(create_index_sql).column_names
+
+
+def with_affinity(value, affinity):
+    """A value compared with a column as SQLite converts it for the column's affinity
+
+    Columns of numeric affinity turn text that looks like a number into one, and
+    TEXT columns turn numbers into text. Other values are compared as they are.
+
+    >>> with_affinity(" 5 ", "INTEGER"), with_affinity("5x", "REAL")
+    (5, '5x')
+    >>> [with_affinity(value, "TEXT") for value in (7, 2.0, b"5")]
+    ['7', '2.0', b'5']
+    """
+    if affinity in NUMERIC_AFFINITIES and isinstance(value, str):
+        if _numeric_text.fullmatch(value) is None:
+            return value
+        try:
+            number = int(value)
+        except ValueError:
+            return float(value)
+        return number if -(2**63) <= number < 2**63 else float(number)
+    if affinity == "TEXT" and isinstance(value, int | float):
+        return str(value) if isinstance(value, int) else _real_text(value)
+    return value
+
+
+def stored_value(value, affinity):
+    """A value as a column of the affinity stores it
+
+    On top of the conversions of with_affinity, REAL columns hold integers as
+    reals, and INTEGER and NUMERIC columns hold reals that are whole numbers as
+    integers.
+
+    >>> [stored_value(7, "REAL"), stored_value("7.0", "INTEGER")]
+    [7.0, 7]
+    """
+    value = with_affinity(value, affinity)
+    if affinity == "REAL" and type(value) is int:
+        return float(value)
+    if affinity in ("INTEGER", "NUMERIC") and isinstance(value, float):
+        if value.is_integer() and -(2**63) <= value < 2**63:
+            return int(value)
+    return value
+
+
+def _real_text(value):
+    """A float as SQLite writes it as text, with 15 significant digits"""
+    if math.isinf(value):
+        return "Inf" if value > 0 else "-Inf"
+    text = f"{value:.15g}"
+    if text.lstrip("-").isdigit():
+        return text + ".0"
+    mantissa, e, exponent = text.partition("e")
+    if e and "." not in mantissa:
+        return f"{mantissa}.0e{exponent}"
+    return text
@@ -0,0 +1,52 @@
+"""What running a query cost, counted cheaply enough to be always on
+
+Counters are kept per page and per cell, never per column: how many columns were
+decoded or skipped is worked out from the plan's projection when the query ends.
+Code too deep to be handed a QueryStats keeps running ``totals`` instead, which a
+query reads before and after it runs. They are kept per thread, so that queries
+running on other threads don't count towards it.
+"""
+
+import threading
+from dataclasses import dataclass, fields
+
+
+@dataclass
+class QueryStats:
+    access: str = ""  # the access path, as EXPLAIN QUERY PLAN describes it
+    interior_pages: int = 0
+    leaf_pages: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    cells: int = 0  # table or index cells read
+    rows: int = 0  # results returned
+    columns_decoded: int = 0
+    columns_skipped: int = 0
+    bytes_copied: int = 0  # text, blobs and overflowing records copied out of pages
+    errors: int = 0  # columns that failed to decode
+    prepare_seconds: float = 0.0
+    first_row_seconds: float = 0.0
+    execute_seconds: float = 0.0
+
+    def report(self):
+        """The counters, one per line, like the sqlite3 shell's ``.stats``"""
+        return [
+            f"{field.name.replace('_', ' ').capitalize() + ':':<20}"
+            f" {_format(getattr(self, field.name))}"
+            for field in fields(self)
+        ]
+
+
+class Totals(threading.local):
+    """Running totals for the current thread"""
+
+    bytes_copied = 0  # counted by the pure-Python decoder only
+
+
+totals = Totals()
+
+
+def _format(value):
+    if isinstance(value, float):
+        return f"{value:.6f}"
+    return str(value)
@@ -0,0 +1,29 @@
+"""Debug tracing for the hot paths, free when DEBUG logging is off
+
+Asking a logger whether it is enabled for every page, cell and column costs more
+than some of the decoding it describes, so each Tracer keeps the answer in a plain
+attribute. Scans call ``refresh`` when they start, and hot paths guard tracing
+with ``if tracer.enabled:``, so with logging at INFO they only pay for that test.
+"""
+
+import logging
+
+_tracers = []
+
+
+class Tracer:
+    """Debug messages for one logger, formatted only when they are emitted"""
+
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+        self.enabled = self.logger.isEnabledFor(logging.DEBUG)
+        _tracers.append(self)
+
+    def __call__(self, message, *args):
+        self.logger.debug(message, *args, stacklevel=2)
+
+
+def refresh():
+    """Catch every Tracer up with its logger's level"""
+    for tracer in _tracers:
+        tracer.enabled = tracer.logger.isEnabledFor(logging.DEBUG)
@@ -0,0 +1,199 @@
+"""Read-only access to a database's write-ahead log
+
+In WAL mode a commit appends the pages it changed to the ``-wal`` file as frames,
+and the main file is only brought up to date by a checkpoint. A WalIndex maps
+each page number to its latest committed frame, trusting frames only while their
+salts match the WAL header and their running checksum holds, and only up to the
+last commit frame, as SQLite does when it recovers a WAL.
+
+Refreshing reads just the frames after the last commit seen. A WAL that has been
+restarted since, with new salts, or truncated, can no longer be followed, and
+the index is rebuilt from scratch.
+
+The ``-shm`` wal-index and its read locks are left alone, so nothing stops a
+checkpoint from changing the main file while a query is reading it.
+"""
+
+import os
+import struct
+import weakref
+
+from codecrafters_sqlite.page_source import PageSource
+
+WAL_HEADER_SIZE = 32
+FRAME_HEADER_SIZE = 24
+WAL_MAGIC = 0x377F0682  # the low bit set means big-endian checksums
+WAL_MODE = 2  # file format read and write versions in the database header
+FILE_FORMAT_OFFSET = 18
+
+
+class WalIndex:
+    """Page number to latest committed frame of a WAL file, kept up to date"""
+
+    def __init__(self, wal_path, page_size):
+        self.wal_path = wal_path
+        self.page_size = page_size
+        self.frames = {}  # page number to frame number, from 0
+        self.frames_read = 0  # checked, as a count of frames read from the file
+        self._fd = -1
+        self._inode = None
+        self._reset()
+
+    @property
+    def frame_size(self):
+        return FRAME_HEADER_SIZE + self.page_size
+
+    def refresh(self):
+        """Read the frames committed since the last refresh
+
+        Returns the numbers of the pages they changed, or None if the WAL was
+        restarted or removed and the index rebuilt, when any page may have changed.
+        """
+        try:
+            inode = os.stat(self.wal_path).st_ino
+        except FileNotFoundError:
+            return self._restarted() if self.frames else set()
+        if inode != self._inode:
+            # Deleted and written afresh since it was opened
+            self.close()
+        if self._fd < 0:
+            self._fd = os.open(self.wal_path, os.O_RDONLY)
+            # Closes the file if the index is dropped without being closed
+            self._close_fd = weakref.finalize(self, os.close, self._fd)
+            self._inode = inode
+        header = os.pread(self._fd, WAL_HEADER_SIZE, 0)
+        if header != self._header:
+            had_frames = bool(self.frames)
+            self._reset()
+            if not self._read_header(header):
+                return None if had_frames else set()
+            self._read_frames()
+            return None if had_frames else set(self.frames)
+        return self._read_frames()
+
+    def frame_offset(self, page_number):
+        """Where a page's content is in the WAL file, or None if it is not there"""
+        if (frame := self.frames.get(page_number)) is None:
+            return None
+        return WAL_HEADER_SIZE + frame * self.frame_size + FRAME_HEADER_SIZE
+
+    def read(self, offset, size):
+        return os.pread(self._fd, size, offset)
+
+    def close(self):
+        if self._fd >= 0:
+            self._close_fd()
+            self._fd = -1
+            self._inode = None
+
+    def _reset(self):
+        self.frames = {}
+        self._header = None
+        self.committed_frames = 0  # frames up to and including the last commit
+        self._checksum = (0, 0)  # as of the last commit
+        self._byte_order = ">"
+        self._salts = b""
+
+    def _restarted(self):
+        self.close()
+        self._reset()
+        return None
+
+    def _read_header(self, header):
+        """Check a WAL header, keeping it if it is usable"""
+        if len(header) < WAL_HEADER_SIZE:
+            return False  # empty: nothing written since the last checkpoint
+        magic, _, page_size, _, _, _, checksum_1, checksum_2 = struct.unpack(
+            ">8I", header
+        )
+        if magic & ~1 != WAL_MAGIC or page_size != self.page_size:
+            return False
+        self._byte_order = ">" if magic & 1 else "<"
+        checksum = self._add_to_checksum((0, 0), header[:24])
+        if checksum != (checksum_1, checksum_2):
+            return False
+        self._header = header
+        self._salts = header[16:24]
+        self._checksum = checksum
+        return True
+
+    def _read_frames(self):
+        """Follow the log from the last commit, indexing each committed frame"""
+        changed = set()
+        pending = {}
+        checksum = self._checksum
+        frame = self.committed_frames
+        while True:
+            offset = WAL_HEADER_SIZE + frame * self.frame_size
+            data = os.pread(self._fd, self.frame_size, offset)
+            self.frames_read += 1
+            if len(data) < self.frame_size or data[8:16] != self._salts:
+                break
+            checksum = self._add_to_checksum(checksum, data[:8])
+            checksum = self._add_to_checksum(checksum, data[FRAME_HEADER_SIZE:])
+            if checksum != struct.unpack(">2I", data[16:24]):
+                break
+            page_number, database_pages = struct.unpack_from(">2I", data)
+            pending[page_number] = frame
+            frame += 1
+            if database_pages:  # a commit frame
+                self.frames.update(pending)
+                changed.update(pending)
+                pending.clear()
+                self.committed_frames = frame
+                self._checksum = checksum
+        return changed
+
+    def _add_to_checksum(self, checksum, data):
+        s0, s1 = checksum
+        words = struct.unpack(f"{self._byte_order}{len(data) // 4}I", data)
+        for position in range(0, len(words), 2):
+            s0 = (s0 + words[position] + s1) & 0xFFFFFFFF
+            s1 = (s1 + words[position + 1] + s0) & 0xFFFFFFFF
+        return s0, s1
+
+
+class WalSource(PageSource):
+    """Pages from a WAL where it has them, and from the main file otherwise"""
+
+    def __init__(self, main, wal_path):
+        super().__init__(main.page_size)
+        self.main = main
+        self.wal = WalIndex(wal_path, main.page_size)
+        self.wal.refresh()
+
+    @property
+    def window(self):
+        return self.main.window
+
+    def page(self, page_number):
+        if (offset := self.wal.frame_offset(page_number)) is None:
+            return self.main.page(page_number)
+        return memoryview(self.wal.read(offset, self.page_size))
+
+    def read(self, offset, size):
+        page_number, offset_in_page = divmod(offset, self.page_size)
+        if self.wal.frame_offset(page_number + 1) is None:
+            return self.main.read(offset, size)
+        return bytes(self.page(page_number + 1)[offset_in_page : offset_in_page + size])
+
+    def refresh(self):
+        return self.wal.refresh()
+
+    def scan(self):
+        self.main.scan()
+
+    def lookup(self):
+        self.main.lookup()
+
+    def will_need(self, page_numbers):
+        self.main.will_need(page_numbers)
+
+    def close(self):
+        self.wal.close()
+        self.main.close()
+
+
+def in_wal_mode(page_source):
+    """Whether a database's header says it is in WAL mode"""
+    return page_source.read(FILE_FORMAT_OFFSET, 2) == bytes((WAL_MODE, WAL_MODE))
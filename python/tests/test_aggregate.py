@@ -0,0 +1,160 @@
+import sqlite3
+import tracemalloc
+
+import pytest
+
+from codecrafters_sqlite.aggregate import Aggregate, aggregate
+from codecrafters_sqlite.cells import TableLeafCell
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, DbInfo
+
+ROWS = 3000
+GROUPS = 20_000
+
+
+@pytest.fixture(scope="module")
+def sales_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("aggregate") / "sales.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute(
+            "CREATE TABLE sales (id integer primary key, region text, product text,"
+            " amount, price real)"
+        )
+        db.executemany(
+            "INSERT INTO sales (region, product, amount, price) VALUES(?, ?, ?, ?)",
+            (
+                (
+                    None if row % 17 == 0 else f"region {row % 7}",
+                    f"product {row % 5}",
+                    None if row % 11 == 0 else row % 100,
+                    row / 8,
+                )
+                for row in range(ROWS)
+            ),
+        )
+        db.execute("CREATE TABLE mixed (id integer primary key, kind text, v)")
+        db.executemany(
+            "INSERT INTO mixed (kind, v) VALUES(?, ?)",
+            (
+                (f"kind {row % 3}", value)
+                for row, value in enumerate(
+                    (1, "3", "abc", "12abc", b"12", b"abc", 2.5, None, " 3.5x")
+                    + ("1e2z", " +7 ", "", "-", 10**15, "4", "0x10", 180)
+                )
+            ),
+        )
+        db.execute("CREATE TABLE empty (id integer primary key, value)")
+        db.execute("CREATE TABLE keys (id integer primary key, key)")
+        db.executemany(
+            "INSERT INTO keys (key) VALUES(?)",
+            ((row * 7919 % GROUPS,) for row in range(2 * GROUPS)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def expected(tmp_db_path, sql):
+    with sqlite3.connect(tmp_db_path) as db:
+        return [list(row) for row in db.execute(sql)]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    (
+        "select count(*), count(amount), sum(amount), avg(amount) from sales",
+        "select min(region), max(region), min(price), max(price) from sales",
+        "select sum(price) from sales where region = 'region 3'",
+        "select count(*), sum(value), min(value), max(value) from empty",
+        "select region, count(*), avg(price) from sales group by region",
+        "select product, region, max(amount) from sales group by region, product",
+        "select count(*) from sales where amount < 10 group by product",
+        "select max(id) from sales",
+        "select key, count(*) from keys group by key",
+        "select count(*) from empty group by value",
+        "select sum(v), avg(v), count(v), min(v), max(v) from mixed",
+        "select sum(v) from mixed where id < 3",
+        "select kind, sum(v), avg(v) from mixed group by kind",
+    ),
+)
+def test_matches_sqlite(sales_db, sql):
+    with Connection(sales_db) as connection:
+        actual = list(connection.execute(sql))
+    rows = expected(sales_db, sql)
+    if rows and len(rows[0]) == 1:
+        assert actual == pytest.approx([value for value, in rows])
+    else:
+        assert len(actual) == len(rows)
+        for actual_row, row in zip(actual, rows):
+            assert actual_row == pytest.approx(row)
+
+
+@pytest.mark.parametrize(
+    "sql,error",
+    (
+        ("select region, count(*) from sales", "region must appear"),
+        ("select median(amount) from sales", "no such function: median"),
+        ("select sum(*) from sales", "wrong number of arguments"),
+        ("select count(nothing) from sales", "no such column: nothing"),
+        ("select count(*) from sales group by nothing", "no such column: nothing"),
+    ),
+)
+def test_errors(sales_db, sql, error):
+    with Connection(sales_db) as connection:
+        (message,) = connection.execute(sql)
+    assert message.startswith(error)
+
+
+def test_rows_are_not_projected(sales_db, monkeypatch):
+    def project(*args, **kwargs):
+        raise AssertionError("aggregates should fold values as they are decoded")
+
+    sql = "select sum(amount), max(product) from sales"
+    with Connection(sales_db) as connection:
+        connection.prepare(sql)  # reads the schema
+        monkeypatch.setattr(TableLeafCell, "project", project)
+        monkeypatch.setattr(TableLeafCell, "columns", property(project))
+        (row,) = connection.execute(sql)
+    assert row == expected(sales_db, sql)[0]
+
+
+def grouped(tmp_db_path, max_groups):
+    db_info = DbInfo(tmp_db_path)
+    table = db_info.find_table("keys")
+    return list(
+        aggregate(
+            table._generate_child_rows(),
+            [Aggregate("count", None), Aggregate("min", 0)],
+            [1],
+            rowid_column=0,
+            max_groups=max_groups,
+        )
+    )
+
+
+def test_spilled_groups_merge(sales_db):
+    spilled = grouped(sales_db, max_groups=1000)
+    assert len(spilled) == GROUPS
+    assert spilled == grouped(sales_db, max_groups=GROUPS)
+    assert [[key, count] for (key,), (count, _) in spilled] == expected(
+        sales_db, "select key, count(*) from keys group by key"
+    )
+
+
+def test_spilling_bounds_memory(sales_db):
+    def peak(max_groups):
+        tracemalloc.start()
+        try:
+            for _ in aggregate(
+                DbInfo(sales_db).find_table("keys")._generate_child_rows(),
+                [Aggregate("count", None)],
+                [1],
+                max_groups=max_groups,
+            ):
+                pass
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    bounded, unbounded = peak(500), peak(GROUPS)
+    print(f"peak {bounded} bytes spilling, {unbounded} bytes in memory")
+    assert bounded < unbounded / 2
@@ -1,7 +1,44 @@
+import sqlite3
+from pathlib import Path
+
 import pytest
 
 from codecrafters_sqlite import cells
 from codecrafters_sqlite.cells import TableLeafCell, DecodeError
+from codecrafters_sqlite.main import DbInfo, DbPage
+
+requires_rust = pytest.mark.skipif(
+    cells.decode_record is None, reason="Rust extension not built"
+)
+
+MIXED_VALUES = (
+    None,
+    0,
+    1,
+    -1,
+    127,
+    -32768,
+    1 << 23,
+    -(1 << 31),
+    1 << 47,
+    -(1 << 63),
+    (1 << 63) - 1,
+    1.5,
+    -0.0,
+    "",
+    "text",
+    "ünïcödé",
+    b"",
+    b"\x00\xffblob",
+)
+
+header_decoders = (
+    "read_header",
+    (
+        pytest.param(cells.read_record_header, id="python"),
+        pytest.param(cells.decode_record_header, id="rust", marks=requires_rust),
+    ),
+)
 
 
 @pytest.mark.parametrize(
@@ -32,6 +69,24 @@ def test_decode_literal(serial_type_code, expected_value):
     assert cells.decode([], 0, serial_type_code) == (expected_value, 0)
 
 
+@pytest.mark.parametrize(
+    "record,serial_type_code,expected_value,expected_content_size",
+    (
+        pytest.param(b"\x00\x00\x01\x00\x00\x00", 5, 1 << 24, 6, id="int48"),
+        pytest.param(b"\xff" * 7 + b"\xfe", 6, -2, 8, id="int64"),
+        pytest.param(b"\x3f\xf8" + b"\x00" * 6, 7, 1.5, 8, id="real"),
+        pytest.param(b"\x00\xff", 16, b"\x00\xff", 2, id="blob"),
+        pytest.param(b"", 12, b"", 0, id="empty_blob"),
+        pytest.param(b"hi", 17, "hi", 2, id="text"),
+    ),
+)
+def test_decode_types(record, serial_type_code, expected_value, expected_content_size):
+    assert cells.decode(memoryview(record), 0, serial_type_code) == (
+        expected_value,
+        expected_content_size,
+    )
+
+
 def test_decode_bad_unicode():
     with pytest.raises(DecodeError) as exc_info:
         cells.decode(b"\xb1", 0, 15)
@@ -91,3 +146,154 @@ def test_rowid():
     assert cell.columns == [
         row_id,
     ]
+
+
+def test_cell_after_other_content():
+    row_id = 0x07
+    header_size = 0x02  # includes self
+    int8_serial_type = 1
+    int8_value = 42
+    cell = bytearray([0x00, row_id, header_size, int8_serial_type, int8_value])
+    cell[0] = len(cell)
+    pointer = 5
+    page = bytearray(pointer) + cell + bytearray(3)
+    usable_size = 35 + len(page)
+    assert TableLeafCell(page, pointer, usable_size).columns == [int8_value]
+
+
+@pytest.mark.parametrize(*header_decoders)
+def test_read_record_header(read_header):
+    payload_size = 0x05
+    row_id = (0x81, 0x00)  # 128
+    header_size = 0x03  # includes self
+    one_byte_string_serial_type = (1 * 2) + 13
+    int8_serial_type = 1
+    page = bytes(
+        [
+            0xFF,
+            payload_size,
+            *row_id,
+            header_size,
+            one_byte_string_serial_type,
+            int8_serial_type,
+            ord("x"),
+            42,
+        ]
+    )
+    assert read_header(memoryview(page), 1) == (
+        payload_size,
+        128,
+        4,
+        header_size,
+        [one_byte_string_serial_type, int8_serial_type],
+    )
+
+
+@pytest.mark.parametrize(*header_decoders)
+def test_read_record_headers_in_sample(read_header):
+    table = DbInfo("sample.db").find_table("apples")
+    pointers = [
+        table._cell_content_pointer(cell) for cell in range(table.number_of_cells)
+    ]
+    assert [read_header(table._page, pointer) for pointer in pointers] == [
+        cells.read_record_header(table._page, pointer) for pointer in pointers
+    ]
+    assert [read_header(table._page, pointer)[1] for pointer in pointers] == [
+        1,
+        2,
+        3,
+        4,
+    ]
+
+
+def build_mixed_database():
+    with sqlite3.connect(":memory:") as db:
+        db.execute("CREATE TABLE mixed (id integer primary key, value, other text);")
+        db.executemany(
+            "INSERT INTO mixed (value, other) VALUES(?, ?)",
+            ((value, repr(value)) for value in MIXED_VALUES * 50),
+        )
+        db.execute("INSERT INTO mixed (id, value) VALUES(-5, NULL);")
+        db.commit()
+        expected = db.execute("SELECT * FROM mixed ORDER BY id").fetchall()
+        return db.serialize(), expected
+
+
+def leaf_cells(database, rootpage):
+    return DbPage(database, page_number=rootpage)._generate_child_rows()
+
+
+def test_python_columns_match_sqlite():
+    database, expected = build_mixed_database()
+    rows = [tuple(cell.python_columns) for cell in leaf_cells(database, 2)]
+    assert rows == expected
+
+
+@requires_rust
+@pytest.mark.parametrize(
+    "database,rootpage",
+    (
+        pytest.param(Path("sample.db").read_bytes(), 2, id="sample_apples"),
+        pytest.param(Path("sample.db").read_bytes(), 4, id="sample_oranges"),
+        pytest.param(build_mixed_database()[0], 2, id="mixed"),
+    ),
+)
+def test_rust_decode_record_matches_python(database, rootpage):
+    for cell in leaf_cells(database, rootpage):
+        rowid, columns = cells.decode_record(
+            cell._page, cell._pointer, cell.usable_size
+        )
+        assert list(columns) == cell.python_columns
+        assert rowid == cell.rowid
+
+
+def test_project_skips_unrequested_columns(monkeypatch):
+    row_id = 0x01
+    header_size = 0x04  # includes self
+    one_byte_string_serial_type = (1 * 2) + 13
+    int8_serial_type = 1
+    invalid_unicode = 0xB1
+    page = bytearray(
+        [
+            0x00,
+            row_id,
+            header_size,
+            0x00,
+            one_byte_string_serial_type,
+            int8_serial_type,
+            invalid_unicode,
+            42,
+        ]
+    )
+    page[0] = len(page)
+    cell = TableLeafCell(page, 0, 35 + len(page))
+    decoded = []
+    decode = cells.decode
+
+    def recording_decode(record, current_location, serial_type_code):
+        decoded.append(serial_type_code)
+        return decode(record, current_location, serial_type_code)
+
+    monkeypatch.setattr(cells, "decode", recording_decode)
+    assert cell.python_project([2, 0]) == [42, row_id]
+    assert decoded == [0x00, int8_serial_type]
+    assert cell.errors == 0
+    assert cell.python_project([0], rowid_column=None) == [None]
+
+
+def test_python_project_matches_columns():
+    database, _ = build_mixed_database()
+    for cell in leaf_cells(database, 2):
+        columns = cell.python_columns
+        assert cell.python_project([2, 0]) == [columns[2], columns[0]]
+        assert cell.python_project([1, 7]) == [columns[1], None]
+
+
+@requires_rust
+def test_rust_project_matches_python():
+    database, _ = build_mixed_database()
+    for cell in leaf_cells(database, 2):
+        rowid, columns = cells.decode_record(
+            cell._page, cell._pointer, cell.usable_size, [2, 0, 1], 0
+        )
+        assert list(columns) == cell.python_project([2, 0, 1])
@@ -0,0 +1,200 @@
+import sqlite3
+import tracemalloc
+from array import array
+from timeit import repeat
+
+import pytest
+
+from codecrafters_sqlite.columnar import ColumnVector, Kind
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection
+
+ROWS = 3000
+BENCHMARK_ROWS = 20_000
+
+
+def value_of(row):
+    return (None, row, row + 0.5, f"text {row}", b"blob")[row % 5]
+
+
+@pytest.fixture(scope="module")
+def measurements_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("columnar") / "measurements.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute(
+            "CREATE TABLE measurements"
+            " (id integer primary key, count int, reading real, label text, anything)"
+        )
+        db.executemany(
+            "INSERT INTO measurements (count, reading, label, anything)"
+            " VALUES(?, ?, ?, ?)",
+            (
+                (
+                    row * 7,
+                    None if row % 10 == 0 else row / 4,
+                    "x" * 600 if row == 1234 else f"label {row % 13}",
+                    value_of(row),
+                )
+                for row in range(ROWS)
+            ),
+        )
+        db.execute("ALTER TABLE measurements ADD COLUMN added int")
+        db.execute("INSERT INTO measurements (count, added) VALUES(-1, 42)")
+    db.close()
+    return tmp_db_path
+
+
+def expected(tmp_db_path, sql):
+    with sqlite3.connect(tmp_db_path) as db:
+        return [list(row) for row in db.execute(sql)]
+
+
+@pytest.mark.parametrize("pages_per_batch", (1, 16, 10_000))
+def test_batches_match_sqlite(measurements_db, pages_per_batch):
+    with Connection(measurements_db) as connection:
+        batches = list(connection.scan_batches("measurements", None, pages_per_batch))
+    assert [row for batch in batches for row in batch.rows()] == expected(
+        measurements_db, "SELECT * FROM measurements ORDER BY id"
+    )
+    if pages_per_batch == 1:
+        assert len(batches) > 10
+
+
+def test_stored_values(tmp_path):
+    tmp_db_path = tmp_path / "stored.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("CREATE TABLE t (r real)")
+        db.executemany("INSERT INTO t (r) VALUES(?)", ((1,), (2,), (None,)))
+        db.execute("ALTER TABLE t ADD COLUMN z int DEFAULT 7")
+        db.execute("INSERT INTO t (r, z) VALUES(3, 4)")
+    db.close()
+    with Connection(tmp_db_path) as connection:
+        (batch,) = connection.scan_batches("t")
+    assert batch["r"].kind == Kind.REAL
+    assert memoryview(batch["r"].values).format == "d"
+    assert batch["z"].to_list() == [7, 7, 7, 4]
+    assert batch.rows() == expected(tmp_db_path, "SELECT * FROM t")
+
+
+def test_column_kinds(measurements_db):
+    with Connection(measurements_db) as connection:
+        (batch,) = connection.scan_batches("measurements", pages_per_batch=10_000)
+    assert [column.kind for column in batch.columns] == [
+        Kind.INTEGER,
+        Kind.INTEGER,
+        Kind.REAL,
+        Kind.TEXT,
+        Kind.OBJECT,
+        Kind.INTEGER,
+    ]
+    ids = batch["id"]
+    assert isinstance(ids.values, array)
+    assert memoryview(ids.values).format == "q"
+    assert list(ids.values[:3]) == [1, 2, 3]
+    label = batch["label"]
+    assert bytes(label.data[label.offsets[2] : label.offsets[3]]) == b"label 2"
+    assert label[1234] == "x" * 600
+
+
+def test_projection(measurements_db):
+    with Connection(measurements_db) as connection:
+        batches = connection.scan_batches("measurements", ["label", "id", "label"])
+        rows = [row for batch in batches for row in batch.rows()]
+    assert rows == expected(
+        measurements_db, "SELECT label, id, label FROM measurements ORDER BY id"
+    )
+
+
+def test_no_such_column(measurements_db):
+    with Connection(measurements_db) as connection:
+        with pytest.raises(ValueError, match="no such column: nope"):
+            list(connection.scan_batches("measurements", ["nope"]))
+
+
+def test_null_bitmap():
+    vector = ColumnVector()
+    for value in (None, None, 3, None, 5, 6, 7, 8, None, 10):
+        if value is None:
+            vector.append_null()
+        else:
+            vector.append_number(Kind.INTEGER, value)
+    assert vector.kind == Kind.INTEGER
+    assert list(vector.values) == [0, 0, 3, 0, 5, 6, 7, 8, 0, 10]
+    assert vector.nulls == bytearray([0b00001011, 0b00000001])
+    vector.append_number(Kind.REAL, 0.5)
+    assert vector.kind == Kind.REAL
+    assert vector.to_list() == [None, None, 3, None, 5, 6, 7, 8, None, 10, 0.5]
+    vector.append_bytes(Kind.TEXT, b"eleven")
+    assert vector.kind == Kind.OBJECT
+    assert vector.to_list()[-3:] == [10, 0.5, "eleven"]
+
+
+def test_to_numpy(measurements_db):
+    numpy = pytest.importorskip("numpy")
+    with Connection(measurements_db) as connection:
+        (batch,) = connection.scan_batches("measurements", pages_per_batch=10_000)
+    counts = batch["count"].to_numpy()
+    assert counts.dtype == numpy.int64
+    assert counts[:3].tolist() == [0, 7, 14]
+    readings = batch["reading"].to_numpy()
+    assert readings.mask[0] and not readings.mask[1]
+    assert readings[1] == 0.25
+
+
+@pytest.fixture(scope="module")
+def numbers_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("columnar") / "numbers.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute(
+            "CREATE TABLE numbers (id integer primary key, n int, x real, s text)"
+        )
+        db.executemany(
+            "INSERT INTO numbers (n, x, s) VALUES(?, ?, ?)",
+            ((row, row / 3, f"row {row}") for row in range(BENCHMARK_ROWS)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def _memory_held(results):
+    tracemalloc.start()
+    try:
+        held = list(results())
+        size, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert held
+    return size
+
+
+def test_columnar_results_are_compact(numbers_db):
+    with Connection(numbers_db) as connection:
+        columnar_size = _memory_held(lambda: connection.scan_batches("numbers"))
+        rows_size = _memory_held(lambda: connection.execute("select * from numbers"))
+    print(
+        f"{BENCHMARK_ROWS} rows: {columnar_size / BENCHMARK_ROWS:.0f} bytes/row"
+        f" columnar, {rows_size / BENCHMARK_ROWS:.0f} bytes/row as lists"
+    )
+    assert columnar_size < rows_size / 3
+
+
+def test_columnar_scan_time(numbers_db):
+    with Connection(numbers_db) as connection:
+
+        def columnar():
+            for _ in connection.scan_batches("numbers"):
+                pass
+
+        def rows():
+            connection.execute("select * from numbers").fetchall()
+
+        columnar_time = min(repeat(columnar, number=1, repeat=3))
+        rows_time = min(repeat(rows, number=1, repeat=3))
+    print(
+        f"{BENCHMARK_ROWS} rows: {columnar_time * 1e3:.0f}ms columnar, "
+        f"{rows_time * 1e3:.0f}ms as rows"
+    )
+
+
+if __name__ == "__main__":
+    pytest.main(args=[__file__, "--durations=0", "-s"])
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+from timeit import repeat
+
+import pytest
+
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, handle
+
+QUERIES = 200
+
+
+@pytest.fixture
+def fruit_db(tmp_path):
+    tmp_db_path = tmp_path / "fruit.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute("CREATE TABLE apples (id integer primary key, name text)")
+        db.executemany(
+            "INSERT INTO apples (name) VALUES(?)",
+            ((f"apple {row}",) for row in range(100)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def test_reuses_db_info(fruit_db):
+    with Connection(fruit_db) as connection:
+        db_info = connection.db_info
+        assert list(connection.execute("select count(*) from apples")) == [100]
+        assert list(connection.execute("select name from apples where id = 7")) == [
+            "apple 6"
+        ]
+        assert connection.db_info is db_info
+        assert db_info.page_cache.hits > 0
+
+
+def test_reloads_after_schema_change(fruit_db):
+    with Connection(fruit_db) as connection:
+        assert list(connection.execute("select count(*) from apples")) == [100]
+        db_info = connection.db_info
+        with sqlite3.connect(fruit_db) as db:
+            db.execute("CREATE TABLE pears (id integer primary key, name text)")
+            db.executemany(
+                "INSERT INTO pears (name) VALUES(?)",
+                ((f"pear {row}",) for row in range(2000)),
+            )
+        db.close()
+        assert list(connection.execute("select count(*) from pears")) == [2000]
+        assert connection.db_info is not db_info
+        assert "pears" in connection.db_info.table_names
+
+
+def test_connection_is_faster_than_handle(fruit_db):
+    sql = "select name from apples where id = 42"
+
+    def reopening():
+        for _ in range(QUERIES):
+            list(handle(sql, fruit_db))
+
+    with Connection(fruit_db) as connection:
+
+        def reusing():
+            for _ in range(QUERIES):
+                list(connection.execute(sql))
+
+        reopening_time = min(repeat(reopening, number=1, repeat=3))
+        reusing_time = min(repeat(reusing, number=1, repeat=3))
+    print(
+        f"{reopening_time / QUERIES * 1e6:.0f}us/query reopening, "
+        f"{reusing_time / QUERIES * 1e6:.0f}us/query reusing"
+    )
+    assert reusing_time < reopening_time / 2
+
+
+def open_files():
+    return len(os.listdir("/proc/self/fd"))
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+@pytest.mark.parametrize("page_source", ("mmap", "pread"))
+def test_reloads_close_what_they_replace(fruit_db, page_source):
+    with Connection(fruit_db, page_source=page_source) as connection:
+        assert list(connection.execute("select count(*) from apples")) == [100]
+        before = open_files()
+        for row in range(50):
+            with sqlite3.connect(fruit_db) as db:
+                db.execute("INSERT INTO apples (name) VALUES(?)", (f"late {row}",))
+            db.close()
+            assert list(connection.execute("select count(*) from apples")) == [
+                101 + row
+            ]
+        assert open_files() <= before + 1
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_wal_restarts_close_what_they_replace(fruit_db):
+    writer = sqlite3.connect(fruit_db, isolation_level=None)
+    writer.execute("PRAGMA journal_mode = WAL;")
+    writer.execute("PRAGMA wal_autocheckpoint = 0;")
+    with Connection(fruit_db) as connection:
+        for row in range(20):
+            writer.execute("INSERT INTO apples (name) VALUES(?)", (f"late {row}",))
+            writer.execute("PRAGMA wal_checkpoint(RESTART);")
+            assert list(connection.execute("select count(*) from apples")) == [
+                101 + row
+            ]
+            if row == 0:
+                before = open_files()  # with the WAL open here and in the writer
+        assert open_files() <= before + 1
+    writer.close()
+
+
+def test_unfinished_cursors_keep_reading_after_a_reload(fruit_db):
+    with Connection(fruit_db, page_source="pread") as connection:
+        cursor = connection.execute("select name from apples")
+        assert cursor.fetchone() == "apple 0"
+        db_info = connection.db_info
+        with sqlite3.connect(fruit_db) as db:
+            db.execute("INSERT INTO apples (name) VALUES('late')")
+        db.close()
+        assert list(connection.execute("select count(*) from apples")) == [101]
+        assert connection.db_info is not db_info
+        assert db_info.page_source._fd >= 0
+        assert len(cursor.fetchall()) == 99
+        del cursor
+        assert db_info.page_source._fd < 0
@@ -0,0 +1,116 @@
+import sqlite3
+import tracemalloc
+from timeit import repeat
+
+import pytest
+
+from codecrafters_sqlite.main import SAMPLE_DB, Connection
+
+LARGE_ROWS = 200_000
+REPEAT = 5
+
+
+@pytest.fixture(scope="module")
+def large_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("cursor") / "large.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("CREATE TABLE events (id integer primary key, kind text, size int)")
+        db.executemany(
+            "INSERT INTO events (kind, size) VALUES(?, ?)",
+            ((f"kind {row % 17}", row * 3) for row in range(LARGE_ROWS)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def test_fetch():
+    with Connection(SAMPLE_DB) as connection:
+        cursor = connection.execute("select name from apples")
+        assert cursor.fetchone() == "Granny Smith"
+        assert cursor.fetchmany(2) == ["Fuji", "Honeycrisp"]
+        assert cursor.fetchmany() == ["Golden Delicious"]
+        assert cursor.fetchmany() == []
+        assert cursor.fetchone() is None
+        assert connection.execute("select id from apples").fetchall() == [1, 2, 3, 4]
+        assert list(connection.execute("select count(*) from apples")) == [4]
+
+
+def test_first_row_reads_one_page_per_level(large_db):
+    with Connection(large_db) as connection:
+        cursor = connection.execute("select * from events")
+        misses = connection.db_info.page_cache.misses
+        assert cursor.fetchone() == [1, "kind 0", 0]
+        misses = connection.db_info.page_cache.misses - misses
+        table = connection.db_info.find_table("events")
+        depth = 1
+        while table.page_type.is_interior():
+            table = table._child_for(0)
+            depth += 1
+    assert depth > 2
+    assert misses <= depth
+
+
+def _peak_fetch_memory(tmp_db_path, rows):
+    with Connection(tmp_db_path, cache_pages=10) as connection:
+        cursor = connection.execute("select * from events")
+        tracemalloc.start()
+        try:
+            while batch := cursor.fetchmany(1000):
+                rows -= len(batch)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    assert rows == 0
+    return peak
+
+
+def copy_events(tmp_path, large_db, rows):
+    tmp_db_path = tmp_path / f"events_{rows}.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute(f"ATTACH DATABASE '{large_db}' AS large")
+        db.execute(
+            "CREATE TABLE events AS SELECT * FROM large.events WHERE id <= ?", (rows,)
+        )
+    db.close()
+    return tmp_db_path
+
+
+def test_memory_does_not_grow_with_the_table(tmp_path, large_db):
+    small_peak = _peak_fetch_memory(copy_events(tmp_path, large_db, 5_000), 5_000)
+    large_peak = _peak_fetch_memory(copy_events(tmp_path, large_db, 20_000), 20_000)
+    assert large_peak < 2 * small_peak
+
+
+def test_time_to_first_row(large_db):
+    """The first row is fetched after reading one leaf, not the whole table"""
+    with Connection(large_db) as connection:
+        cache = connection.db_info.page_cache
+
+        def first_row():
+            cache.clear()
+            connection.execute("select * from events").fetchone()
+
+        def all_rows():
+            cache.clear()
+            connection.execute("select * from events").fetchall()
+
+        first_row_time = min(repeat(first_row, number=1, repeat=REPEAT))
+        all_rows_time = min(repeat(all_rows, number=1, repeat=1))
+
+        cache.clear()
+        leaf_reads = cache.leaf_reads
+        cursor = connection.execute("select * from events")
+        assert cursor.fetchone() == [1, "kind 0", 0]
+        first_row_leaves = cache.leaf_reads - leaf_reads
+        cursor.fetchall()
+        all_leaves = cache.leaf_reads - leaf_reads
+    print(
+        f"{LARGE_ROWS} rows: first row in {first_row_time * 1e6:.0f}us, "
+        f"all rows in {all_rows_time * 1e3:.0f}ms"
+    )
+    assert first_row_leaves == 1
+    assert all_leaves > 100
+
+
+if __name__ == "__main__":
+    pytest.main(args=[__file__, "--durations=0", "-s"])
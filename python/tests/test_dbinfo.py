@@ -1,11 +1,17 @@
 import sqlite3
+import sys
+import tracemalloc
 
 import pytest
 
+from codecrafters_sqlite import main
+from codecrafters_sqlite.cells import TableLeafCell
 from codecrafters_sqlite.main import MIN_PAGE_SIZE, DbInfo, extract_table_names
 from test_dbpage import build_test_database
 
 DEFAULT_PAGE_SIZE = 4096
+MAX_PAGE_SIZE = 65536
+MANY_TABLES = 2000
 
 
 def test_page_size():
@@ -38,6 +44,7 @@ def test_tables_in_sample():
 def test_number_of_tables(tmp_path, expected_tables):
     tmp_db_path = build_test_database(tmp_path, expected_tables)
     assert len(DbInfo(tmp_db_path).table_names) == expected_tables
+    assert DbInfo(tmp_db_path).number_of_tables == expected_tables
 
 
 def test_minimum_page_size(tmp_path):
@@ -51,8 +58,8 @@ def test_default_page_size(tmp_path):
 
 
 def test_max_page_size(tmp_path):
-    tmp_db_path = build_test_database(tmp_path, 1, page_size=65536)
-    assert DbInfo(tmp_db_path).page_size == 65536
+    tmp_db_path = build_test_database(tmp_path, 1, page_size=MAX_PAGE_SIZE)
+    assert DbInfo(tmp_db_path).page_size == MAX_PAGE_SIZE
 
 
 def test_extract_table_names():
@@ -97,3 +104,68 @@ def test_table_name_case_insensitive(tmp_path, size):
     db_info = DbInfo(tmp_db_path)
     table = db_info.find_table(f"dummy{size - 1}")
     assert db_info.find_table(f"DUMMY{size - 1}") == table
+
+
+def _peak_scan_memory(tmp_path, row_count):
+    tmp_db_path = build_test_database(
+        tmp_path, 1, page_size=MAX_PAGE_SIZE, row_count=row_count
+    )
+    table = DbInfo(tmp_db_path).find_table("dummy0")
+    tracemalloc.start()
+    try:
+        for cell in table._generate_child_rows():
+            cell.columns
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def test_full_scan_does_not_copy_pages(tmp_path):
+    (small := tmp_path / "small").mkdir()
+    (large := tmp_path / "large").mkdir()
+    small_peak = _peak_scan_memory(small, 5_000)
+    large_peak = _peak_scan_memory(large, 20_000)
+    assert large_peak < MAX_PAGE_SIZE
+    assert large_peak < 2 * small_peak
+
+
+@pytest.fixture(scope="module")
+def many_tables_db(tmp_path_factory):
+    return build_test_database(tmp_path_factory.mktemp("schema"), MANY_TABLES)
+
+
+def _refuse_to_decode(monkeypatch):
+    def decode(*args, **kwargs):
+        raise AssertionError("the schema should not be decoded")
+
+    monkeypatch.setattr(TableLeafCell, "project", decode)
+    monkeypatch.setattr(TableLeafCell, "columns", property(decode))
+
+
+def test_dbinfo_decodes_no_schema(many_tables_db, monkeypatch, capsys):
+    _refuse_to_decode(monkeypatch)
+    monkeypatch.setattr(sys, "argv", ["sqlite", str(many_tables_db), ".dbinfo"])
+    main.main()
+    assert capsys.readouterr().out.splitlines() == [
+        f"database page size: {MIN_PAGE_SIZE}",
+        f"number of tables: {MANY_TABLES}",
+    ]
+
+
+def test_find_table_decodes_one_create_statement(many_tables_db, monkeypatch):
+    db_info = DbInfo(many_tables_db)
+    assert db_info.find_table("dummy7") is not None  # indexes the schema
+    sql_reads = []
+    project = TableLeafCell.project
+
+    def counting_project(self, column_indices, *args, **kwargs):
+        sql_reads.extend(column for column in column_indices if column == 4)
+        return project(self, column_indices, *args, **kwargs)
+
+    monkeypatch.setattr(TableLeafCell, "project", counting_project)
+    assert db_info.table_sql(f"DUMMY{MANY_TABLES - 1}") == (
+        f"CREATE TABLE dummy{MANY_TABLES - 1} (value int)"
+    )
+    assert db_info.table_schema("dummy3").column_names == ["value"]
+    assert len(sql_reads) == 2
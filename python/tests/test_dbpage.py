@@ -102,8 +102,75 @@ def test_sqlite_schema_table_spanning_more_depth(expected_tables):
 def test_empty_last_table(expected_tables):
     sqlite_schema = build_sqlite_schema_table(expected_tables)
     assert len(sqlite_schema.child_rows) == expected_tables
-    (type_, name, table_name, rootpage, sql) = sqlite_schema.child_rows[-1]
+    type_, name, table_name, rootpage, sql = sqlite_schema.child_rows[-1]
     assert type_ == "table"
     assert name == f"dummy{expected_tables - 1}"
     last_table = DbPage(sqlite_schema.database_file, rootpage, page_size=MIN_PAGE_SIZE)
     assert len(last_table.child_rows) == 0
+
+
+@pytest.mark.parametrize("expected_tables", [1, 8, 384, 5003])
+def test_count_rows(expected_tables, monkeypatch):
+    sqlite_schema = build_sqlite_schema_table(expected_tables)
+
+    def no_cells(self, cell_number):
+        raise AssertionError("count_rows read a cell")
+
+    monkeypatch.setattr(DbPage, "_cell", no_cells)
+    assert sqlite_schema.count_rows() == expected_tables
+
+
+def build_table_with_gaps(row_count):
+    with sqlite3.connect(":memory:") as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute("CREATE TABLE gaps (id integer primary key, value int);")
+        db.executemany(
+            "INSERT INTO gaps VALUES(?, ?)",
+            ((rowid, rowid * 2) for rowid in range(1, 3 * row_count, 3)),
+        )
+        db.commit()
+        database = db.serialize()
+    return DbPage(database, page_number=2, page_size=MIN_PAGE_SIZE)
+
+
+@pytest.mark.parametrize("row_count", [1, 10, 5000])
+def test_lookup(row_count):
+    table = build_table_with_gaps(row_count)
+    for rowid in {1, 3 * (row_count // 2) + 1, 3 * row_count - 2}:
+        assert table.lookup(rowid).columns == [rowid, rowid * 2]
+    for rowid in (-1, 0, 2, 3 * row_count):
+        assert table.lookup(rowid) is None
+
+
+@pytest.mark.parametrize(
+    "lo,hi",
+    [(None, None), (1, 1), (2, 3), (0, 100), (299, 3001), (14_000, None), (5, 4)],
+)
+def test_scan_range(lo, hi):
+    table = build_table_with_gaps(5000)
+    expected = [
+        row
+        for row in table.child_rows
+        if (lo is None or row[0] >= lo) and (hi is None or row[0] <= hi)
+    ]
+    assert [cell.columns for cell in table.scan_range(lo, hi)] == expected
+
+
+def test_lookup_reads_one_page_per_level(monkeypatch):
+    table = build_table_with_gaps(5000)
+    depth = 1
+    page = table
+    while page.page_type.is_interior():
+        page = page.children[0]
+        depth += 1
+    assert depth > 2
+    pages_read = []
+    original_init = DbPage.__init__
+
+    def counting_init(self, *args, **kwargs):
+        pages_read.append(args)
+        original_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(DbPage, "__init__", counting_init)
+    assert table.lookup(3001) is not None
+    assert len(pages_read) == depth - 1
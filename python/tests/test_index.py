@@ -0,0 +1,148 @@
+import sqlite3
+
+import pytest
+
+from codecrafters_sqlite.main import (
+    MIN_PAGE_SIZE,
+    Connection,
+    DbInfo,
+    PageType,
+    handle,
+)
+
+COUNTRIES = ("eritrea", "chad", "micronesia", "peru", "o'hare", "")
+
+
+@pytest.fixture(scope="module")
+def companies_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("index") / "companies.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute(
+            "CREATE TABLE companies"
+            " (id integer primary key autoincrement, name text, country text)"
+        )
+        db.execute("CREATE INDEX idx_companies_country on companies (country)")
+        db.executemany(
+            "INSERT INTO companies (name, country) VALUES(?, ?)",
+            (
+                (f"company {row}", COUNTRIES[(row * 7) % len(COUNTRIES)])
+                for row in range(3000)
+            ),
+        )
+        db.execute("INSERT INTO companies (name, country) VALUES('nowhere', NULL)")
+    db.close()
+    return tmp_db_path
+
+
+def expected_rows(tmp_db_path, country):
+    with sqlite3.connect(tmp_db_path) as db:
+        rows = db.execute(
+            "SELECT * FROM companies WHERE country = ? ORDER BY id", (country,)
+        )
+        return [list(row) for row in rows]
+
+
+def test_index_pages(companies_db):
+    index, name = DbInfo(companies_db).find_index("companies", "country")
+    assert name == "idx_companies_country"
+    assert index.page_type == PageType.INDEX_INTERIOR
+    assert any(child.page_type == PageType.INDEX_INTERIOR for child in index.children)
+
+
+def test_index_entries_in_order(companies_db):
+    index, _ = DbInfo(companies_db).find_index("companies", "country")
+    with sqlite3.connect(companies_db) as db:
+        expected = db.execute(
+            "SELECT country, id FROM companies ORDER BY country, id"
+        ).fetchall()
+    assert [tuple(cell.columns) for cell in index._generate_child_rows()] == expected
+    assert index.count_rows() == len(expected)
+
+
+@pytest.mark.parametrize("country", COUNTRIES + ("atlantis",))
+def test_search_index(companies_db, country):
+    index, _ = DbInfo(companies_db).find_index("companies", "country")
+    rowids = [cell.rowid for cell in index.search_index(country)]
+    assert rowids == [row[0] for row in expected_rows(companies_db, country)]
+
+
+@pytest.mark.parametrize("country", ("eritrea", "o'hare", "atlantis"))
+def test_where_uses_index(companies_db, country):
+    quoted = country.replace("'", "''")
+    sql = f"SELECT * FROM companies WHERE country = '{quoted}'"
+    assert list(handle(sql, companies_db)) == expected_rows(companies_db, country)
+    assert list(handle(f"EXPLAIN QUERY PLAN {sql}", companies_db)) == [
+        "SEARCH companies USING INDEX idx_companies_country (country=?)"
+    ]
+
+
+def test_count_with_index(companies_db):
+    sql = "SELECT COUNT(*) FROM companies WHERE country = 'chad'"
+    assert list(handle(sql, companies_db)) == [len(expected_rows(companies_db, "chad"))]
+
+
+def test_unindexed_column_scans(companies_db):
+    sql = "EXPLAIN QUERY PLAN SELECT * FROM companies WHERE name = 'company 1'"
+    assert list(handle(sql, companies_db)) == ["SCAN companies"]
+
+
+FRUITS = ("apple", "Apple", "Banana", "banana", "date", "Date", "zed")
+
+
+@pytest.mark.parametrize(
+    "index_sql,searched",
+    [
+        ("CREATE INDEX i ON t (c)", True),
+        ("CREATE INDEX i ON t (c DESC)", False),
+        ("CREATE INDEX i ON t (c) WHERE n > 500", False),
+        ("CREATE INDEX i ON t (c COLLATE NOCASE)", False),
+        ("CREATE INDEX i ON t ([c])", True),
+        ("CREATE INDEX i ON t (`c` ASC, n)", True),
+        ("CREATE INDEX i ON t (lower(c))", False),
+    ],
+)
+def test_only_ascending_binary_full_indexes_are_searched(tmp_path, index_sql, searched):
+    tmp_db_path = tmp_path / "fruits.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute("CREATE TABLE t (id integer primary key, c text, n integer)")
+        db.execute(index_sql)
+        db.executemany(
+            "INSERT INTO t (c, n) VALUES(?, ?)",
+            ((FRUITS[(row * 3) % len(FRUITS)], row) for row in range(2000)),
+        )
+        db.commit()
+        for fruit in FRUITS + ("APPLE",):
+            sql = f"SELECT * FROM t WHERE c = '{fruit}'"
+            expected = [list(row) for row in db.execute(sql)]
+            assert list(handle(sql, tmp_db_path)) == expected
+            count_sql = f"SELECT count(*) FROM t WHERE c = '{fruit}'"
+            assert list(handle(count_sql, tmp_db_path)) == [len(expected)]
+    db.close()
+    sql = "EXPLAIN QUERY PLAN SELECT * FROM t WHERE c = 'x'"
+    expected_plan = "SEARCH t USING INDEX i (c=?)" if searched else "SCAN t"
+    assert list(handle(sql, tmp_db_path)) == [expected_plan]
+
+
+def test_column_collation_is_the_index_default(tmp_path):
+    tmp_db_path = tmp_path / "nocase.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("CREATE TABLE t (c text COLLATE NOCASE)")
+        db.execute("CREATE INDEX i ON t (c)")
+    db.close()
+    assert DbInfo(tmp_db_path).find_index("t", "c") == (None, None)
+
+
+def test_null_matches_no_index_entries(companies_db):
+    null_rows = expected_rows(companies_db, None)
+    assert null_rows == []
+    sql = "SELECT * FROM companies WHERE country = NULL"
+    assert list(handle(f"EXPLAIN QUERY PLAN {sql}", companies_db)) == [
+        "SEARCH companies USING INDEX idx_companies_country (country=?)"
+    ]
+    assert list(handle(sql, companies_db)) == null_rows
+    with Connection(companies_db) as connection:
+        count_sql = "SELECT COUNT(*) FROM companies WHERE country = ?"
+        assert connection.execute(count_sql, (None,)).fetchall() == [0]
+        assert connection.execute(sql.replace("NULL", "?"), (None,)).fetchall() == []
@@ -1,7 +1,28 @@
 import doctest
 
 import codecrafters_sqlite
+from codecrafters_sqlite import aggregate, cells, main, query, schema
 
 
 def test_docstring():
     assert doctest.testmod(m=codecrafters_sqlite).failed == 0
+
+
+def test_main_docstrings():
+    assert doctest.testmod(m=main).failed == 0
+
+
+def test_schema_docstrings():
+    assert doctest.testmod(m=schema).failed == 0
+
+
+def test_cells_docstrings():
+    assert doctest.testmod(m=cells).failed == 0
+
+
+def test_query_docstrings():
+    assert doctest.testmod(m=query).failed == 0
+
+
+def test_aggregate_docstrings():
+    assert doctest.testmod(m=aggregate).failed == 0
@@ -0,0 +1,150 @@
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+from codecrafters_sqlite import native
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, DbInfo
+
+pytest.importorskip("codecrafters_sqlite._lowlevel")
+
+ROWS = 3000
+QUERIES = (
+    ("select * from items", ()),
+    ("select name, id from items", ()),
+    ("select notes from items", ()),
+    ("select count(*) from items", ()),
+    ("select count(*) from items where size > ?", (4,)),
+    ("select count(*) from items where size between ? and ?", (2.5, 7)),
+    ("select count(*) from items where name = ?", ("item 77",)),
+    ("select count(*) from items where name >= 'item 5'", ()),
+    ("select count(*) from items where size is null", ()),
+    ("select count(*) from items where notes is not null", ()),
+    ("select count(*) from items where notes > ?", ("note note",)),
+    ("select count(*) from items where size < ?", (None,)),
+    ("select count(*) from items where size < ?", (2**70,)),
+    ("select count(*) from items where name like 'item 1%'", ()),
+    ("select count(*) from items where added = ?", (0,)),
+)
+
+
+@pytest.fixture(scope="module")
+def items_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("native") / "items.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute(
+            "CREATE TABLE items"
+            " (id integer primary key, name text, size real, notes text)"
+        )
+        db.executemany(
+            "INSERT INTO items (name, size, notes) VALUES(?, ?, ?)",
+            (
+                # Every hundredth row overflows onto other pages
+                (
+                    f"item {row}",
+                    None if row % 13 == 0 else row % 10 + (0.5 if row % 2 else 0),
+                    "note " * (500 if row % 100 == 6 else row % 3),
+                )
+                for row in range(ROWS)
+            ),
+        )
+        # Rows written before this have no value for it at all
+        db.execute("ALTER TABLE items ADD COLUMN added integer")
+        db.execute("UPDATE items SET added = id % 2 WHERE id > ?", (ROWS // 2,))
+    db.close()
+    return tmp_db_path
+
+
+def run_queries(path):
+    with Connection(path) as connection:
+        return [connection.execute(*query).fetchall() for query in QUERIES]
+
+
+def test_same_results_as_python(items_db, monkeypatch):
+    results = run_queries(items_db)
+    monkeypatch.setattr(native, "TableScan", None)
+    assert results == run_queries(items_db)
+    with sqlite3.connect(items_db) as db:
+        (expected,) = db.execute(*QUERIES[4]).fetchone()
+    db.close()
+    assert results[4] == [expected]
+
+
+def cells(db_info):
+    table = db_info.find_table("items")
+    return [(cell.columns, cell.rowid) for cell in table._generate_child_rows()]
+
+
+def test_child_rows_are_the_same(items_db, monkeypatch):
+    db_info = DbInfo(items_db)
+    walked = cells(db_info)
+    db_info.close()
+    assert len(walked) == ROWS
+    monkeypatch.setattr(native, "TableScan", None)
+    db_info = DbInfo(items_db)
+    assert walked == cells(db_info)
+    db_info.close()
+
+
+def test_stats_are_the_same(items_db, monkeypatch):
+    def stats(sql):
+        with Connection(items_db, cache_pages=0) as connection:
+            cursor = connection.execute(sql)
+            cursor.fetchall()
+            return cursor.stats
+
+    queries = ("select * from items", "select count(*) from items where size > 4")
+    natively = [stats(sql) for sql in queries]
+    monkeypatch.setattr(native, "TableScan", None)
+    for sql, native_stats in zip(queries, natively):
+        python_stats = stats(sql)
+        assert native_stats.cells == python_stats.cells == ROWS
+        assert native_stats.interior_pages == python_stats.interior_pages
+        # Leaves are read again for the cells left to Python, which overflow
+        assert native_stats.leaf_pages >= python_stats.leaf_pages
+
+
+def test_pread_is_scanned_in_python(items_db):
+    with Connection(items_db, page_source="pread") as connection:
+        assert connection.db_info.page_source.buffer is None
+        assert connection.execute("select count(*) from items").fetchall() == [ROWS]
+
+
+@pytest.fixture
+def no_forced_switches():
+    """Threads only take turns when the one running releases the GIL"""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1000)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def test_counts_release_the_gil(items_db, no_forced_switches):
+    db_info = DbInfo(items_db)
+    table = db_info.find_table("items")
+    ticks = []
+    done = threading.Event()
+
+    def tick():
+        while not done.is_set():
+            ticks.append(None)
+            time.sleep(0)  # lets the main thread back in once it waits
+
+    ticker = threading.Thread(target=tick)
+    ticker.start()
+    try:
+        while not ticks:
+            time.sleep(0.001)
+        before = len(ticks)
+        for _ in range(20):
+            table._native_scan().count()
+            table._native_scan().count_where(1, 0, ">=", ("item 5",))
+        during = len(ticks) - before
+    finally:
+        done.set()
+        ticker.join()
+        db_info.close()
+    assert during > 0
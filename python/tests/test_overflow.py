@@ -0,0 +1,139 @@
+import hashlib
+import sqlite3
+
+import pytest
+
+from codecrafters_sqlite import cells
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, DbInfo, handle
+
+DOCUMENT_SIZES = (10, 1_000, 4_062, 10_000, 50_000, 200_000)
+KEY_SIZES = (100, 1_003, 3_000, 20_000)
+
+
+def document(size):
+    """A JSON document of exactly ``size`` bytes"""
+    prefix = '{"padding": "'
+    return prefix + "x" * (size - len(prefix) - 2) + '"}'
+
+
+@pytest.fixture(scope="module", params=(MIN_PAGE_SIZE, 4096))
+def documents_db(request, tmp_path_factory):
+    page_size = request.param
+    tmp_db_path = tmp_path_factory.mktemp("overflow") / f"documents_{page_size}.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % page_size)
+        db.execute(
+            "CREATE TABLE documents (id integer primary key, body text, raw blob, n)"
+        )
+        db.executemany(
+            "INSERT INTO documents (body, raw, n) VALUES(?, ?, ?)",
+            (
+                (document(size), document(size).encode()[::-1], size)
+                for size in DOCUMENT_SIZES
+            ),
+        )
+        db.execute("CREATE TABLE keys (id integer primary key, key text)")
+        db.execute("CREATE INDEX idx_keys_key on keys (key)")
+        db.executemany(
+            "INSERT INTO keys (key) VALUES(?)",
+            ((f"{size:06}" + "k" * size,) for size in KEY_SIZES),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def expected(tmp_db_path, sql):
+    with sqlite3.connect(tmp_db_path) as db:
+        return [list(row) for row in db.execute(sql)]
+
+
+def document_cells(tmp_db_path):
+    return list(DbInfo(tmp_db_path).find_table("documents")._generate_child_rows())
+
+
+@pytest.mark.parametrize(
+    "payload_size,usable_size,is_index,expected_local_size",
+    (
+        pytest.param(4061, 4096, False, 4061, id="table_fits"),
+        pytest.param(4062, 4096, False, 489, id="table_minimum"),
+        pytest.param(10_000, 4096, False, 1816, id="table_surplus"),
+        pytest.param(1002, 4096, True, 1002, id="index_fits"),
+        pytest.param(1003, 4096, True, 489, id="index_minimum"),
+        pytest.param(5000, 4096, True, 908, id="index_surplus"),
+        pytest.param(600, 512, False, 92, id="small_pages"),
+    ),
+)
+def test_local_payload_size(payload_size, usable_size, is_index, expected_local_size):
+    max_local = cells.max_local_payload(usable_size, is_index)
+    assert (
+        cells.local_payload_size(payload_size, usable_size, max_local)
+        == expected_local_size
+    )
+
+
+def test_usable_size(documents_db):
+    db_info = DbInfo(documents_db)
+    assert db_info.usable_size == db_info.page_size
+
+
+def test_select_star(documents_db):
+    assert list(handle("select * from documents", documents_db)) == expected(
+        documents_db, "SELECT * FROM documents ORDER BY id"
+    )
+
+
+def test_select_columns(documents_db):
+    assert list(handle("select n, raw from documents", documents_db)) == expected(
+        documents_db, "SELECT n, raw FROM documents ORDER BY id"
+    )
+
+
+def test_search_overflowing_index(documents_db):
+    key = f"{KEY_SIZES[2]:06}" + "k" * KEY_SIZES[2]
+    assert list(handle(f"select id from keys where key = '{key}'", documents_db)) == [3]
+    index, _ = DbInfo(documents_db).find_index("keys", "key")
+    assert [cell.columns for cell in index._generate_child_rows()] == expected(
+        documents_db, "SELECT key, id FROM keys ORDER BY key"
+    )
+
+
+@pytest.mark.parametrize("column", (1, 2))
+def test_column_chunks(documents_db, column):
+    for cell, (body, raw) in zip(
+        document_cells(documents_db),
+        (
+            (row[0].encode(), row[1])
+            for row in expected(documents_db, "SELECT body, raw FROM documents")
+        ),
+    ):
+        value = (body, raw)[column - 1]
+        chunks = list(cell.column_chunks(column))
+        assert all(isinstance(chunk, memoryview) for chunk in chunks)
+        assert b"".join(chunks) == value
+        if len(value) > DbInfo(documents_db).page_size:
+            assert len(chunks) > 1
+
+
+def test_hash_without_joining(documents_db):
+    cell = document_cells(documents_db)[-1]
+    digest = hashlib.sha256()
+    for chunk in cell.column_chunks(1):
+        digest.update(chunk)
+    assert digest.digest() == hashlib.sha256(document(200_000).encode()).digest()
+
+
+def test_open_column(documents_db):
+    cell = document_cells(documents_db)[-1]
+    with cell.open_column(1) as column:
+        assert column.read(13) == b'{"padding": "'
+        assert column.read(3) == b"xxx"
+        rest = column.read()
+    assert len(rest) == 200_000 - 16
+    assert rest.endswith(b'x"}')
+
+
+def test_needs_read_page_to_overflow(documents_db):
+    cell = document_cells(documents_db)[-1]
+    detached = cells.TableLeafCell(cell._page, cell._pointer, cell.usable_size)
+    with pytest.raises(ValueError):
+        detached.python_columns
@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+
+import pytest
+
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, DbInfo, PageType
+from codecrafters_sqlite.page_cache import PageCache
+from test_dbpage import build_test_database
+
+INTERIOR_PAGES = (2, 3)
+
+
+@dataclass
+class FakePage:
+    page_number: int
+
+    @property
+    def page_type(self):
+        if self.page_number in INTERIOR_PAGES:
+            return PageType.TABLE_INTERIOR
+        return PageType.TABLE_LEAF
+
+
+def test_hits_and_misses():
+    cache = PageCache(FakePage, max_pages=2)
+    assert cache.page(10) == FakePage(10)
+    assert cache.page(10) is cache.page(10)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_evicts_least_recently_used():
+    cache = PageCache(FakePage, max_pages=2)
+    cache.page(10)
+    cache.page(11)
+    cache.page(10)
+    cache.page(12)
+    assert 10 in cache
+    assert 11 not in cache
+    assert 12 in cache
+    assert cache.evictions == 1
+
+
+def test_evicts_leaves_before_interior_pages():
+    cache = PageCache(FakePage, max_pages=2)
+    cache.page(2)
+    cache.page(10)
+    cache.page(11)
+    assert 2 in cache
+    assert 10 not in cache
+    cache.page(3)
+    assert 2 in cache and 3 in cache
+    assert len(cache) == 2
+
+
+def test_evicts_interior_pages_when_only_they_are_left():
+    cache = PageCache(FakePage, max_pages=1)
+    cache.page(2)
+    cache.page(3)
+    assert 2 not in cache
+    assert 3 in cache
+
+
+@pytest.mark.parametrize(
+    "max_pages,max_bytes,expected",
+    [
+        (10, None, 10),
+        (10, 4 * 4096, 4),
+        (2, 4 * 4096, 2),
+    ],
+)
+def test_size_limit(max_pages, max_bytes, expected):
+    cache = PageCache(FakePage, max_pages, max_bytes, page_size=4096)
+    for page_number in range(10, 30):
+        cache.page(page_number)
+    assert len(cache) == expected
+
+
+def test_zero_size_caches_nothing():
+    cache = PageCache(FakePage, max_pages=0)
+    cache.page(10)
+    cache.page(10)
+    assert len(cache) == 0
+    assert cache.misses == 2
+
+
+def test_find_table_reuses_root_page(tmp_path):
+    tmp_db_path = build_test_database(tmp_path, 1, row_count=1)
+    db_info = DbInfo(tmp_db_path)
+    hits = db_info.page_cache.hits
+    assert db_info.find_table("dummy0") is db_info.find_table("dummy0")
+    assert db_info.page_cache.hits == hits + 1
+
+
+def test_repeated_scans_hit_the_cache(tmp_path):
+    tmp_db_path = build_test_database(tmp_path, 1, row_count=1000)
+    db_info = DbInfo(tmp_db_path)
+    table = db_info.find_table("dummy0")
+    assert table.page_type.is_interior()
+    misses = db_info.page_cache.misses
+    first_scan = table.child_rows
+    assert db_info.page_cache.misses > misses
+    misses = db_info.page_cache.misses
+    assert table.child_rows == first_scan
+    assert db_info.page_cache.misses == misses
+
+
+def test_cache_bytes_limit(tmp_path):
+    tmp_db_path = build_test_database(tmp_path, 1, row_count=1000)
+    db_info = DbInfo(tmp_db_path, cache_bytes=4 * MIN_PAGE_SIZE)
+    assert len(db_info.find_table("dummy0").child_rows) == 1000
+    assert len(db_info.page_cache) == 4
@@ -0,0 +1,93 @@
+import os
+import sqlite3
+
+import pytest
+
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, DbInfo
+from codecrafters_sqlite.page_source import PAGE_SOURCES, PreadSource
+
+ROWS = 2000
+QUERIES = (
+    ("select * from items", ()),
+    ("select size, count(*) from items group by size", ()),
+    ("select id, name from items where id = ?", (1234,)),
+    ("select id, size from items where size = ?", (3,)),
+    ("select id, notes from items where id = ?", (7,)),
+)
+
+
+@pytest.fixture(scope="module")
+def items_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("page_source") / "items.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute(
+            "CREATE TABLE items"
+            " (id integer primary key, name text, size integer, notes text)"
+        )
+        db.execute("CREATE INDEX idx_items_size on items (size)")
+        db.executemany(
+            "INSERT INTO items (name, size, notes) VALUES(?, ?, ?)",
+            (
+                # Every hundredth row overflows onto other pages
+                (f"item {row}", row % 10, "note " * (500 if row % 100 == 6 else 1))
+                for row in range(ROWS)
+            ),
+        )
+    db.close()
+    return tmp_db_path
+
+
+@pytest.mark.parametrize("page_source", PAGE_SOURCES)
+def test_same_results_from_every_source(items_db, page_source):
+    with sqlite3.connect(items_db) as db:
+        expected = [
+            list(map(list, db.execute(sql, parameters))) for sql, parameters in QUERIES
+        ]
+    db.close()
+    with Connection(items_db, page_source=page_source) as connection:
+        for (sql, parameters), rows in zip(QUERIES, expected):
+            assert connection.execute(sql, parameters).fetchall() == rows, sql
+
+
+def test_unknown_source(items_db):
+    with pytest.raises(ValueError, match="Unknown page source"):
+        DbInfo(items_db, page_source="carrier pigeon")
+
+
+@pytest.mark.skipif(not hasattr(os, "preadv"), reason="needs os.preadv")
+def test_pread_reads_runs_of_pages(items_db):
+    db_info = DbInfo(items_db, page_source="pread")
+    table = db_info.find_table("items")
+    leaves = sum(1 for _ in table._generate_leaves())
+    source = db_info.page_source
+    reads = source.reads
+    assert sum(1 for _ in table._generate_child_rows()) == ROWS
+    assert source.reads - reads < leaves / 4
+    db_info.close()
+
+
+def test_pread_pool_is_bounded(items_db):
+    source = PreadSource(items_db, pool_pages=8)
+    pages = [source.page(page_number) for page_number in range(1, 50)]
+    source.will_need(range(50, 80))
+    assert len(source._pool) == 8
+    # Evicted pages are still whole for whoever holds them
+    assert all(len(page) == MIN_PAGE_SIZE for page in pages)
+    source.close()
+
+
+def test_pread_raises_on_a_truncated_file(items_db, tmp_path):
+    truncated = tmp_path / "truncated.db"
+    truncated.write_bytes(items_db.read_bytes())
+    with Connection(truncated, page_source="pread", cache_pages=0) as connection:
+        connection.execute("select count(*) from items").fetchall()
+        with open(truncated, "r+b") as database_file:
+            database_file.truncate(MIN_PAGE_SIZE * 10 + 100)
+        with pytest.raises(ValueError, match="the file is truncated"):
+            connection.execute("select * from items").fetchall()
+
+
+def test_parallel_scan_with_pread(items_db):
+    with Connection(items_db, processes=2, page_source="pread") as connection:
+        assert len(connection.execute("select * from items").fetchall()) == ROWS
@@ -0,0 +1,182 @@
+import math
+import sqlite3
+
+import pytest
+
+from codecrafters_sqlite import parallel
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, DbInfo, handle
+from codecrafters_sqlite.query import Access, Plan
+
+ROWS = 5000
+PROCESSES = 3
+
+
+@pytest.fixture(scope="module")
+def numbers_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("parallel") / "numbers.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute("CREATE TABLE numbers (id integer primary key, n int, name text)")
+        db.executemany(
+            "INSERT INTO numbers (n, name) VALUES(?, ?)",
+            (
+                (None if row % 100 == 0 else (row * 37) % 1000, f"number {row}")
+                for row in range(ROWS)
+            ),
+        )
+        db.execute("CREATE TABLE readings (id integer primary key, x real)")
+        db.executemany(
+            "INSERT INTO readings (x) VALUES(?)",
+            ((reading(row),) for row in range(ROWS)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def reading(row):
+    """Tenths between two huge readings that cancel out, whose digits a sum loses
+    to rounding unless it is compensated"""
+    if row in (0, ROWS - 1):
+        return 1e16 if row == 0 else -1e16
+    return row / 10
+
+
+def expected(tmp_db_path, sql):
+    with sqlite3.connect(tmp_db_path) as db:
+        return [list(row) for row in db.execute(sql)]
+
+
+@pytest.mark.parametrize("parts", (1, 4, 50, 10_000))
+def test_split_subtrees_covers_every_leaf_in_order(numbers_db, parts):
+    table = DbInfo(numbers_db).find_table("numbers")
+    db_info = DbInfo(numbers_db)
+    subtrees = [
+        db_info.page_cache.page(page_number)
+        for page_number in parallel.split_subtrees(table, parts)
+    ]
+    assert len(subtrees) >= parts or all(
+        subtree.page_type.is_leaf() for subtree in subtrees
+    )
+    rowids = [
+        cell.columns[0]
+        for subtree in subtrees
+        for cell in subtree._generate_child_rows()
+    ]
+    assert rowids == list(range(1, ROWS + 1))
+
+
+def test_parallel_scan_in_rowid_order(numbers_db):
+    rows = parallel.parallel_scan(DbInfo(numbers_db), "numbers", processes=PROCESSES)
+    assert list(rows) == expected(numbers_db, "SELECT * FROM numbers ORDER BY id")
+
+
+def test_parallel_scan_unordered(numbers_db):
+    rows = parallel.parallel_scan(
+        DbInfo(numbers_db), "numbers", [2, 0], 0, ordered=False, processes=PROCESSES
+    )
+    assert sorted(rows, key=lambda row: row[1]) == expected(
+        numbers_db, "SELECT name, id FROM numbers ORDER BY id"
+    )
+
+
+def test_parallel_count(numbers_db):
+    assert parallel.parallel_count(DbInfo(numbers_db), "numbers", PROCESSES) == ROWS
+
+
+def test_leaf_batches_are_every_leaf_in_order(numbers_db):
+    db_info = DbInfo(numbers_db)
+    table = db_info.find_table("numbers")
+    batches = list(parallel.leaf_batches(table, 3))
+    assert all(0 < len(batch) <= 3 for batch in batches)
+    leaves = [page.page_number for page in table._generate_leaves()]
+    assert [page_number for batch in batches for page_number in batch] == leaves
+
+
+def test_parallel_scan_streams(numbers_db, monkeypatch):
+    """Only a few batches of leaves are decoded ahead of the rows taken"""
+    submitted = []
+    bounded_map = parallel._bounded_map
+
+    def counting_map(executor, function, tasks, in_flight, ordered):
+        def counted(tasks):
+            for task in tasks:
+                submitted.append(task)
+                yield task
+
+        return bounded_map(executor, function, counted(tasks), in_flight, ordered)
+
+    monkeypatch.setattr(parallel, "_bounded_map", counting_map)
+    rows = parallel.parallel_scan(DbInfo(numbers_db), "numbers", processes=2)
+    assert next(rows) == [1, None, "number 0"]
+    in_flight = 2 * parallel.TASKS_IN_FLIGHT_PER_PROCESS
+    assert len(submitted) == in_flight
+    assert len(list(rows)) == ROWS - 1
+    assert len(submitted) > in_flight
+
+
+@pytest.mark.parametrize(
+    "sql",
+    (
+        "select count(n), sum(n), avg(n), min(n), max(n) from numbers",
+        "select min(name), max(id) from numbers",
+        "select n, count(*) from numbers group by n",
+        "select count(*) from numbers where n > 500",
+    ),
+)
+def test_parallel_aggregate(numbers_db, sql):
+    with Connection(numbers_db, processes=PROCESSES) as connection:
+        plan = connection.prepare(sql)
+        assert list(connection.execute(sql)) == list(handle(sql, numbers_db))
+    if plan.access == Access.SCAN:
+        groups = parallel.parallel_aggregate(
+            DbInfo(numbers_db),
+            "numbers",
+            plan.aggregates,
+            plan.group_indices,
+            plan.rowid_column,
+            PROCESSES,
+        )
+        assert [values for _, values in groups] == [
+            row[-len(plan.aggregates) :] for row in expected(numbers_db, sql)
+        ]
+
+
+def test_aggregates_are_combined_in_the_workers(numbers_db, monkeypatch):
+    def no_rows(*args, **kwargs):
+        raise AssertionError("rows scanned in this process")
+
+    monkeypatch.setattr(Plan, "cells", no_rows)
+    sql = "select sum(n), max(name) from numbers"
+    assert list(handle(sql, numbers_db, processes=PROCESSES)) == expected(
+        numbers_db, sql
+    )
+
+
+def test_parallel_float_sums_match_serial(numbers_db):
+    sql = "select sum(x), avg(x) from readings"
+    with Connection(numbers_db) as connection:
+        (serial,) = connection.execute(sql)
+    with Connection(numbers_db, processes=PROCESSES) as connection:
+        (in_parallel,) = connection.execute(sql)
+    assert in_parallel == serial
+    assert serial[0] == math.fsum(map(reading, range(ROWS)))
+
+
+def test_handle_unordered(numbers_db):
+    rows = handle("select id, n from numbers", numbers_db, PROCESSES, ordered=False)
+    assert sorted(rows) == expected(numbers_db, "SELECT id, n FROM numbers")
+
+
+@pytest.mark.parametrize(
+    "sql",
+    (
+        "select count(*) from numbers",
+        "select * from numbers",
+        "select name, n from numbers",
+        "select name from numbers where id = 17",
+    ),
+)
+def test_handle_with_processes(numbers_db, sql):
+    assert list(handle(sql, numbers_db, processes=PROCESSES)) == list(
+        handle(sql, numbers_db)
+    )
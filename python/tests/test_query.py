@@ -0,0 +1,169 @@
+import sqlite3
+from timeit import repeat
+
+import pytest
+
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, DbInfo
+from codecrafters_sqlite.query import Access, Parameter, prepare
+
+ROWS = 2000
+LOOKUPS = 200
+
+
+@pytest.fixture(scope="module")
+def people_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("query") / "people.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute(
+            "CREATE TABLE people (id integer primary key, name text, city text, age)"
+        )
+        db.execute("CREATE INDEX idx_people_city on people (city)")
+        db.executemany(
+            "INSERT INTO people (name, city, age) VALUES(?, ?, ?)",
+            ((f"person {row}", f"city {row % 50}", row % 90) for row in range(ROWS)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def expected(tmp_db_path, sql, parameters=()):
+    with sqlite3.connect(tmp_db_path) as db:
+        return [list(row) for row in db.execute(sql, parameters)]
+
+
+@pytest.mark.parametrize(
+    "sql,access,parameter_count",
+    (
+        ("select * from people", Access.SCAN, 0),
+        ("select name from people where id = ?", Access.ROWID, 1),
+        ("select name from people where rowid = 5", Access.ROWID, 0),
+        (
+            "select count(*) from people where id between ? and 9",
+            Access.ROWID_RANGE,
+            1,
+        ),
+        ("select id, name from people where city = ?", Access.INDEX, 1),
+        ("select id from people where age = ?", Access.FILTER, 1),
+        ("select id from people where age between ? and ?", Access.FILTER, 2),
+    ),
+)
+def test_access_paths(people_db, sql, access, parameter_count):
+    plan = prepare(DbInfo(people_db), sql)
+    assert plan.error is None
+    assert plan.access == access
+    assert plan.parameter_count == parameter_count
+    assert plan.root_page == DbInfo(people_db).find_table("people").page_number
+
+
+def test_parameters_are_numbered_in_order(people_db):
+    plan = prepare(DbInfo(people_db), "select id from people where age between ? and ?")
+    assert plan.predicate.operands == (Parameter(0), Parameter(1))
+    assert plan.predicate.bind((3, 4)) == (3, 4)
+
+
+@pytest.mark.parametrize(
+    "sql,expected_sql,parameters",
+    (
+        (
+            "select name, city from people where id = ?",
+            "SELECT name, city FROM people WHERE id = ?",
+            (17,),
+        ),
+        (
+            "select * from people where id = ?",
+            "SELECT * FROM people WHERE id = ?",
+            (-1,),
+        ),
+        (
+            "select id, name from people where city = ?",
+            "SELECT id, name FROM people WHERE city = ? ORDER BY id",
+            ("city 7",),
+        ),
+        (
+            "select id, age from people where age between ? and ?",
+            "SELECT id, age FROM people WHERE age BETWEEN ? AND ? ORDER BY id",
+            (10, 12),
+        ),
+        (
+            "select id, name from people where id between ? and ?",
+            "SELECT id, name FROM people WHERE id BETWEEN ? AND ? ORDER BY id",
+            (100, 120),
+        ),
+    ),
+)
+def test_execute_with_parameters(people_db, sql, expected_sql, parameters):
+    with Connection(people_db) as connection:
+        rows = list(connection.execute(sql, parameters))
+    assert rows == expected(people_db, expected_sql, parameters)
+
+
+def test_wrong_number_of_parameters(people_db):
+    with Connection(people_db) as connection:
+        with pytest.raises(ValueError):
+            connection.execute("select name from people where id = ?")
+
+
+@pytest.mark.parametrize(
+    "sql,message",
+    (
+        ("select nope from people", "no such column: nope"),
+        ("select name from people where nope = 1", "no such column: nope"),
+        ("select * from nowhere", "no such table: nowhere"),
+        ("drop table people", "Invalid command: drop table people"),
+    ),
+)
+def test_errors(people_db, sql, message):
+    with Connection(people_db) as connection:
+        assert list(connection.execute(sql)) == [message]
+
+
+@pytest.mark.parametrize(
+    "create_sql,values",
+    (
+        ("CREATE TABLE t (a, b)", (None, 1)),
+        ("CREATE TABLE t (a, id integer primary key)", (None, 1)),
+        ("CREATE TABLE t (id integer primary key, a)", (None, 2)),
+    ),
+)
+@pytest.mark.parametrize("processes", (None, 2))
+def test_select_star_is_every_column(tmp_path, create_sql, values, processes):
+    tmp_db_path = tmp_path / "star.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute(create_sql)
+        db.execute("INSERT INTO t VALUES (?, ?)", values)
+        expected = [list(row) for row in db.execute("SELECT * FROM t")]
+    db.close()
+    with Connection(tmp_db_path, processes=processes) as connection:
+        assert connection.execute("select * from t").fetchall() == expected
+        columns = ", ".join(connection.db_info.table_schema("t").column_names)
+        assert connection.execute(f"select {columns} from t").fetchall() == expected
+
+
+def test_plans_are_cached(people_db):
+    with Connection(people_db, plan_cache_size=2) as connection:
+        first = connection.prepare("select name from people where id = ?")
+        assert connection.prepare("select name from people where id = ?") is first
+        connection.prepare("select city from people where id = ?")
+        connection.prepare("select age from people where id = ?")
+        assert connection.prepare("select name from people where id = ?") is not first
+
+
+def test_cached_plans_are_faster(people_db):
+    sql = "select name from people where city = ?"
+
+    def lookups(connection):
+        for lookup in range(LOOKUPS):
+            connection.execute(sql, (f"city {lookup % 50}",))
+
+    with (
+        Connection(people_db) as caching,
+        Connection(people_db, plan_cache_size=0) as parsing,
+    ):
+        cached_time = min(repeat(lambda: lookups(caching), number=1, repeat=3))
+        parsing_time = min(repeat(lambda: lookups(parsing), number=1, repeat=3))
+    print(
+        f"{cached_time / LOOKUPS * 1e6:.1f}us/prepare cached, "
+        f"{parsing_time / LOOKUPS * 1e6:.1f}us/prepare parsed"
+    )
+    assert cached_time < parsing_time / 2
@@ -0,0 +1,111 @@
+import mmap
+import sqlite3
+
+import pytest
+
+from codecrafters_sqlite import readahead
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection
+from codecrafters_sqlite.readahead import LOOKUPS_BEFORE_RANDOM, Advisor
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(mmap, "MADV_WILLNEED"), reason="no madvise on this platform"
+)
+
+
+class FakeMap:
+    """Records madvise calls instead of making them"""
+
+    def __init__(self, size):
+        self.size = size
+        self.calls = []
+
+    def __len__(self):
+        return self.size
+
+    def madvise(self, advice, start=0, length=None):
+        self.calls.append((advice, start, length))
+
+    def will_need(self):
+        return [call[1:] for call in self.calls if call[0] == mmap.MADV_WILLNEED]
+
+    def whole_map(self):
+        return [advice for advice, _, length in self.calls if length is None]
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(readahead, "ENABLED", True)
+
+
+def test_will_need_in_runs(enabled):
+    fake = FakeMap(100 * 4096)
+    Advisor(fake, 4096).will_need([5, 3, 4, 9, 500])
+    assert fake.will_need() == [(2 * 4096, 3 * 4096), (8 * 4096, 4096)]
+
+
+def test_will_need_aligned_to_system_pages(enabled):
+    fake = FakeMap(100 * 512)
+    Advisor(fake, 512).will_need([11])
+    start = 10 * 512 - 10 * 512 % mmap.PAGESIZE
+    assert fake.will_need() == [(start, 11 * 512 - start)]
+
+
+def test_random_after_a_run_of_lookups(enabled):
+    fake = FakeMap(4096)
+    advisor = Advisor(fake, 4096)
+    for _ in range(LOOKUPS_BEFORE_RANDOM * 2):
+        advisor.lookup()
+    advisor.scan()
+    advisor.scan()
+    advisor.lookup()
+    assert fake.whole_map() == [mmap.MADV_RANDOM, mmap.MADV_SEQUENTIAL]
+
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(readahead, "ENABLED", False)
+    fake = FakeMap(4096)
+    advisor = Advisor(fake, 4096)
+    advisor.scan()
+    advisor.will_need([1])
+    assert fake.calls == []
+
+
+@pytest.fixture
+def connection(enabled, tmp_path):
+    tmp_db_path = tmp_path / "readahead.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute("CREATE TABLE items (id integer primary key, name text)")
+        db.executemany(
+            "INSERT INTO items (name) VALUES(?)",
+            ((f"item {row}",) for row in range(3000)),
+        )
+    db.close()
+    with Connection(tmp_db_path) as connection:
+        advisor = connection.db_info.page_source.advisor
+        advisor._mmap = FakeMap(len(advisor._mmap))
+        yield connection
+
+
+def test_scan_reads_ahead_every_leaf(connection):
+    table = connection.db_info.find_table("items")
+    leaves = {leaf.page_number for leaf in table._generate_leaves()}
+    fake = connection.db_info.page_source.advisor._mmap
+    fake.calls.clear()
+    assert len(connection.execute("select name from items").fetchall()) == 3000
+    advised = {
+        start // MIN_PAGE_SIZE + page + 1
+        for start, length in fake.will_need()
+        for page in range(length // MIN_PAGE_SIZE)
+    }
+    assert leaves <= advised
+    assert fake.whole_map() == [mmap.MADV_SEQUENTIAL]
+
+
+def test_count_and_lookups_do_not_read_ahead(connection):
+    fake = connection.db_info.page_source.advisor._mmap
+    connection.execute("select count(*) from items").fetchall()
+    for rowid in range(LOOKUPS_BEFORE_RANDOM):
+        connection.execute("select name from items where id = ?", (rowid,)).fetchall()
+    assert fake.will_need() == []
+    assert fake.whole_map() == [mmap.MADV_RANDOM]
@@ -0,0 +1,147 @@
+import sqlite3
+from timeit import repeat
+
+import pytest
+
+from codecrafters_sqlite import cells
+from codecrafters_sqlite.cells import TableLeafCell, VarintReader
+from codecrafters_sqlite.main import DbPage
+
+PAGE_SIZE = 65536
+ROWS = 100
+NUMBER = 5
+REPEAT = 5
+
+test_cases = (
+    "width",
+    (
+        pytest.param(4, id="narrow"),
+        pytest.param(64, id="wide"),
+    ),
+)
+
+
+def build_wide_database(width):
+    columns = ", ".join(f"c{column} text" for column in range(width))
+    placeholders = ", ".join("?" * width)
+    with sqlite3.connect(":memory:") as db:
+        db.execute("PRAGMA page_size = %d;" % PAGE_SIZE)
+        db.execute(f"CREATE TABLE wide ({columns});")
+        db.executemany(
+            f"INSERT INTO wide VALUES({placeholders})",
+            (
+                tuple(f"r{row}c{column}" for column in range(width))
+                for row in range(ROWS)
+            ),
+        )
+        db.commit()
+        return db.serialize()
+
+
+def leaf_cells(width):
+    database = build_wide_database(width)
+    table = DbPage(database, page_number=2, page_size=PAGE_SIZE)
+    assert table.page_type.is_leaf()
+    return table._page, [
+        table._cell_content_pointer(cell) for cell in range(table.number_of_cells)
+    ]
+
+
+def slicing_columns(page, pointer):
+    """Decoding before cursors: re-slice the page for every cell and varint"""
+    buffer = page[pointer:]
+
+    def next_varint():
+        nonlocal buffer
+        value, length = cells.decode_varint(bytes(buffer[:10]))
+        buffer = buffer[length:]
+        return value, length
+
+    next_varint()  # payload size
+    next_varint()  # rowid
+    header_size, size = next_varint()
+    serial_type_codes = []
+    while size < header_size:
+        serial_type_code, length = next_varint()
+        size += length
+        serial_type_codes.append(serial_type_code)
+    current_location = 0
+    for serial_type_code in serial_type_codes:
+        _, content_size = cells.decode(buffer, current_location, serial_type_code)
+        current_location += content_size
+
+
+def cursor_columns(page, pointer):
+    """Walk the same record by offset with a VarintReader cursor"""
+    record_varints = VarintReader(page, pointer)
+    next(record_varints)  # payload size
+    next(record_varints)  # rowid
+    header_size, header_size_length = next(record_varints)
+    serial_type_codes = list(record_varints.read(header_size - header_size_length))
+    current_location = record_varints.offset
+    for serial_type_code in serial_type_codes:
+        _, content_size = cells.decode(page, current_location, serial_type_code)
+        current_location += content_size
+
+
+def time_per_row(read_columns, page, pointers):
+    def read_page():
+        for pointer in pointers:
+            read_columns(page, pointer)
+
+    best = min(repeat(read_page, number=NUMBER, repeat=REPEAT))
+    return best / (NUMBER * len(pointers))
+
+
+def compare_per_row(width):
+    page, pointers = leaf_cells(width)
+    assert len(pointers) == ROWS
+    slicing_time = time_per_row(slicing_columns, bytes(page), pointers)
+    cursor_time = time_per_row(cursor_columns, page, pointers)
+    print(
+        f"width {width}: {slicing_time * 1e6:.1f}us/row slicing, "
+        f"{cursor_time * 1e6:.1f}us/row cursor"
+    )
+    return slicing_time, cursor_time
+
+
+@pytest.mark.parametrize(*test_cases)
+def test_per_row_cost(width):
+    compare_per_row(width)
+
+
+def test_cursor_on_wide_rows():
+    slicing_time, cursor_time = compare_per_row(64)
+    print(f"width 64: the cursor takes {cursor_time / slicing_time:.0%} as long")
+
+
+def test_projection_costs_like_its_columns(monkeypatch):
+    page, pointers = leaf_cells(64)
+
+    def project_two(page, pointer):
+        TableLeafCell(page, pointer, PAGE_SIZE).python_project([3, 40])
+
+    def all_columns(page, pointer):
+        TableLeafCell(page, pointer, PAGE_SIZE).python_columns
+
+    projection_time = time_per_row(project_two, page, pointers)
+    all_columns_time = time_per_row(all_columns, page, pointers)
+    print(
+        f"2 of 64 columns: {projection_time * 1e6:.1f}us/row, "
+        f"all 64: {all_columns_time * 1e6:.1f}us/row"
+    )
+
+    decoded = []
+    decode = cells.decode
+
+    def counting_decode(record, location, serial_type_code):
+        decoded.append(serial_type_code)
+        return decode(record, location, serial_type_code)
+
+    monkeypatch.setattr(cells, "decode", counting_decode)
+    project_two(page, pointers[0])
+    assert len(decoded) == 2
+
+
+if __name__ == "__main__":
+    pytest.main(args=[__file__, "--durations=0", "-s"])
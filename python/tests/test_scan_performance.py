@@ -0,0 +1,353 @@
+"""Scan benchmarks on generated databases, checked against a local baseline
+
+Sizes are chosen with SQLITE_BENCHMARK_SIZES, e.g. ``10K,1M,10M`` (10K by
+default), and generated databases are kept in SQLITE_BENCHMARK_DIR if it is set,
+so big ones are only built once. Results go to SQLITE_BENCHMARK_RESULTS if set.
+
+With SQLITE_BENCHMARK_BASELINE pointing at a JSON file (``bench_baseline.json``
+at the top of the repository by default), each benchmark fails if its throughput drops below
+SQLITE_BENCHMARK_TOLERANCE (0.5 by default) of the baseline's. Set
+SQLITE_BENCHMARK_SAVE=1 to write this run's results as the new baseline.
+
+The page source benchmarks run the same queries over each kind of page source.
+The cold benchmarks drop the file from the kernel's page cache before every run,
+with and without the mmap advice in ``readahead``, to show what the advice saves:
+advised lookups must read less from disk than unadvised ones.
+The native benchmarks run scans and counts with and without the Rust scanner in
+``native``, on one thread and on several at once, each with its own connection.
+"""
+
+import json
+import os
+import random
+import resource
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from timeit import repeat
+
+import pytest
+
+from codecrafters_sqlite import native, readahead
+from codecrafters_sqlite.main import Connection, DbInfo
+from codecrafters_sqlite.page_source import PAGE_SOURCES
+
+SIZE_SUFFIXES = {"K": 1_000, "M": 1_000_000}
+SIZES = os.environ.get("SQLITE_BENCHMARK_SIZES", "10K").split(",")
+BASELINE = Path(
+    os.environ.get(
+        "SQLITE_BENCHMARK_BASELINE",
+        Path(__file__).parents[2] / "bench_baseline.json",
+    )
+)
+TOLERANCE = float(os.environ.get("SQLITE_BENCHMARK_TOLERANCE", 0.5))
+REPEAT = 3
+LOOKUPS = 1000
+WIDE_COLUMNS = 20
+TREES = {"shallow": 65536, "deep": 512}  # page sizes
+OPERATIONS = ("dbinfo", "tables", "count", "scan", "projection", "lookup")
+COLD_OPERATIONS = ("scan", "lookup")
+SOURCE_OPERATIONS = ("scan", "projection", "lookup")
+NATIVE_OPERATIONS = ("count", "filtered_count", "scan", "projection")
+THREADS = 4
+UNITS = {"dbinfo": "runs", "tables": "runs", "lookup": "lookups"}
+
+
+def rows_in(size):
+    """The number of rows in a size such as 250, 10K or 1M"""
+    if size[-1].upper() in SIZE_SUFFIXES:
+        return int(size[:-1]) * SIZE_SUFFIXES[size[-1].upper()]
+    return int(size)
+
+
+def generate_rows(shape, rows):
+    for row in range(rows):
+        if shape == "narrow":
+            yield row * 7, f"name {row}"
+        else:
+            yield tuple(f"row {row} column {column}" for column in range(WIDE_COLUMNS))
+
+
+def build_database(path, shape, tree, rows):
+    if shape == "narrow":
+        columns = "value integer, name text"
+    else:
+        columns = ", ".join(f"c{column} text" for column in range(WIDE_COLUMNS))
+    placeholders = ", ".join("?" * (2 if shape == "narrow" else WIDE_COLUMNS))
+    partial_path = path.with_suffix(".partial")
+    partial_path.unlink(missing_ok=True)
+    with sqlite3.connect(partial_path) as db:
+        db.execute("PRAGMA page_size = %d;" % TREES[tree])
+        db.execute("PRAGMA journal_mode = OFF;")
+        db.execute(f"CREATE TABLE bench (id integer primary key, {columns})")
+        db.executemany(
+            f"INSERT INTO bench VALUES(NULL, {placeholders})",
+            generate_rows(shape, rows),
+        )
+    db.close()
+    partial_path.rename(path)  # only complete databases are reused
+
+
+@pytest.fixture(scope="module")
+def database_dir(tmp_path_factory):
+    if (directory := os.environ.get("SQLITE_BENCHMARK_DIR")) is not None:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        return Path(directory)
+    return tmp_path_factory.mktemp("benchmark")
+
+
+@pytest.fixture(scope="module")
+def results():
+    results = {}
+    yield results
+    for name, result in results.items():
+        print(
+            f"{name}: {result['rows_per_second']:,.0f} {result['unit']}/s,"
+            f" {result['mb_per_second']:.1f} MB/s,"
+            f" peak RSS {result['peak_rss_mb']:.0f} MB"
+            + (f", read {read:.1f} MB" if (read := result.get("read_mb")) else "")
+        )
+    if (results_path := os.environ.get("SQLITE_BENCHMARK_RESULTS")) is not None:
+        Path(results_path).write_text(json.dumps(results, indent=2, sort_keys=True))
+    if os.environ.get("SQLITE_BENCHMARK_SAVE"):
+        baseline = json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+        baseline.update(results)
+        BASELINE.write_text(json.dumps(baseline, indent=2, sort_keys=True))
+
+
+@pytest.fixture(scope="module")
+def baseline():
+    return json.loads(BASELINE.read_text()) if BASELINE.exists() else {}
+
+
+def reset_peak_rss():
+    """Start a new peak RSS measurement where Linux allows it"""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass  # the peak is then the whole process's
+
+
+def peak_rss_mb():
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def drop_from_page_cache(path):
+    """Make the next read of a file come from disk"""
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(descriptor, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(descriptor)
+
+
+def bytes_read():
+    """The bytes this process has had read from disk, where Linux counts them"""
+    try:
+        for line in Path("/proc/self/io").read_text().splitlines():
+            if line.startswith("read_bytes:"):
+                return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def database(database_dir, size, shape, tree):
+    path = database_dir / f"bench_{shape}_{tree}_{size}.db"
+    if not path.exists():
+        build_database(path, shape, tree, rows_in(size))
+    return path
+
+
+def record(results, baseline, name, seconds, rows_read, rows, megabytes, unit):
+    result = results[name] = {
+        "seconds": seconds,
+        "unit": unit,
+        "rows_per_second": rows_read / seconds,
+        "mb_per_second": megabytes / seconds if rows_read == rows else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    if (expected := baseline.get(name)) is not None:
+        assert result["rows_per_second"] >= expected["rows_per_second"] * TOLERANCE
+    return result
+
+
+def operation(name, connection, rows):
+    """A run of an operation, and the number of rows it reads or, for dbinfo
+    and tables, 1"""
+    match name:
+        case "dbinfo":
+
+            def run():
+                db_info = DbInfo(connection.database_file_path)
+                db_info.page_size, db_info.number_of_tables
+                db_info.close()
+
+            return run, 1
+        case "tables":
+
+            def run():
+                db_info = DbInfo(connection.database_file_path)
+                db_info.table_names
+                db_info.close()
+
+            return run, 1
+        case "count" | "filtered_count" | "scan" | "projection":
+            sql = {
+                "count": "select count(*) from bench",
+                "filtered_count": "select count(*) from bench where name >= 'name 5'",
+                "scan": "select * from bench",
+                "projection": "select id from bench",
+            }[name]
+            return lambda: sum(1 for _ in connection.execute(sql)), rows
+        case "lookup":
+            rowids = random.Random(rows).choices(range(1, rows + 1), k=LOOKUPS)
+            sql = "select * from bench where id = ?"
+
+            def run():
+                for rowid in rowids:
+                    connection.execute(sql, (rowid,)).fetchone()
+
+            return run, LOOKUPS
+
+
+@pytest.mark.parametrize("operation_name", OPERATIONS)
+@pytest.mark.parametrize("tree", TREES)
+@pytest.mark.parametrize("shape", ("narrow", "wide"))
+@pytest.mark.parametrize("size", SIZES)
+def test_scan_performance(
+    database_dir, results, baseline, size, shape, tree, operation_name
+):
+    rows = rows_in(size)
+    path = database(database_dir, size, shape, tree)
+    megabytes = path.stat().st_size / 1e6
+
+    with Connection(path) as connection:
+        run, rows_read = operation(operation_name, connection, rows)
+        run()  # warm the page cache and the plan cache
+        reset_peak_rss()
+        seconds = min(repeat(run, number=1, repeat=REPEAT))
+
+    name = f"{operation_name}[{shape}-{tree}-{size}]"
+    unit = UNITS.get(operation_name, "rows")
+    record(results, baseline, name, seconds, rows_read, rows, megabytes, unit)
+
+
+@pytest.mark.parametrize("page_source", PAGE_SOURCES)
+@pytest.mark.parametrize("operation_name", SOURCE_OPERATIONS)
+@pytest.mark.parametrize("tree", TREES)
+@pytest.mark.parametrize("size", SIZES)
+def test_page_source_performance(
+    database_dir, results, baseline, size, tree, operation_name, page_source
+):
+    rows = rows_in(size)
+    path = database(database_dir, size, "narrow", tree)
+    megabytes = path.stat().st_size / 1e6
+
+    with Connection(path, page_source=page_source) as connection:
+        run, rows_read = operation(operation_name, connection, rows)
+        run()
+        reset_peak_rss()
+        seconds = min(repeat(run, number=1, repeat=REPEAT))
+
+    name = f"{operation_name}[{tree}-{size}-{page_source}]"
+    unit = UNITS.get(operation_name, "rows")
+    record(results, baseline, name, seconds, rows_read, rows, megabytes, unit)
+
+
+@pytest.mark.skipif(
+    not hasattr(os, "posix_fadvise"), reason="needs posix_fadvise to drop pages"
+)
+# Unadvised first, for the advised run to compare with
+@pytest.mark.parametrize("advice", ("unadvised", "advised"))
+@pytest.mark.parametrize("operation_name", COLD_OPERATIONS)
+@pytest.mark.parametrize("tree", TREES)
+@pytest.mark.parametrize("size", SIZES)
+def test_cold_cache_performance(
+    monkeypatch, database_dir, results, baseline, size, tree, operation_name, advice
+):
+    rows = rows_in(size)
+    path = database(database_dir, size, "narrow", tree)
+    megabytes = path.stat().st_size / 1e6
+    monkeypatch.setattr(readahead, "ENABLED", readahead.ENABLED and advice == "advised")
+
+    def run():
+        # A new connection each time, so that no pages are cached in-process either
+        with Connection(path) as connection:
+            operation(operation_name, connection, rows)[0]()
+
+    rows_read = LOOKUPS if operation_name == "lookup" else rows
+    reset_peak_rss()
+    start = bytes_read()
+    seconds = min(
+        repeat(run, setup=lambda: drop_from_page_cache(path), number=1, repeat=REPEAT)
+    )
+    name = f"cold_{operation_name}[{tree}-{size}-{advice}]"
+    unit = UNITS.get(operation_name, "rows")
+    result = record(results, baseline, name, seconds, rows_read, rows, megabytes, unit)
+    result["read_mb"] = (bytes_read() - start) / REPEAT / 1e6
+    # Lookups into a small file touch most of its pages, advised or not
+    sparse = LOOKUPS * TREES[tree] < path.stat().st_size / 4
+    unadvised = results.get(f"cold_{operation_name}[{tree}-{size}-unadvised]", {})
+    if (
+        operation_name == "lookup"
+        and advice == "advised"
+        and sparse
+        and readahead.ENABLED
+        and unadvised.get("read_mb")  # zero where reads aren't counted
+    ):
+        assert result["read_mb"] < unadvised["read_mb"]
+
+
+@pytest.mark.skipif(native.TableScan is None, reason="needs the Rust extension")
+@pytest.mark.parametrize("scanner", ("native", "python"))
+@pytest.mark.parametrize("threads", (1, THREADS))
+@pytest.mark.parametrize("operation_name", NATIVE_OPERATIONS)
+@pytest.mark.parametrize("tree", TREES)
+@pytest.mark.parametrize("size", SIZES)
+def test_native_scan_performance(
+    monkeypatch,
+    database_dir,
+    results,
+    baseline,
+    size,
+    tree,
+    operation_name,
+    threads,
+    scanner,
+):
+    rows = rows_in(size)
+    path = database(database_dir, size, "narrow", tree)
+    megabytes = path.stat().st_size / 1e6
+    if scanner == "python":
+        monkeypatch.setattr(native, "TableScan", None)
+
+    connections = [Connection(path) for _ in range(threads)]
+    runs = [operation(operation_name, c, rows)[0] for c in connections]
+
+    def run():
+        with ThreadPoolExecutor(threads) as pool:
+            for future in [pool.submit(run) for run in runs]:
+                future.result()
+
+    try:
+        run()
+        reset_peak_rss()
+        seconds = min(repeat(run, number=1, repeat=REPEAT))
+    finally:
+        for connection in connections:
+            connection.close()
+
+    name = f"{operation_name}[{tree}-{size}-{threads}-threads-{scanner}]"
+    rows_read, megabytes = rows * threads, megabytes * threads
+    record(results, baseline, name, seconds, rows_read, rows_read, megabytes, "rows")
+
+
+if __name__ == "__main__":
+    pytest.main(args=[__file__, "--durations=0", "-s"])
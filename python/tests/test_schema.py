@@ -0,0 +1,87 @@
+import pytest
+
+from codecrafters_sqlite.schema import Column, parse_create_table, rowid_alias
+
+COMPANIES_SQL = (
+    "CREATE TABLE companies\n(\n\tid integer primary key autoincrement\n, name text,"
+    ' domain text, year_founded text, industry text, "size range" text, locality text,'
+    " country text, current_employees text, total_employees text)"
+)
+
+
+def test_companies_columns():
+    schema = parse_create_table(COMPANIES_SQL)
+    assert schema.column_names == [
+        "id",
+        "name",
+        "domain",
+        "year_founded",
+        "industry",
+        "size range",
+        "locality",
+        "country",
+        "current_employees",
+        "total_employees",
+    ]
+    assert schema.rowid_column == 0
+    assert schema.column_index("COUNTRY") == 7
+    assert schema.column_index("no_such_column") is None
+
+
+@pytest.mark.parametrize(
+    "sql,expected",
+    [
+        ("CREATE TABLE t (a INTEGER PRIMARY KEY DESC, b)", "a"),
+        ("CREATE TABLE t (a INTEGER, b TEXT, PRIMARY KEY (a))", "a"),
+        ("CREATE TABLE t (a INTEGER, b, CONSTRAINT pk PRIMARY KEY (a ASC))", "a"),
+        ("CREATE TABLE t (a INT PRIMARY KEY, b)", None),
+        ("CREATE TABLE t (a INTEGER, b INTEGER, PRIMARY KEY (a, b))", None),
+        ("CREATE TABLE t ([my id] integer primary key)", "my id"),
+    ],
+)
+def test_rowid_alias(sql, expected):
+    assert rowid_alias(sql) == expected
+
+
+def test_column_constraints_are_not_types():
+    schema = parse_create_table(
+        "CREATE TABLE t (a VARCHAR(10) NOT NULL DEFAULT 'x, y', b DECIMAL(5, 2),"
+        " c REFERENCES other(id), UNIQUE (a, b), CHECK (b > 0))"
+    )
+    assert schema.columns == [
+        Column("a", "VARCHAR", default="x, y"),
+        Column("b", "DECIMAL"),
+        Column("c", ""),
+    ]
+
+
+@pytest.mark.parametrize(
+    "definition,expected",
+    [
+        ("z int DEFAULT 7", 7),
+        ("z int DEFAULT '7.0'", 7),
+        ("z real DEFAULT 7", 7.0),
+        ("z text DEFAULT 1e3", "1e3"),
+        ("z numeric DEFAULT - 4", -4),
+        ("z DEFAULT (+1.5)", 1.5),
+        ("z DEFAULT 0x10", 16),
+        ("z blob DEFAULT x'41'", b"A"),
+        ("z DEFAULT TRUE", 1),
+        ("z DEFAULT NULL", None),
+        ("z DEFAULT CURRENT_TIMESTAMP", None),
+        ("z text NOT NULL", None),
+    ],
+)
+def test_default(definition, expected):
+    (column,) = parse_create_table(f"CREATE TABLE t ({definition})").columns
+    assert column.default == expected
+    assert type(column.default) is type(expected)
+
+
+def test_is_rowid():
+    schema = parse_create_table("CREATE TABLE t (id integer primary key, rowid_ish)")
+    assert schema.is_rowid("id")
+    assert schema.is_rowid("ROWID")
+    assert not schema.is_rowid("rowid_ish")
+    shadowed = parse_create_table("CREATE TABLE t (rowid text)")
+    assert not shadowed.is_rowid("rowid")
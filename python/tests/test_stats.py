@@ -0,0 +1,131 @@
+import sqlite3
+import sys
+import threading
+
+import pytest
+
+from codecrafters_sqlite import main
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection
+
+ROWS = 3000
+
+
+@pytest.fixture(scope="module")
+def items_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("stats") / "items.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute(
+            "CREATE TABLE items (id integer primary key, name text, size integer)"
+        )
+        db.executemany(
+            "INSERT INTO items (name, size) VALUES(?, ?)",
+            ((f"item {row}", row % 10) for row in range(ROWS)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def run(connection, sql, parameters=()):
+    cursor = connection.execute(sql, parameters)
+    cursor.fetchall()
+    return cursor.stats
+
+
+def test_full_scan(items_db):
+    with Connection(items_db) as connection:
+        table = connection.db_info.find_table("items")
+        leaves = sum(1 for _ in table._generate_leaves())
+        stats = run(connection, "select * from items")
+    assert stats.access == "SCAN items"
+    assert stats.rows == stats.cells == ROWS
+    assert stats.leaf_pages == leaves
+    assert 0 < stats.interior_pages < leaves
+    assert stats.columns_decoded == 3 * ROWS
+    assert stats.columns_skipped == 0
+    assert stats.bytes_copied == sum(len(f"item {row}") for row in range(ROWS))
+    assert stats.errors == 0
+    assert 0 < stats.first_row_seconds <= stats.execute_seconds
+    assert stats.prepare_seconds > 0
+
+
+def test_projection_and_filter(items_db):
+    with Connection(items_db) as connection:
+        stats = run(connection, "select size from items where name like 'item 1%'")
+    matching = sum(f"item {row}".startswith("item 1") for row in range(ROWS))
+    assert stats.cells == ROWS
+    assert stats.rows == matching
+    assert stats.columns_decoded == matching
+    assert stats.columns_skipped == 3 * ROWS - matching
+
+
+def test_rowid_lookup(items_db):
+    with Connection(items_db) as connection:
+        depth = 1
+        page = connection.db_info.find_table("items")
+        while page.page_type.is_interior():
+            page, depth = page._child_for(0), depth + 1
+        first = run(connection, "select name from items where id = ?", (1234,))
+        second = run(connection, "select name from items where id = ?", (1234,))
+    assert first.access.startswith("SEARCH items USING INTEGER PRIMARY KEY")
+    assert first.rows == first.cells == 1
+    assert (first.interior_pages, first.leaf_pages) == (depth - 1, 1)
+    assert second.cache_misses == 0
+    assert second.cache_hits == depth
+
+
+def test_aggregate_counts_folded_columns(items_db):
+    with Connection(items_db) as connection:
+        stats = run(connection, "select size, count(*) from items group by size")
+    assert stats.rows == 10
+    assert stats.cells == ROWS
+    assert stats.columns_decoded == ROWS
+
+
+def test_stats_of_a_closed_cursor(items_db):
+    with Connection(items_db) as connection:
+        cursor = connection.execute("select * from items")
+        cursor.fetchmany(5)
+        cursor.close()
+    assert cursor.stats.rows == 5
+    assert cursor.stats.leaf_pages == 1
+    assert cursor.stats.execute_seconds > 0
+
+
+def test_bytes_copied_on_other_threads_are_not_counted(items_db):
+    sql = "select name from items"
+    with Connection(items_db) as connection:
+        alone = run(connection, sql).bytes_copied
+        cursor = connection.execute(sql)
+        cursor.fetchmany(10)
+        other = threading.Thread(target=run, args=(connection, sql))
+        other.start()
+        other.join()
+        cursor.fetchall()
+    assert cursor.stats.bytes_copied == alone
+
+
+def test_stats_command(items_db, monkeypatch, capsys):
+    sql = "select name from items where id = 7"
+    monkeypatch.setattr(sys, "argv", ["sqlite", str(items_db), ".stats", sql])
+    main.main()
+    out, err = capsys.readouterr()
+    assert out == "item 6\n"
+    assert "Access:              SEARCH items USING INTEGER PRIMARY KEY" in err
+    assert "Rows:                1" in err.splitlines()
+
+
+def test_timer_command(items_db, monkeypatch, capsys):
+    sql = "select count(*) from items"
+    monkeypatch.setattr(sys, "argv", ["sqlite", str(items_db), ".timer", sql])
+    main.main()
+    out, err = capsys.readouterr()
+    assert out == f"{ROWS}\n"
+    assert err.startswith("Run Time: real ")
+
+
+@pytest.mark.parametrize("command", (".stats", ".timer"))
+def test_command_without_a_query(items_db, monkeypatch, command):
+    monkeypatch.setattr(sys, "argv", ["sqlite", str(items_db), command])
+    with pytest.raises(SystemExit, match=f"Usage: sqlite DATABASE {command} QUERY"):
+        main.main()
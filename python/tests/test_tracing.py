@@ -0,0 +1,89 @@
+import logging
+import sqlite3
+from timeit import repeat
+
+import pytest
+
+from codecrafters_sqlite import tracing
+from codecrafters_sqlite.main import Connection
+
+ROWS = 20_000
+SQL = "select * from notes"
+
+
+@pytest.fixture(scope="module")
+def notes_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("tracing") / "notes.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("CREATE TABLE notes (id integer primary key, title text, body text)")
+        db.executemany(
+            "INSERT INTO notes (title, body) VALUES(?, ?)",
+            ((f"note {row}", f"body of note {row}") for row in range(ROWS)),
+        )
+    db.close()
+    return tmp_db_path
+
+
+@pytest.fixture
+def package_level():
+    package_logger = logging.getLogger("codecrafters_sqlite")
+
+    def set_level(level):
+        package_logger.setLevel(level)
+        tracing.refresh()
+
+    yield set_level
+    set_level(logging.NOTSET)
+
+
+def scan(connection):
+    return sum(1 for _ in connection.execute(SQL))
+
+
+def test_no_debug_calls_at_info(notes_db, package_level, monkeypatch):
+    package_level(logging.INFO)
+    calls = []
+    monkeypatch.setattr(
+        logging.Logger, "debug", lambda *args, **kwargs: calls.append(args)
+    )
+    with Connection(notes_db) as connection:
+        assert scan(connection) == ROWS
+    assert calls == []
+
+
+def test_traces_at_debug(notes_db, package_level, caplog):
+    with Connection(notes_db) as connection:
+        package_level(logging.DEBUG)
+        with caplog.at_level(logging.DEBUG, logger="codecrafters_sqlite"):
+            list(connection.execute("select title from notes where id = 7"))
+    assert "decoded [note 6] with length 6" in caplog.text
+    assert "rowid 7: " in caplog.text
+    assert "note 7" not in caplog.text
+
+
+def test_scans_at_info_pay_nothing_for_tracing(notes_db, package_level):
+    """A scan at INFO costs what it does with the tracing switched off outright"""
+    with Connection(notes_db) as connection:
+        scan(connection)
+
+        def best():
+            return min(repeat(lambda: scan(connection), number=1, repeat=5))
+
+        package_level(logging.INFO)
+        info_time = best()
+        package_level(logging.CRITICAL)
+        off_time = best()
+        package_logger = logging.getLogger("codecrafters_sqlite")
+        package_logger.propagate = False
+        package_logger.addHandler(handler := logging.NullHandler())
+        try:
+            package_level(logging.DEBUG)
+            debug_time = best()
+        finally:
+            package_logger.removeHandler(handler)
+            package_logger.propagate = True
+    print(
+        f"{ROWS} rows: {info_time:.3f}s at INFO, {off_time:.3f}s with logging off,"
+        f" {debug_time:.3f}s with tracing on but discarded"
+    )
+    assert info_time < off_time * 1.25
@@ -0,0 +1,117 @@
+import shutil
+import sqlite3
+
+import pytest
+
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, DbInfo
+from codecrafters_sqlite.page_source import PAGE_SOURCES
+from codecrafters_sqlite.wal import FRAME_HEADER_SIZE, WalSource
+
+
+@pytest.fixture
+def writer(tmp_path):
+    """A connection in WAL mode that never checkpoints, so commits stay in the WAL"""
+    db = sqlite3.connect(tmp_path / "wal.db", isolation_level=None)
+    db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+    db.execute("PRAGMA journal_mode = WAL;")
+    db.execute("PRAGMA wal_autocheckpoint = 0;")
+    db.execute("CREATE TABLE items (id integer primary key, name text)")
+    insert(db, range(500))
+    db.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    yield db
+    db.close()
+
+
+def insert(db, rows):
+    db.executemany(
+        "INSERT INTO items (name) VALUES(?)", ((f"item {row}",) for row in rows)
+    )
+
+
+def database_path(db):
+    ((_, _, path),) = db.execute("PRAGMA database_list").fetchall()
+    return path
+
+
+def names(connection):
+    return [name for _, name in connection.execute("select * from items")]
+
+
+@pytest.mark.parametrize("page_source", PAGE_SOURCES)
+def test_reads_commits_from_the_wal(writer, page_source):
+    insert(writer, range(500, 1000))
+    writer.execute("UPDATE items SET name = 'changed' WHERE id = 7")
+    with Connection(database_path(writer), page_source=page_source) as connection:
+        assert isinstance(connection.db_info.page_source, WalSource)
+        rows = names(connection)
+    assert len(rows) == 1000
+    assert rows[6] == "changed"
+
+
+def test_reads_only_new_frames(writer):
+    with Connection(database_path(writer)) as connection:
+        db_info = connection.db_info
+        wal = db_info.page_source.wal
+        assert names(connection) == [f"item {row}" for row in range(500)]
+        cached = {n for n in range(1, 100) if n in db_info.page_cache}
+
+        insert(writer, range(500, 510))
+        frames_read, committed = wal.frames_read, wal.committed_frames
+        changed = db_info.refresh()
+        # A refresh reads the new frames, and tries one after them
+        assert wal.frames_read - frames_read == wal.committed_frames - committed + 1
+        assert changed and cached - changed
+        assert all(n not in db_info.page_cache for n in changed)
+        assert all(n in db_info.page_cache for n in cached - changed)
+        assert len(names(connection)) == 510
+        assert connection.db_info is db_info
+
+
+def test_schema_changes(writer):
+    with Connection(database_path(writer)) as connection:
+        assert len(names(connection)) == 500
+        writer.execute("CREATE TABLE extra (value text)")
+        writer.execute("INSERT INTO extra VALUES ('new')")
+        assert connection.execute("select value from extra").fetchall() == ["new"]
+        assert "extra" in connection.db_info.table_names
+
+
+def test_after_checkpoint_and_restart(writer):
+    with Connection(database_path(writer)) as connection:
+        insert(writer, range(500, 600))
+        assert len(names(connection)) == 600
+        writer.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+        insert(writer, range(600, 650))
+        assert len(names(connection)) == 650
+
+
+def test_ignores_frames_after_the_last_commit(writer, tmp_path):
+    insert(writer, range(500, 1000))
+    path = tmp_path / "copy.db"
+    shutil.copy(database_path(writer), path)
+    shutil.copy(f"{database_path(writer)}-wal", f"{path}-wal")
+    db_info = DbInfo(path)
+    committed = dict(db_info.page_source.wal.frames)
+    db_info.close()
+
+    # A torn write: a frame with a header copied from the last, and no content
+    with open(f"{path}-wal", "r+b") as wal_file:
+        wal_file.seek(-(MIN_PAGE_SIZE + FRAME_HEADER_SIZE), 2)
+        frame_header = wal_file.read(FRAME_HEADER_SIZE)
+        wal_file.seek(0, 2)
+        wal_file.write(frame_header + b"\0" * MIN_PAGE_SIZE)
+    db_info = DbInfo(path)
+    assert db_info.page_source.wal.frames == committed
+    assert db_info.find_table("items").count_rows() == 1000
+    db_info.close()
+
+
+def test_main_file_alone_without_wal_mode(tmp_path):
+    path = tmp_path / "rollback.db"
+    with sqlite3.connect(path) as db:
+        db.execute("CREATE TABLE items (id integer primary key, name text)")
+    db.close()
+    db_info = DbInfo(path)
+    assert not isinstance(db_info.page_source, WalSource)
+    assert db_info.refresh() == set()
+    db_info.close()
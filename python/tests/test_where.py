@@ -0,0 +1,309 @@
+import os
+import sqlite3
+from time import perf_counter
+
+import pytest
+
+from codecrafters_sqlite.main import MIN_PAGE_SIZE, Connection, DbInfo
+from codecrafters_sqlite.query import Access, prepare
+
+BENCHMARK_ROWS = int(os.environ.get("SQLITE_BENCHMARK_ROWS", 100_000))
+
+VALUES = (
+    None,
+    0,
+    1,
+    -7,
+    2.5,
+    10**12,
+    "",
+    "apple",
+    "Apple pie",
+    "APRICOT",
+    "banana",
+    "b",
+    "10",
+    "naïve",
+    b"apple",
+    b"\x00\x01",
+)
+
+
+@pytest.fixture(scope="module")
+def mixed_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("where") / "mixed.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute("PRAGMA page_size = %d;" % MIN_PAGE_SIZE)
+        db.execute("CREATE TABLE things (id integer primary key, name text, value)")
+        db.executemany(
+            "INSERT INTO things (name, value) VALUES(?, ?)",
+            ((f"thing {row}", VALUES[row % len(VALUES)]) for row in range(500)),
+        )
+        db.execute("ALTER TABLE things ADD COLUMN added")
+        db.execute("INSERT INTO things (name, value, added) VALUES('late', 3, 'x')")
+    db.close()
+    return tmp_db_path
+
+
+def expected(tmp_db_path, sql, parameters=()):
+    with sqlite3.connect(tmp_db_path) as db:
+        return [list(row) for row in db.execute(sql, parameters)]
+
+
+@pytest.mark.parametrize(
+    "where",
+    (
+        "value = 1",
+        "value = 'apple'",
+        "value = 'naïve'",
+        "value = 2.5",
+        "value < 1",
+        "value <= 'apple'",
+        "value > 'b'",
+        "value >= 10",
+        "value between 0 and 2.5",
+        "value between 'a' and 'b'",
+        "value is null",
+        "value is not null",
+        "added is null",
+        "added = 'x'",
+        "value like 'ap%'",
+        "value like 'AP%'",
+        "value like '1%'",
+        "value like '%an%'",
+        "value like 'b_'",
+        "name like 'thing 1_'",
+        "value like ''",
+        "value like '%'",
+        "value = null",
+        "id > 495",
+        "id < 3",
+        "id between 10.5 and 13",
+        "id >= 'a'",
+    ),
+)
+def test_matches_sqlite(mixed_db, where):
+    sql = f"select id, value from things where {where}"
+    with Connection(mixed_db) as connection:
+        assert list(connection.execute(sql)) == expected(mixed_db, sql)
+
+
+@pytest.mark.parametrize(
+    "where,parameters",
+    (
+        ("value = ?", ("banana",)),
+        ("value = ?", (b"apple",)),
+        ("value < ?", (0,)),
+        ("value like ?", ("a%",)),
+        ("value between ? and ?", ("APRICOT", "apple")),
+        ("id <= ?", (4,)),
+    ),
+)
+def test_parameters(mixed_db, where, parameters):
+    sql = f"select id, value from things where {where}"
+    with Connection(mixed_db) as connection:
+        assert list(connection.execute(sql, parameters)) == expected(
+            mixed_db, sql, parameters
+        )
+
+
+@pytest.fixture(scope="module")
+def typed_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("where") / "typed.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute(
+            "CREATE TABLE typed"
+            " (id integer primary key, n integer, s text, r real, d decimal, v)"
+        )
+        db.executemany(
+            "INSERT INTO typed (n, s, r, d, v) VALUES(?, ?, ?, ?, ?)",
+            (
+                (5, "5", 2.5, "1.5", "5"),
+                (7, "10", 2.0, 3, 5),
+                (12, "8", 9.0, "x", b"5"),
+                ("abc", 5, "7.5", None, 2.0),
+            ),
+        )
+        db.execute("ALTER TABLE typed ADD COLUMN z int DEFAULT '7'")
+        db.execute("ALTER TABLE typed ADD COLUMN w real DEFAULT (-1)")
+        db.execute("INSERT INTO typed (n, r, z, w) VALUES(3, 4, 3, 0.5)")
+    db.close()
+    return tmp_db_path
+
+
+@pytest.mark.parametrize(
+    "where",
+    (
+        "n = '5'",
+        "n = ' 5 '",
+        "n = '5.0'",
+        "n < '6'",
+        "n > '1e1'",
+        "n = 'abc'",
+        "n < 'abc'",
+        "s = 5",
+        "s > 7",
+        "s between 1 and 6",
+        "r = '2'",
+        "r >= '2.5'",
+        "d = '1.5'",
+        "d < 2",
+        "v = '5'",
+        "v = 5",
+        "id = '2'",
+        "id = 2.0",
+        "id = 2.5",
+        "id > '1'",
+        "id between '2' and 3.0",
+        "id < 'x'",
+        "rowid = '3'",
+    ),
+)
+def test_affinity_matches_sqlite(typed_db, where):
+    sql = f"select id, n, s from typed where {where}"
+    with Connection(typed_db) as connection:
+        assert list(connection.execute(sql)) == expected(typed_db, sql)
+        count_sql = f"select count(*) from typed where {where}"
+        assert list(connection.execute(count_sql)) == [
+            row for (row,) in expected(typed_db, count_sql)
+        ]
+
+
+def typed(rows):
+    """Rows with the type of each value, since 7 == 7.0"""
+    rows = [row if isinstance(row, list) else [row] for row in rows]
+    return [[(type(value), value) for value in row] for row in rows]
+
+
+@pytest.mark.parametrize(
+    "sql",
+    (
+        "select r, z, w from typed",
+        "select * from typed",
+        "select r, count(*) from typed group by r",
+        "select z, sum(r), max(r), sum(w), min(w) from typed group by z",
+        "select id, r from typed where z = 7",
+        "select id from typed where w < 0",
+    ),
+)
+@pytest.mark.parametrize("processes", (None, 2))
+def test_stored_values_match_sqlite(typed_db, sql, processes):
+    """Integers in REAL columns read back as reals, and columns added since a
+    row was written hold their defaults"""
+    with Connection(typed_db, processes=processes) as connection:
+        rows = list(connection.execute(sql))
+    assert typed(rows) == typed(expected(typed_db, sql))
+
+
+@pytest.mark.parametrize(
+    "where,parameters",
+    (
+        ("n = ?", ("7",)),
+        ("s = ?", (10,)),
+        ("s < ?", (9.5,)),
+        ("id = ?", ("4",)),
+        ("id = ?", (3.0,)),
+        ("id <= ?", ("2",)),
+    ),
+)
+def test_parameters_get_affinity(typed_db, where, parameters):
+    sql = f"select id from typed where {where}"
+    with Connection(typed_db) as connection:
+        assert list(connection.execute(sql, parameters)) == [
+            row for (row,) in expected(typed_db, sql, parameters)
+        ]
+
+
+@pytest.mark.parametrize(
+    "where,access,description",
+    (
+        ("id > ?", Access.ROWID_RANGE, "(rowid>?)"),
+        ("id <= ?", Access.ROWID_RANGE, "(rowid<?)"),
+        ("id like ?", Access.FILTER, None),
+        ("value < ?", Access.FILTER, None),
+    ),
+)
+def test_access(mixed_db, where, access, description):
+    plan = prepare(DbInfo(mixed_db), f"select name from things where {where}")
+    assert plan.access == access
+    if description is not None:
+        assert plan.description.endswith(description)
+
+
+def test_only_matching_rows_are_decoded(mixed_db, monkeypatch):
+    from codecrafters_sqlite.cells import TableLeafCell
+
+    projected = []
+    project = TableLeafCell.project
+
+    def counting_project(self, *args, **kwargs):
+        projected.append(args)
+        return project(self, *args, **kwargs)
+
+    sql = "select name from things where value = 'b'"
+    with Connection(mixed_db) as connection:
+        connection.prepare(sql)  # reads the schema
+        monkeypatch.setattr(TableLeafCell, "project", counting_project)
+        rows = list(connection.execute(sql))
+    assert len(rows) == len(projected) == 500 // len(VALUES)
+
+
+@pytest.fixture(scope="module")
+def benchmark_db(tmp_path_factory):
+    tmp_db_path = tmp_path_factory.mktemp("where") / "benchmark.db"
+    with sqlite3.connect(tmp_db_path) as db:
+        db.execute(
+            "CREATE TABLE events (id integer primary key, kind text, payload text,"
+            " size integer, note text)"
+        )
+        db.executemany(
+            "INSERT INTO events (kind, payload, size, note) VALUES(?, ?, ?, ?)",
+            (
+                (f"kind {row % 1000}", f"payload {row}" * 3, row, "a note")
+                for row in range(BENCHMARK_ROWS)
+            ),
+        )
+    db.close()
+    return tmp_db_path
+
+
+def test_selective_filter_costs_like_the_scan(benchmark_db):
+    """A filter matching 0.1% of rows should cost about as much as walking the
+    cells, and much less than decoding every row to test it"""
+    db_info = DbInfo(benchmark_db)
+    table = db_info.find_table("events")
+
+    def scan():
+        return sum(1 for _ in table._generate_child_rows())
+
+    def naive():
+        return [
+            cell.columns
+            for cell in table._generate_child_rows()
+            if cell.columns[1] == "kind 7"
+        ]
+
+    plan = prepare(db_info, "select * from events where kind = 'kind 7'")
+
+    def filtered():
+        return list(plan.execute(db_info))
+
+    def best(run):
+        times = []
+        for _ in range(3):
+            start = perf_counter()
+            result = run()
+            times.append(perf_counter() - start)
+        return min(times), result
+
+    scan_time, rows = best(scan)
+    naive_time, naive_rows = best(naive)
+    filter_time, filter_rows = best(filtered)
+    print(
+        f"{rows} rows: scan {scan_time:.3f}s, filter {filter_time:.3f}s, "
+        f"decode everything {naive_time:.3f}s"
+    )
+    assert filter_rows == [row for row in naive_rows]
+    assert len(filter_rows) == BENCHMARK_ROWS // 1000
+    assert filter_time < naive_time / 2
+    assert filter_time < scan_time * 4
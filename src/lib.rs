@@ -1,39 +1,849 @@
 use std::borrow::Cow;
+use std::cmp::Ordering;
 
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::{PyBufferError, PyIndexError, PyValueError};
 use pyo3::prelude::*;
+use pyo3::types::{PyBytes, PyFloat, PyList, PyLong, PyString, PyTuple};
 
 const HUFFMAN_LENGTH: usize = 9;
 
 #[pyfunction]
 fn decode_varint(buffer: Cow<'_, [u8]>) -> PyResult<(i64, usize)> {
+    varint_at(&buffer, 0).ok_or_else(|| PyIndexError::new_err("truncated varint"))
+}
+
+/// Decode the varint starting at `offset`, returning its value and length in bytes
+fn varint_at(buffer: &[u8], offset: usize) -> Option<(i64, usize)> {
+    let buffer = buffer.get(offset..)?;
     let mut acc = 0i64;
 
-    let byte_index = decode_leading_bytes(&buffer, &mut acc);
+    let byte_index = decode_leading_bytes(buffer, &mut acc)?;
     if byte_index == HUFFMAN_LENGTH - 1 {
         // or all 8 bits of the nth byte
-        acc = (acc << 8) + buffer[byte_index] as i64;
+        acc = (acc << 8) + *buffer.get(byte_index)? as i64;
     }
     let huffman_bits = 7 * HUFFMAN_LENGTH + 1;
     let sign_bit = 1 << (huffman_bits - 1);
     if (acc & sign_bit) != 0 {
-        Ok((acc - (sign_bit << 1), byte_index + 1))
+        Some((acc - (sign_bit << 1), byte_index + 1))
     } else {
-        Ok((acc, byte_index + 1))
+        Some((acc, byte_index + 1))
     }
 }
 
-fn decode_leading_bytes(buffer: &Cow<'_, [u8]>, acc: &mut i64) -> usize {
+fn decode_leading_bytes(buffer: &[u8], acc: &mut i64) -> Option<usize> {
     // zero or more bytes which have the high-order bit set
     for byte_index in 0..HUFFMAN_LENGTH - 1 {
         // The lower seven bits of each of the first n-1 byte
-        let current_byte = *buffer.get(byte_index).unwrap();
+        let current_byte = *buffer.get(byte_index)?;
         *acc = (*acc << 7) + i64::from(_lower7(current_byte));
         // including a single end byte with the high-order bit clear
         if 0 == _high_bit(current_byte) {
-            return byte_index;
+            return Some(byte_index);
+        }
+    }
+    Some(HUFFMAN_LENGTH - 1)
+}
+
+/// The varints at the start of a table b-tree leaf cell
+#[derive(Debug, PartialEq)]
+struct RecordHeader {
+    payload_size: i64,
+    rowid: i64,
+    record_offset: usize,
+    header_size: i64,
+    serial_type_codes: Vec<i64>,
+}
+
+fn read_record_header(buffer: &[u8], offset: usize) -> Option<RecordHeader> {
+    let (payload_size, payload_size_length) = varint_at(buffer, offset)?;
+    let (rowid, rowid_length) = varint_at(buffer, offset + payload_size_length)?;
+    let record_offset = offset + payload_size_length + rowid_length;
+    let (header_size, header_size_length) = varint_at(buffer, record_offset)?;
+
+    let header_end = record_offset + usize::try_from(header_size).ok()?;
+    let mut location = record_offset + header_size_length;
+    let mut serial_type_codes = Vec::new();
+    while location < header_end {
+        let (serial_type_code, length) = varint_at(buffer, location)?;
+        serial_type_codes.push(serial_type_code);
+        location += length;
+    }
+    Some(RecordHeader {
+        payload_size,
+        rowid,
+        record_offset,
+        header_size,
+        serial_type_codes,
+    })
+}
+
+/// Borrow the bytes behind a Python buffer (bytes, mmap, memoryview...) without copying
+fn buffer_bytes(buffer: &PyBuffer<u8>) -> PyResult<&[u8]> {
+    if !buffer.is_c_contiguous() {
+        return Err(PyBufferError::new_err("buffer is not contiguous"));
+    }
+    // Safety: the buffer is contiguous, and the export is held for as long as the
+    // PyBuffer (and so the returned slice) lives
+    Ok(unsafe {
+        std::slice::from_raw_parts(buffer.buf_ptr() as *const u8, buffer.len_bytes())
+    })
+}
+
+/// Decode a cell's payload size, rowid and record header in one call
+///
+/// Returns `(payload_size, rowid, record_offset, header_size, serial_type_codes)`,
+/// where `record_offset` is where the record (starting with its header) begins.
+#[pyfunction]
+fn decode_record_header(
+    buffer: PyBuffer<u8>,
+    offset: usize,
+) -> PyResult<(i64, i64, usize, i64, Vec<i64>)> {
+    let header = read_record_header(buffer_bytes(&buffer)?, offset)
+        .ok_or_else(|| PyIndexError::new_err(format!("truncated record at {offset}")))?;
+    Ok((
+        header.payload_size,
+        header.rowid,
+        header.record_offset,
+        header.header_size,
+        header.serial_type_codes,
+    ))
+}
+
+/// A column value borrowed from the page, before it becomes a Python object
+#[derive(Clone, Debug, PartialEq)]
+enum Value<'a> {
+    Null,
+    Integer(i64),
+    Real(f64),
+    Text(&'a str),
+    Blob(&'a [u8]),
+}
+
+impl Value<'_> {
+    fn to_object(&self, py: Python<'_>) -> PyObject {
+        match self {
+            Value::Null => py.None(),
+            Value::Integer(value) => value.to_object(py),
+            Value::Real(value) => value.to_object(py),
+            Value::Text(value) => PyString::new_bound(py, value).into_any().unbind(),
+            Value::Blob(value) => PyBytes::new_bound(py, value).into_any().unbind(),
+        }
+    }
+}
+
+#[derive(Debug, PartialEq)]
+enum RecordError {
+    Truncated,
+    Overflow,
+    InvalidUtf8,
+    UnknownSerialType(i64),
+}
+
+impl From<RecordError> for PyErr {
+    fn from(error: RecordError) -> PyErr {
+        PyValueError::new_err(format!("cannot decode record: {error:?}"))
+    }
+}
+
+/// The number of bytes of record body a serial type takes up
+fn content_size(serial_type_code: i64) -> Result<usize, RecordError> {
+    match serial_type_code {
+        0 | 8 | 9 => Ok(0),
+        1..=4 => Ok(serial_type_code as usize),
+        5 => Ok(6),
+        6 | 7 => Ok(8),
+        _ if serial_type_code >= 12 => Ok(((serial_type_code - 12) / 2) as usize),
+        _ => Err(RecordError::UnknownSerialType(serial_type_code)),
+    }
+}
+
+/// Decode the value of one column, returning it and the size of its content
+fn read_value(body: &[u8], serial_type_code: i64) -> Result<(Value<'_>, usize), RecordError> {
+    let content_size = content_size(serial_type_code)?;
+    let content = body.get(..content_size).ok_or(RecordError::Truncated)?;
+    let value = match serial_type_code {
+        0 => Value::Null,
+        8 => Value::Integer(0),
+        9 => Value::Integer(1),
+        1..=6 => Value::Integer(read_integer(content)),
+        7 => Value::Real(f64::from_be_bytes(content.try_into().unwrap())),
+        _ if serial_type_code % 2 == 0 => Value::Blob(content),
+        _ => Value::Text(std::str::from_utf8(content).map_err(|_| RecordError::InvalidUtf8)?),
+    };
+    Ok((value, content_size))
+}
+
+/// A big-endian two's complement integer of 1 to 8 bytes
+fn read_integer(content: &[u8]) -> i64 {
+    let sign_extension = if content[0] & 0b1000_0000 != 0 { -1i64 } else { 0 };
+    content
+        .iter()
+        .fold(sign_extension, |acc, byte| (acc << 8) | i64::from(*byte))
+}
+
+/// Decode the columns of a table b-tree leaf cell
+///
+/// Only the columns in `projection` are decoded, in that order; the bodies of the
+/// others are skipped using their serial type sizes. All columns are decoded when
+/// there is no projection. A NULL in `rowid_column` is replaced by the rowid.
+fn read_record<'a>(
+    buffer: &'a [u8],
+    cell_offset: usize,
+    usable_size: usize,
+    projection: Option<&[usize]>,
+    rowid_column: Option<usize>,
+) -> Result<(i64, Vec<Value<'a>>), RecordError> {
+    let header = read_record_header(buffer, cell_offset).ok_or(RecordError::Truncated)?;
+    // If the payload size P is less than or equal to U-35 then the entire payload is
+    // stored on the b-tree leaf page
+    let payload_size = usize::try_from(header.payload_size).map_err(|_| RecordError::Truncated)?;
+    if payload_size > usable_size.saturating_sub(35) {
+        return Err(RecordError::Overflow);
+    }
+    let record = buffer
+        .get(header.record_offset..header.record_offset + payload_size)
+        .ok_or(RecordError::Truncated)?;
+    let mut body = record
+        .get(header.header_size as usize..)
+        .ok_or(RecordError::Truncated)?;
+
+    let wanted = |column: usize| projection.map_or(true, |columns| columns.contains(&column));
+    let mut decoded = Vec::with_capacity(header.serial_type_codes.len());
+    for (column, serial_type_code) in header.serial_type_codes.into_iter().enumerate() {
+        let content_size = content_size(serial_type_code)?;
+        let content = body.get(..content_size).ok_or(RecordError::Truncated)?;
+        if wanted(column) {
+            decoded.push(Some(read_value(content, serial_type_code)?.0));
+        } else {
+            decoded.push(None);
+        }
+        body = &body[content_size..];
+    }
+    if let Some(Some(value)) = rowid_column.and_then(|column| decoded.get_mut(column)) {
+        if matches!(value, Value::Null) {
+            *value = Value::Integer(header.rowid);
+        }
+    }
+    let values = match projection {
+        None => decoded.into_iter().flatten().collect(),
+        Some(columns) => columns
+            .iter()
+            .map(|&column| decoded.get(column).cloned().flatten().unwrap_or(Value::Null))
+            .collect(),
+    };
+    Ok((header.rowid, values))
+}
+
+/// Decode a table b-tree leaf cell into its rowid and a tuple of column values
+///
+/// Like `TableLeafCell.columns`, a NULL first column (an INTEGER PRIMARY KEY alias)
+/// is replaced by the rowid; pass `rowid_column` to name another column, or None.
+/// With a `projection` of column indices, only those columns are decoded and
+/// returned, like `TableLeafCell.project`. Raises ValueError for records it cannot
+/// decode, such as invalid UTF-8 or a payload that spills onto overflow pages.
+#[pyfunction]
+#[pyo3(signature = (page_buffer, cell_offset, usable_size, projection=None, rowid_column=Some(0)))]
+fn decode_record(
+    py: Python<'_>,
+    page_buffer: PyBuffer<u8>,
+    cell_offset: usize,
+    usable_size: usize,
+    projection: Option<Vec<usize>>,
+    rowid_column: Option<usize>,
+) -> PyResult<(i64, Py<PyTuple>)> {
+    let (rowid, values) = read_record(
+        buffer_bytes(&page_buffer)?,
+        cell_offset,
+        usable_size,
+        projection.as_deref(),
+        rowid_column,
+    )?;
+    let columns = values.iter().map(|value| value.to_object(py));
+    Ok((rowid, PyTuple::new_bound(py, columns).unbind()))
+}
+
+const FILE_HEADER_SIZE: usize = 100;
+const TABLE_INTERIOR: u8 = 5;
+const TABLE_LEAF: u8 = 13;
+const MAX_DEPTH: usize = 64; // deeper than any real b-tree: the file has a cycle
+
+#[derive(Debug, PartialEq)]
+enum ScanError {
+    PageOutOfRange(u32),
+    TruncatedPage(u32),
+    NotATable(u32, u8),
+    TooDeep(u32),
+}
+
+impl From<ScanError> for PyErr {
+    fn from(error: ScanError) -> PyErr {
+        PyValueError::new_err(format!("cannot scan table: {error:?}"))
+    }
+}
+
+/// A b-tree page, viewed from its start even on page 1, so cell pointers index it
+struct Page<'a> {
+    page_number: u32,
+    data: &'a [u8],
+    header: usize,
+}
+
+fn page_at(file: &[u8], page_size: usize, page_number: u32) -> Result<Page<'_>, ScanError> {
+    let start = (page_number as usize)
+        .checked_sub(1)
+        .ok_or(ScanError::PageOutOfRange(page_number))?
+        * page_size;
+    let data = file
+        .get(start..start + page_size)
+        .ok_or(ScanError::PageOutOfRange(page_number))?;
+    let header = if page_number == 1 { FILE_HEADER_SIZE } else { 0 };
+    Ok(Page {
+        page_number,
+        data,
+        header,
+    })
+}
+
+impl Page<'_> {
+    fn bytes(&self, offset: usize, size: usize) -> Result<&[u8], ScanError> {
+        self.data
+            .get(offset..offset + size)
+            .ok_or(ScanError::TruncatedPage(self.page_number))
+    }
+
+    fn u16_at(&self, offset: usize) -> Result<usize, ScanError> {
+        let bytes = self.bytes(offset, 2)?;
+        Ok(usize::from(u16::from_be_bytes([bytes[0], bytes[1]])))
+    }
+
+    fn u32_at(&self, offset: usize) -> Result<u32, ScanError> {
+        let bytes = self.bytes(offset, 4)?;
+        Ok(u32::from_be_bytes([bytes[0], bytes[1], bytes[2], bytes[3]]))
+    }
+
+    fn page_type(&self) -> Result<u8, ScanError> {
+        Ok(self.bytes(self.header, 1)?[0])
+    }
+
+    fn number_of_cells(&self) -> Result<usize, ScanError> {
+        self.u16_at(self.header + 3)
+    }
+
+    fn cell_pointer(&self, cell_number: usize) -> Result<usize, ScanError> {
+        let header_size = if self.page_type()? == TABLE_INTERIOR { 12 } else { 8 };
+        self.u16_at(self.header + header_size + 2 * cell_number)
+    }
+
+    fn right_most_pointer(&self) -> Result<u32, ScanError> {
+        self.u32_at(self.header + 8)
+    }
+}
+
+/// A depth-first walk of a table b-tree, finding its leaf pages in rowid order
+#[derive(Debug)]
+struct TreeCursor {
+    root: Option<u32>,
+    stack: Vec<(u32, usize)>, // interior pages, with the next child to visit in each
+    interior_pages: usize,
+    leaf_pages: usize,
+}
+
+impl TreeCursor {
+    fn new(root_page: u32) -> Self {
+        TreeCursor {
+            root: Some(root_page),
+            stack: Vec::new(),
+            interior_pages: 0,
+            leaf_pages: 0,
+        }
+    }
+
+    fn next_leaf(&mut self, file: &[u8], page_size: usize) -> Result<Option<u32>, ScanError> {
+        if let Some(root) = self.root.take() {
+            if let Some(leaf) = self.enter(file, page_size, root)? {
+                return Ok(Some(leaf));
+            }
+        }
+        while let Some(&(page_number, next_child)) = self.stack.last() {
+            let page = page_at(file, page_size, page_number)?;
+            let cells = page.number_of_cells()?;
+            if next_child > cells {
+                self.stack.pop();
+                continue;
+            }
+            let child = if next_child < cells {
+                page.u32_at(page.cell_pointer(next_child)?)?
+            } else {
+                page.right_most_pointer()?
+            };
+            if let Some(top) = self.stack.last_mut() {
+                top.1 += 1;
+            }
+            if let Some(leaf) = self.enter(file, page_size, child)? {
+                return Ok(Some(leaf));
+            }
+        }
+        Ok(None)
+    }
+
+    /// Step into a page: a leaf is returned, and an interior page is walked next
+    fn enter(
+        &mut self,
+        file: &[u8],
+        page_size: usize,
+        page_number: u32,
+    ) -> Result<Option<u32>, ScanError> {
+        match page_at(file, page_size, page_number)?.page_type()? {
+            TABLE_LEAF => {
+                self.leaf_pages += 1;
+                Ok(Some(page_number))
+            }
+            TABLE_INTERIOR if self.stack.len() >= MAX_DEPTH => {
+                Err(ScanError::TooDeep(page_number))
+            }
+            TABLE_INTERIOR => {
+                self.interior_pages += 1;
+                self.stack.push((page_number, 0));
+                Ok(None)
+            }
+            page_type => Err(ScanError::NotATable(page_number, page_type)),
+        }
+    }
+}
+
+/// A decoded row, or the cell of one to be decoded in Python instead
+#[derive(Debug, PartialEq)]
+enum Record<'a> {
+    Decoded(Vec<Value<'a>>),
+    Undecoded(u32, usize), // page number and cell number
+}
+
+/// Decode the records of table leaf pages, in order
+fn leaf_records<'a>(
+    file: &'a [u8],
+    page_size: usize,
+    usable_size: usize,
+    leaves: &[u32],
+    projection: Option<&[usize]>,
+    rowid_column: Option<usize>,
+) -> Result<Vec<Record<'a>>, ScanError> {
+    let mut records = Vec::new();
+    for &page_number in leaves {
+        let page = page_at(file, page_size, page_number)?;
+        match page.page_type()? {
+            TABLE_LEAF => {}
+            page_type => return Err(ScanError::NotATable(page_number, page_type)),
+        }
+        for cell_number in 0..page.number_of_cells()? {
+            let offset = page.cell_pointer(cell_number)?;
+            records.push(
+                match read_record(page.data, offset, usable_size, projection, rowid_column) {
+                    Ok((_, values)) => Record::Decoded(values),
+                    Err(_) => Record::Undecoded(page_number, cell_number),
+                },
+            );
+        }
+    }
+    Ok(records)
+}
+
+/// Count the rows in the leaves a cursor has yet to find, from their page headers
+fn count_cells(file: &[u8], page_size: usize, cursor: &mut TreeCursor) -> Result<usize, ScanError> {
+    let mut rows = 0;
+    while let Some(page_number) = cursor.next_leaf(file, page_size)? {
+        rows += page_at(file, page_size, page_number)?.number_of_cells()?;
+    }
+    Ok(rows)
+}
+
+/// A scan of a table b-tree over the whole database file, a batch at a time
+///
+/// The tree is walked and records are decoded with the GIL released; it is only
+/// taken back to turn each batch into Python objects, and counting never needs
+/// it. Records it cannot decode, such as those spilling onto overflow pages, come
+/// back as their page and cell numbers for the caller to decode.
+#[pyclass]
+struct TableScan {
+    buffer: PyBuffer<u8>,
+    page_size: usize,
+    usable_size: usize,
+    cursor: TreeCursor,
+    cells: usize,
+}
+
+#[pymethods]
+impl TableScan {
+    #[new]
+    fn new(
+        buffer: PyBuffer<u8>,
+        page_size: usize,
+        usable_size: usize,
+        root_page: u32,
+    ) -> PyResult<Self> {
+        buffer_bytes(&buffer)?;
+        Ok(TableScan {
+            buffer,
+            page_size,
+            usable_size,
+            cursor: TreeCursor::new(root_page),
+            cells: 0,
+        })
+    }
+
+    /// The next `max_pages` leaf page numbers, in rowid order; empty at the end
+    fn leaves(&mut self, py: Python<'_>, max_pages: usize) -> PyResult<Vec<u32>> {
+        let file = buffer_bytes(&self.buffer)?;
+        let page_size = self.page_size;
+        let cursor = &mut self.cursor;
+        let leaves = py.allow_threads(|| {
+            let mut leaves = Vec::new();
+            while leaves.len() < max_pages {
+                match cursor.next_leaf(file, page_size)? {
+                    Some(leaf) => leaves.push(leaf),
+                    None => break,
+                }
+            }
+            Ok::<_, ScanError>(leaves)
+        })?;
+        Ok(leaves)
+    }
+
+    /// The rows on some of the leaf pages, as lists like `TableLeafCell.columns`
+    /// or, with a `projection`, `TableLeafCell.project`
+    ///
+    /// Returns the rows, with None for each record left undecoded, and
+    /// `(row index, page number, cell number)` for each of those.
+    #[pyo3(signature = (leaves, projection=None, rowid_column=Some(0)))]
+    fn rows(
+        &mut self,
+        py: Python<'_>,
+        leaves: Vec<u32>,
+        projection: Option<Vec<usize>>,
+        rowid_column: Option<usize>,
+    ) -> PyResult<(Py<PyList>, Vec<(usize, u32, usize)>)> {
+        let file = buffer_bytes(&self.buffer)?;
+        let (page_size, usable_size) = (self.page_size, self.usable_size);
+        let projection = projection.as_deref();
+        let records = py.allow_threads(|| {
+            leaf_records(
+                file,
+                page_size,
+                usable_size,
+                &leaves,
+                projection,
+                rowid_column,
+            )
+        })?;
+        self.cells += records.len();
+        let mut undecoded = Vec::new();
+        let rows = records.into_iter().enumerate().map(|(index, record)| match record {
+            Record::Decoded(values) => {
+                let columns = values.iter().map(|value| value.to_object(py));
+                PyList::new_bound(py, columns).into_any().unbind()
+            }
+            Record::Undecoded(page_number, cell_number) => {
+                undecoded.push((index, page_number, cell_number));
+                py.None()
+            }
+        });
+        let rows = PyList::new_bound(py, rows.collect::<Vec<_>>()).unbind();
+        Ok((rows, undecoded))
+    }
+
+    /// The number of rows in the leaves not yet found, from their page headers
+    fn count(&mut self, py: Python<'_>) -> PyResult<usize> {
+        let file = buffer_bytes(&self.buffer)?;
+        let page_size = self.page_size;
+        let cursor = &mut self.cursor;
+        let rows = py.allow_threads(|| count_cells(file, page_size, cursor))?;
+        Ok(rows)
+    }
+
+    /// The number of rows in the leaves not yet found where a WHERE test of one
+    /// column holds
+    ///
+    /// `operator` is one of `=`, `<`, `<=`, `>`, `>=`, `between`, `is null` and
+    /// `is not null`, with `operands` bound as for `Predicate.compile`, and a
+    /// `column` of None tests the rowid. Returns the count and the page and cell
+    /// numbers of the records it could not read, for the caller to test.
+    fn count_where(
+        &mut self,
+        py: Python<'_>,
+        column: Option<usize>,
+        rowid_column: Option<usize>,
+        operator: &str,
+        operands: Vec<Bound<'_, PyAny>>,
+    ) -> PyResult<(usize, Vec<(u32, usize)>)> {
+        let operands = operands
+            .iter()
+            .map(Operand::extract)
+            .collect::<PyResult<Vec<_>>>()?;
+        let test = Test::new(operator, &operands).map_err(PyValueError::new_err)?;
+        let file = buffer_bytes(&self.buffer)?;
+        let (page_size, usable_size) = (self.page_size, self.usable_size);
+        let cursor = &mut self.cursor;
+        let (count, cells, undecided) = py.allow_threads(|| {
+            count_matching(
+                file,
+                page_size,
+                usable_size,
+                cursor,
+                column,
+                rowid_column,
+                &test,
+            )
+        })?;
+        self.cells += cells;
+        Ok((count, undecided))
+    }
+
+    /// Interior pages walked, not counting the root, which the caller has read
+    #[getter]
+    fn interior_pages(&self) -> usize {
+        self.cursor.interior_pages.saturating_sub(1)
+    }
+
+    /// Leaf pages found, not counting the root if it is the only one
+    #[getter]
+    fn leaf_pages(&self) -> usize {
+        match self.cursor.interior_pages {
+            0 => self.cursor.leaf_pages.saturating_sub(1),
+            _ => self.cursor.leaf_pages,
         }
     }
-    HUFFMAN_LENGTH - 1
+
+    /// Cells read by `rows` and `count_where`
+    #[getter]
+    fn cells(&self) -> usize {
+        self.cells
+    }
+}
+
+/// A number as SQLite compares them: integers and reals by value
+#[derive(Clone, Copy, Debug, PartialEq)]
+enum Number {
+    Integer(i64),
+    Real(f64),
+}
+
+/// A column or operand as WHERE compares it: text and blobs as raw bytes
+#[derive(Clone, Copy, Debug, PartialEq)]
+enum Key<'a> {
+    Number(Number),
+    Text(&'a [u8]),
+    Blob(&'a [u8]),
+}
+
+impl Key<'_> {
+    /// NULL < numbers < text < blobs, whatever their values
+    fn storage_class(&self) -> u8 {
+        match self {
+            Key::Number(_) => 1,
+            Key::Text(_) => 2,
+            Key::Blob(_) => 3,
+        }
+    }
+}
+
+fn compare(a: &Key<'_>, b: &Key<'_>) -> Option<Ordering> {
+    match (a, b) {
+        (Key::Number(a), Key::Number(b)) => compare_numbers(*a, *b),
+        (Key::Text(a), Key::Text(b)) | (Key::Blob(a), Key::Blob(b)) => Some(a.cmp(b)),
+        _ => Some(a.storage_class().cmp(&b.storage_class())),
+    }
+}
+
+/// Compare numbers exactly, as Python does, even integers too big for a double
+fn compare_numbers(a: Number, b: Number) -> Option<Ordering> {
+    match (a, b) {
+        (Number::Integer(a), Number::Integer(b)) => Some(a.cmp(&b)),
+        (Number::Real(a), Number::Real(b)) => a.partial_cmp(&b),
+        (Number::Integer(a), Number::Real(b)) => compare_integer_to_real(a, b),
+        (Number::Real(a), Number::Integer(b)) => {
+            compare_integer_to_real(b, a).map(Ordering::reverse)
+        }
+    }
+}
+
+fn compare_integer_to_real(integer: i64, real: f64) -> Option<Ordering> {
+    const LIMIT: f64 = 9_223_372_036_854_775_808.0; // 2**63
+    if real.is_nan() {
+        return None;
+    }
+    if real >= LIMIT {
+        return Some(Ordering::Less);
+    }
+    if real < -LIMIT {
+        return Some(Ordering::Greater);
+    }
+    let whole = real.trunc();
+    Some(integer.cmp(&(whole as i64)).then_with(|| {
+        // Equal whole parts: the fraction decides
+        0.0f64.partial_cmp(&(real - whole)).unwrap_or(Ordering::Equal)
+    }))
+}
+
+/// A WHERE operand, copied out of its Python object so the GIL can be released
+#[derive(Debug, PartialEq)]
+enum Operand {
+    Null,
+    Integer(i64),
+    Real(f64),
+    Text(String),
+    Blob(Vec<u8>),
+}
+
+impl Operand {
+    fn extract(value: &Bound<'_, PyAny>) -> PyResult<Self> {
+        if value.is_none() {
+            Ok(Operand::Null)
+        } else if let Ok(text) = value.downcast::<PyString>() {
+            Ok(Operand::Text(text.to_str()?.to_owned()))
+        } else if let Ok(real) = value.downcast::<PyFloat>() {
+            Ok(Operand::Real(real.value()))
+        } else if value.is_instance_of::<PyLong>() {
+            Ok(Operand::Integer(value.extract()?))
+        } else if let Ok(bytes) = value.downcast::<PyBytes>() {
+            Ok(Operand::Blob(bytes.as_bytes().to_vec()))
+        } else {
+            Ok(Operand::Blob(value.extract::<Vec<u8>>()?))
+        }
+    }
+
+    fn key(&self) -> Option<Key<'_>> {
+        match self {
+            Operand::Null => None,
+            Operand::Integer(value) => Some(Key::Number(Number::Integer(*value))),
+            Operand::Real(value) => Some(Key::Number(Number::Real(*value))),
+            Operand::Text(value) => Some(Key::Text(value.as_bytes())),
+            Operand::Blob(value) => Some(Key::Blob(value)),
+        }
+    }
+}
+
+/// A WHERE test of one column, with the same results as `Predicate.compile`
+#[derive(Debug, PartialEq)]
+enum Test<'a> {
+    Never, // a comparison with NULL
+    IsNull,
+    IsNotNull,
+    Compare(&'static [Ordering], Key<'a>), // true for these orderings of the column
+    Between(Key<'a>, Key<'a>),
+}
+
+impl<'a> Test<'a> {
+    fn new(operator: &str, operands: &'a [Operand]) -> Result<Self, String> {
+        let orderings: &'static [Ordering] = match operator {
+            "is null" => return Ok(Test::IsNull),
+            "is not null" => return Ok(Test::IsNotNull),
+            "=" => &[Ordering::Equal],
+            "<" => &[Ordering::Less],
+            "<=" => &[Ordering::Less, Ordering::Equal],
+            ">" => &[Ordering::Greater],
+            ">=" => &[Ordering::Greater, Ordering::Equal],
+            "between" => &[],
+            _ => return Err(format!("cannot test {operator} natively")),
+        };
+        let Some(keys) = operands.iter().map(Operand::key).collect::<Option<Vec<_>>>() else {
+            return Ok(Test::Never);
+        };
+        match (operator, keys.as_slice()) {
+            ("between", [lo, hi]) => Ok(Test::Between(*lo, *hi)),
+            (_, [key]) if operator != "between" => Ok(Test::Compare(orderings, *key)),
+            _ => Err(format!("wrong number of operands for {operator}")),
+        }
+    }
+
+    /// Whether a column, None for NULL, passes
+    fn matches(&self, column: Option<Key<'_>>) -> bool {
+        match (self, column) {
+            (Test::Never, _) => false,
+            (Test::IsNull, column) => column.is_none(),
+            (Test::IsNotNull, column) => column.is_some(),
+            (_, None) => false,
+            (Test::Compare(orderings, key), Some(column)) => {
+                compare(&column, key).is_some_and(|ordering| orderings.contains(&ordering))
+            }
+            (Test::Between(lo, hi), Some(column)) => {
+                compare(&column, lo).is_some_and(Ordering::is_ge)
+                    && compare(&column, hi).is_some_and(Ordering::is_le)
+            }
+        }
+    }
+}
+
+/// One column of a table b-tree leaf cell as WHERE compares it, None for NULL
+///
+/// Like `_raw_column`, nothing but numbers is decoded: text isn't even checked
+/// to be UTF-8. A `column` of None is the rowid, as is a NULL in `rowid_column`,
+/// and a column missing from the record is NULL.
+fn column_key(
+    page: &[u8],
+    cell_offset: usize,
+    usable_size: usize,
+    column: Option<usize>,
+    rowid_column: Option<usize>,
+) -> Result<Option<Key<'_>>, RecordError> {
+    let header = read_record_header(page, cell_offset).ok_or(RecordError::Truncated)?;
+    let rowid = Some(Key::Number(Number::Integer(header.rowid)));
+    let Some(column) = column else {
+        return Ok(rowid);
+    };
+    let payload_size = usize::try_from(header.payload_size).map_err(|_| RecordError::Truncated)?;
+    if payload_size > usable_size.saturating_sub(35) {
+        return Err(RecordError::Overflow);
+    }
+    let header_size = usize::try_from(header.header_size).map_err(|_| RecordError::Truncated)?;
+    let serial_type_code = header.serial_type_codes.get(column).copied().unwrap_or(0);
+    let skipped = header.serial_type_codes[..column.min(header.serial_type_codes.len())]
+        .iter()
+        .map(|&code| content_size(code))
+        .sum::<Result<usize, _>>()?;
+    let start = header.record_offset + header_size + skipped;
+    let end = start + content_size(serial_type_code)?;
+    if end > header.record_offset + payload_size {
+        return Err(RecordError::Truncated);
+    }
+    let content = page.get(start..end).ok_or(RecordError::Truncated)?;
+    Ok(match serial_type_code {
+        0 if rowid_column == Some(column) => rowid,
+        0 => None,
+        8 => Some(Key::Number(Number::Integer(0))),
+        9 => Some(Key::Number(Number::Integer(1))),
+        1..=6 => Some(Key::Number(Number::Integer(read_integer(content)))),
+        7 => Some(Key::Number(Number::Real(f64::from_be_bytes(
+            content.try_into().map_err(|_| RecordError::Truncated)?,
+        )))),
+        code if code % 2 == 0 => Some(Key::Blob(content)),
+        _ => Some(Key::Text(content)),
+    })
+}
+
+fn count_matching(
+    file: &[u8],
+    page_size: usize,
+    usable_size: usize,
+    cursor: &mut TreeCursor,
+    column: Option<usize>,
+    rowid_column: Option<usize>,
+    test: &Test<'_>,
+) -> Result<(usize, usize, Vec<(u32, usize)>), ScanError> {
+    let (mut count, mut cells, mut undecided) = (0, 0, Vec::new());
+    while let Some(page_number) = cursor.next_leaf(file, page_size)? {
+        let page = page_at(file, page_size, page_number)?;
+        for cell_number in 0..page.number_of_cells()? {
+            cells += 1;
+            let offset = page.cell_pointer(cell_number)?;
+            match column_key(page.data, offset, usable_size, column, rowid_column) {
+                Ok(key) if test.matches(key) => count += 1,
+                Ok(_) => {}
+                Err(_) => undecided.push((page_number, cell_number)),
+            }
+        }
+    }
+    Ok((count, cells, undecided))
 }
 
 fn _high_bit(byte: u8) -> u8 {
@@ -47,12 +857,21 @@ fn _lower7(byte: u8) -> u8 {
 /// A Python module implemented in Rust.
 #[pymodule]
 pub fn _lowlevel(m: &Bound<'_, PyModule>) -> PyResult<()> {
-    m.add_function(wrap_pyfunction!(decode_varint, m)?)
+    m.add_function(wrap_pyfunction!(decode_varint, m)?)?;
+    m.add_function(wrap_pyfunction!(decode_record_header, m)?)?;
+    m.add_function(wrap_pyfunction!(decode_record, m)?)?;
+    m.add_class::<TableScan>()
 }
 
 #[cfg(test)]
 mod test {
-    use crate::decode_varint;
+    use std::cmp::Ordering;
+
+    use crate::{
+        compare_numbers, count_cells, count_matching, decode_varint, leaf_records, read_record,
+        read_record_header, read_value, Number, Operand, Record, RecordError, RecordHeader,
+        ScanError, Test, TreeCursor, Value,
+    };
 
     #[test]
     fn zero() {
@@ -86,6 +905,243 @@ mod test {
     }
 
     fn assert_varint_decodes_to(buffer: Vec<u8>, expected: i64) {
-        assert_eq!(decode_varint(buffer).unwrap().0, expected)
+        assert_eq!(decode_varint(buffer.into()).unwrap().0, expected)
+    }
+
+    #[test]
+    fn record_header() {
+        let page = [0xFF, 0x05, 0x81, 0x00, 0x03, 0x0F, 0x01, 0xB1, 0x2A];
+        assert_eq!(
+            read_record_header(&page, 1),
+            Some(RecordHeader {
+                payload_size: 5,
+                rowid: 128,
+                record_offset: 4,
+                header_size: 3,
+                serial_type_codes: vec![15, 1],
+            })
+        );
+    }
+
+    #[test]
+    fn truncated_record_header() {
+        assert_eq!(read_record_header(&[0x05, 0x01, 0x03, 0x0F], 0), None);
+    }
+
+    #[test]
+    fn integer_sizes() {
+        let body = [0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFF, 0xFE];
+        let sizes = [(1, 1), (2, 2), (3, 3), (4, 4), (5, 6), (6, 8)];
+        for (serial_type_code, content_size) in sizes {
+            assert_eq!(
+                read_value(&body[8 - content_size..], serial_type_code),
+                Ok((Value::Integer(-2), content_size))
+            );
+        }
+    }
+
+    #[test]
+    fn real() {
+        let body = 1.5f64.to_be_bytes();
+        assert_eq!(read_value(&body, 7), Ok((Value::Real(1.5), 8)));
+    }
+
+    #[test]
+    fn text_and_blob() {
+        let body = [b'h', b'i'];
+        assert_eq!(read_value(&body, 17), Ok((Value::Text("hi"), 2)));
+        assert_eq!(read_value(&body, 16), Ok((Value::Blob(&body), 2)));
+        assert_eq!(read_value(&[0xB1], 15), Err(RecordError::InvalidUtf8));
+    }
+
+    #[test]
+    fn null_first_column_is_rowid() {
+        let cell = [0x03, 0x07, 0x03, 0x00, 0x09];
+        assert_eq!(
+            read_record(&cell, 0, 4096, None, Some(0)),
+            Ok((7, vec![Value::Integer(7), Value::Integer(1)]))
+        );
+    }
+
+    #[test]
+    fn projection() {
+        let cell = [0x05, 0x07, 0x04, 0x00, 0x0F, 0x09, b'x'];
+        assert_eq!(
+            read_record(&cell, 0, 4096, Some(&[2, 0, 5]), Some(0)),
+            Ok((7, vec![Value::Integer(1), Value::Integer(7), Value::Null]))
+        );
+        // A column that isn't projected isn't validated either
+        let bad_text = [0x05, 0x07, 0x04, 0x00, 0x0F, 0x09, 0xB1];
+        assert_eq!(
+            read_record(&bad_text, 0, 4096, Some(&[2]), None),
+            Ok((7, vec![Value::Integer(1)]))
+        );
+    }
+
+    #[test]
+    fn overflow() {
+        let cell = [0x81, 0x00, 0x07, 0x02, 0x00];
+        assert_eq!(
+            read_record(&cell, 0, 128, None, Some(0)),
+            Err(RecordError::Overflow)
+        );
+    }
+
+    const PAGE_SIZE: usize = 512;
+
+    fn leaf_page(cells: &[&[u8]]) -> Vec<u8> {
+        let mut page = vec![0u8; PAGE_SIZE];
+        page[0] = 13;
+        page[3..5].copy_from_slice(&(cells.len() as u16).to_be_bytes());
+        let mut content_start = PAGE_SIZE;
+        for (cell_number, cell) in cells.iter().enumerate() {
+            content_start -= cell.len();
+            page[content_start..content_start + cell.len()].copy_from_slice(cell);
+            let pointer = 8 + 2 * cell_number;
+            page[pointer..pointer + 2].copy_from_slice(&(content_start as u16).to_be_bytes());
+        }
+        page
+    }
+
+    fn interior_page(children: &[(u32, u8)], right_most_pointer: u32) -> Vec<u8> {
+        let mut page = vec![0u8; PAGE_SIZE];
+        page[0] = 5;
+        page[3..5].copy_from_slice(&(children.len() as u16).to_be_bytes());
+        page[8..12].copy_from_slice(&right_most_pointer.to_be_bytes());
+        for (cell_number, (child, key)) in children.iter().enumerate() {
+            let content_start = PAGE_SIZE - 5 * (cell_number + 1);
+            page[content_start..content_start + 4].copy_from_slice(&child.to_be_bytes());
+            page[content_start + 4] = *key;
+            let pointer = 12 + 2 * cell_number;
+            page[pointer..pointer + 2].copy_from_slice(&(content_start as u16).to_be_bytes());
+        }
+        page
+    }
+
+    /// An empty schema on page 1, and a table rooted at page 2 with two leaves:
+    /// rows (1, 1), (2, 0), (3, NULL) and (4, 'x'), the first column aliasing the rowid
+    fn database() -> Vec<u8> {
+        let mut file = vec![0u8; PAGE_SIZE];
+        file[100] = 13;
+        file.extend(interior_page(&[(3, 2)], 4));
+        file.extend(leaf_page(&[
+            &[0x03, 0x01, 0x03, 0x00, 0x09],
+            &[0x03, 0x02, 0x03, 0x00, 0x08],
+        ]));
+        file.extend(leaf_page(&[
+            &[0x03, 0x03, 0x03, 0x00, 0x00],
+            &[0x04, 0x04, 0x03, 0x00, 0x0F, b'x'],
+        ]));
+        file
+    }
+
+    fn leaves(file: &[u8], root_page: u32) -> Result<Vec<u32>, ScanError> {
+        let mut cursor = TreeCursor::new(root_page);
+        let mut leaves = Vec::new();
+        while let Some(leaf) = cursor.next_leaf(file, PAGE_SIZE)? {
+            leaves.push(leaf);
+        }
+        Ok(leaves)
+    }
+
+    #[test]
+    fn leaves_in_rowid_order() {
+        let file = database();
+        let mut cursor = TreeCursor::new(2);
+        assert_eq!(cursor.next_leaf(&file, PAGE_SIZE), Ok(Some(3)));
+        assert_eq!(cursor.next_leaf(&file, PAGE_SIZE), Ok(Some(4)));
+        assert_eq!(cursor.next_leaf(&file, PAGE_SIZE), Ok(None));
+        assert_eq!((cursor.interior_pages, cursor.leaf_pages), (1, 2));
+        assert_eq!(leaves(&file, 1), Ok(vec![1]));
+    }
+
+    #[test]
+    fn broken_trees() {
+        let mut file = database();
+        assert_eq!(leaves(&file, 9), Err(ScanError::PageOutOfRange(9)));
+        file[PAGE_SIZE * 2] = 10;
+        assert_eq!(leaves(&file, 2), Err(ScanError::NotATable(3, 10)));
+        // A right-most pointer back to the root
+        file = database();
+        file[PAGE_SIZE + 8..PAGE_SIZE + 12].copy_from_slice(&2u32.to_be_bytes());
+        assert_eq!(leaves(&file, 2), Err(ScanError::TooDeep(2)));
+    }
+
+    #[test]
+    fn records_of_leaves() {
+        let file = database();
+        let records = leaf_records(&file, PAGE_SIZE, PAGE_SIZE, &[4, 3], None, Some(0));
+        assert_eq!(
+            records,
+            Ok(vec![
+                Record::Decoded(vec![Value::Integer(3), Value::Null]),
+                Record::Decoded(vec![Value::Integer(4), Value::Text("x")]),
+                Record::Decoded(vec![Value::Integer(1), Value::Integer(1)]),
+                Record::Decoded(vec![Value::Integer(2), Value::Integer(0)]),
+            ])
+        );
+        let interior = leaf_records(&file, PAGE_SIZE, PAGE_SIZE, &[2], None, Some(0));
+        assert_eq!(interior, Err(ScanError::NotATable(2, 5)));
+    }
+
+    #[test]
+    fn undecodable_records_are_left_to_the_caller() {
+        let file = database();
+        // Usable size 32 leaves no room for any payload on the page
+        let records = leaf_records(&file, PAGE_SIZE, 32, &[3], Some(&[1]), None);
+        assert_eq!(
+            records,
+            Ok(vec![Record::Undecoded(3, 0), Record::Undecoded(3, 1)])
+        );
+    }
+
+    #[test]
+    fn count_what_is_left() {
+        let file = database();
+        let mut cursor = TreeCursor::new(2);
+        assert_eq!(cursor.next_leaf(&file, PAGE_SIZE), Ok(Some(3)));
+        assert_eq!(count_cells(&file, PAGE_SIZE, &mut cursor), Ok(2));
+    }
+
+    fn count_where(column: Option<usize>, operator: &str, operands: &[Operand]) -> usize {
+        let file = database();
+        let test = Test::new(operator, operands).unwrap();
+        let mut cursor = TreeCursor::new(2);
+        let (count, cells, undecided) =
+            count_matching(&file, PAGE_SIZE, PAGE_SIZE, &mut cursor, column, Some(0), &test)
+                .unwrap();
+        assert_eq!((cells, undecided), (4, vec![]));
+        count
+    }
+
+    #[test]
+    fn filtered_counts() {
+        // Text sorts after every number
+        assert_eq!(count_where(Some(1), ">=", &[Operand::Integer(1)]), 2);
+        assert_eq!(count_where(Some(1), "=", &[Operand::Real(1.0)]), 1);
+        assert_eq!(count_where(Some(1), "=", &[Operand::Text("x".into())]), 1);
+        assert_eq!(count_where(Some(1), "is null", &[]), 1);
+        assert_eq!(count_where(Some(1), "<", &[Operand::Null]), 0);
+        assert_eq!(count_where(Some(5), "is null", &[]), 4);
+        // The rowid, as itself and through the column aliasing it
+        assert_eq!(count_where(None, "<", &[Operand::Real(2.5)]), 2);
+        let (lo, hi) = (Operand::Integer(2), Operand::Integer(3));
+        assert_eq!(count_where(Some(0), "between", &[lo, hi]), 2);
+        assert!(Test::new("like", &[Operand::Text("x%".into())]).is_err());
+    }
+
+    #[test]
+    fn integers_and_reals_compare_exactly() {
+        let above_doubles = Number::Integer((1 << 53) + 1);
+        let double = Number::Real((1u64 << 53) as f64);
+        assert_eq!(compare_numbers(above_doubles, double), Some(Ordering::Greater));
+        let largest = Number::Integer(i64::MAX);
+        let two_to_the_63 = Number::Real(9_223_372_036_854_775_808.0);
+        assert_eq!(compare_numbers(largest, two_to_the_63), Some(Ordering::Less));
+        let (one, one_and_a_half) = (Number::Integer(1), Number::Real(1.5));
+        assert_eq!(compare_numbers(one_and_a_half, one), Some(Ordering::Greater));
+        let (minus_one, minus_one_and_a_half) = (Number::Integer(-1), Number::Real(-1.5));
+        assert_eq!(compare_numbers(minus_one, minus_one_and_a_half), Some(Ordering::Greater));
+        assert_eq!(compare_numbers(one, Number::Real(f64::NAN)), None);
     }
 }